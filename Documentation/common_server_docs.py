@@ -21,7 +21,8 @@ jsPrivateFuncs = ["dqQueryBuilder", "toArray", "indent", "formatTableValuesRecur
 pyPrivateFuncs = ["raiseTable", "zoomField", "epochToTimestamp", "formatTimeColumns", "strip_tag", "elem_to_internal",
                   "internal_to_elem", "json2elem", "elem2json", "json2xml", "OrderedDict", "datetime", "timedelta",
                   "createContextSingle", "IntegrationLogger", "tblToMd", "DemistoException", "BaseClient",
-                  "BaseHTTPClient", "DemistoHandler", "DebugLogger"]
+                  "BaseHTTPClient", "DemistoHandler", "DebugLogger", "RateLimiter",
+                  "_fetch_page_async", "_table_cell_to_markdown", "_get_context_schema", "_apply_context_schema"]
 
 pyIrregularFuncs = {"LOG": {"argList": ["message"]}}
 
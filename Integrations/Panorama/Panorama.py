@@ -110,7 +110,7 @@ def http_request(uri: str, method: str, headers: Dict = {},
     """
     Makes an API call with the given arguments
     """
-    result = requests.request(
+    result = pooled_request(
         method,
         uri,
         headers=headers,
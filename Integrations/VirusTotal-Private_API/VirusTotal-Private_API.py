@@ -72,12 +72,12 @@ def http_request(method, url_suffix, params_dict, headers):
     LOG('running %s request with url=%s\theaders=%s\nparams=%s' % (method, url, headers, json.dumps(req_params)))
 
     try:
-        res = requests.request(method,
-                               url,
-                               verify=USE_SSL,
-                               params=req_params,
-                               headers=headers
-                               )
+        res = pooled_request(method,
+                             url,
+                             verify=USE_SSL,
+                             params=req_params,
+                             headers=headers
+                             )
         res.raise_for_status()
 
         if res.status_code == 200:
@@ -12,6 +12,9 @@ import os
 import re
 import base64
 import logging
+import random
+import threading
+import zlib
 from collections import OrderedDict
 import xml.etree.cElementTree as ET
 from datetime import datetime, timedelta
@@ -785,6 +788,9 @@ def flattenCell(data, is_pretty=True):
     indent = 4 if is_pretty else None
     if isinstance(data, STRING_TYPES):
         return data
+    elif type(data) is int:
+        # json.dumps of an int is the same as str
+        return str(data)
     elif isinstance(data, list):
         string_list = []
         for d in data:
@@ -872,7 +878,7 @@ def appendContext(key, data, dedup=False):
         demisto.setContext(key, data)
 
 
-def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None):
+def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None, maxRows=None):
     """
        Converts a demisto table in JSON form to a Markdown table
 
@@ -895,6 +901,9 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
        :type metadata: ``str``
        :param metadata: Metadata about the table contents
 
+       :type maxRows: ``int``
+       :param maxRows: The maximal number of rows to show, the number of omitted rows is added after the table (optional)
+
        :return: A string representation of the markdown table
        :rtype: ``str``
     """
@@ -921,7 +930,7 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
         # should be only one header
         if headers and len(headers) > 0:
             header = headers[0]
-            t = map(lambda item: dict((h, item) for h in [header]), t)
+            t = [{header: item} for item in t]
         else:
             raise Exception("Missing headers param for tableToMarkdown. Example: headers=['Some Header']")
 
@@ -931,36 +940,34 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
         headers.sort()
 
     if removeNull:
-        headers_aux = headers[:]
-        for header in headers_aux:
-            if all(obj.get(header) in ('', None, [], {}) for obj in t):
-                headers.remove(header)
+        # a single pass over the rows, which stops once every column was found to have a value
+        non_empty_headers = set()  # type: set
+        for obj in t:
+            for header in headers:
+                if header not in non_empty_headers and obj.get(header) not in ('', None, [], {}):
+                    non_empty_headers.add(header)
+            if len(non_empty_headers) == len(set(headers)):
+                break
+        headers = [header for header in headers if header in non_empty_headers]
 
     if t and len(headers) > 0:
-        newHeaders = []
         if headerTransform is None:  # noqa
             headerTransform = lambda s: s  # noqa
-        for header in headers:
-            newHeaders.append(headerTransform(header))
-        mdResult += '|'
-        if len(newHeaders) == 1:
-            mdResult += newHeaders[0]
-        else:
-            mdResult += '|'.join(newHeaders)
-        mdResult += '|\n'
-        sep = '---'
-        mdResult += '|' + '|'.join([sep] * len(headers)) + '|\n'
-        for entry in t:
-            vals = [stringEscapeMD((formatCell(entry.get(h, ''), False) if entry.get(h) is not None else ''),
-                                   True, True) for h in headers]
+        # the parts are joined once in the end, instead of concatenating the result for every row
+        md_parts = [mdResult, '|', '|'.join([headerTransform(header) for header in headers]), '|\n',
+                    '|' + '|'.join(['---'] * len(headers)) + '|\n']
+        rows = t if maxRows is None else t[:maxRows]
+        for entry in rows:
+            vals = [_table_cell_to_markdown(entry.get(h)) for h in headers]
             # this pipe is optional
-            mdResult += '| '
             try:
-                mdResult += ' | '.join(vals)
+                md_parts.append('| ' + ' | '.join(vals) + ' |\n')
             except UnicodeDecodeError:
                 vals = [str(v) for v in vals]
-                mdResult += ' | '.join(vals)
-            mdResult += ' |\n'
+                md_parts.append('| ' + ' | '.join(vals) + ' |\n')
+        if len(t) > len(rows):
+            md_parts.append('\n**{} more rows omitted.**\n'.format(len(t) - len(rows)))
+        mdResult = ''.join(md_parts)
 
     else:
         mdResult += '**No entries.**\n'
@@ -968,9 +975,65 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
     return mdResult
 
 
+def _table_cell_to_markdown(value):
+    """Formats and escapes a table cell, the same as stringEscapeMD(formatCell(value, False), True, True)"""
+    if type(value) is int:
+        # json.dumps of an int (which formatCell uses) is the same as str
+        return str(value)
+    if value is None:
+        return ''
+    if not isinstance(value, STRING_TYPES):
+        value = formatCell(value, False)
+    if '|' in value or '\n' in value or '\r' in value:
+        return stringEscapeMD(value, True, True)
+    return value
+
+
 tblToMd = tableToMarkdown
 
 
+# compiled context schemas of recently used key sets, see _get_context_schema
+CONTEXT_SCHEMA_CACHE_SIZE = 256
+_context_schema_cache = OrderedDict()  # type: OrderedDict
+_context_schema_cache_lock = threading.Lock()
+
+
+def _get_context_schema(keys, keyTransform):
+    """Returns the (key, parent keys, transformed leaf key) of each of the flattened keys, cached per key set"""
+    cache_key = (keys, keyTransform)
+    with _context_schema_cache_lock:
+        schema = _context_schema_cache.pop(cache_key, None)
+        if schema is None:
+            schema = []
+            for key in keys:
+                values = key.split('.')
+                leaf = keyTransform(values[-1]) if keyTransform else values[-1]
+                schema.append((key, tuple(values[:-1]), leaf))
+        # re-insert so the schema becomes the most recently used one
+        _context_schema_cache[cache_key] = schema
+        while len(_context_schema_cache) > CONTEXT_SCHEMA_CACHE_SIZE:
+            _context_schema_cache.popitem(last=False)
+    return schema
+
+
+def _apply_context_schema(obj, schema, id, removeNull):
+    """Builds the nested context dict of obj from the compiled schema of its keys"""
+    res = {}  # type: dict
+    for key, parents, leaf in schema:
+        value = obj[key]
+        if removeNull and value in ('', None, [], {}):
+            continue
+        current = res
+        for parent in parents:
+            current = current.setdefault(parent, {})
+        current[leaf] = value
+
+    if id is not None:
+        res.setdefault('ID', id)
+
+    return res
+
+
 def createContextSingle(obj, id=None, keyTransform=None, removeNull=False):
     """Receives a dict with flattened key values, and converts them into nested dicts
 
@@ -989,24 +1052,7 @@ def createContextSingle(obj, id=None, keyTransform=None, removeNull=False):
     :return: The converted context list
     :rtype: ``list``
     """
-    res = {}  # type: dict
-    if keyTransform is None:
-        keyTransform = lambda s: s  # noqa
-    keys = obj.keys()
-    for key in keys:
-        if removeNull and obj[key] in ('', None, [], {}):
-            continue
-        values = key.split('.')
-        current = res
-        for v in values[:-1]:
-            current.setdefault(v, {})
-            current = current[v]
-        current[keyTransform(values[-1])] = obj[key]
-
-    if id is not None:
-        res.setdefault('ID', id)
-
-    return res
+    return _apply_context_schema(obj, _get_context_schema(tuple(obj.keys()), keyTransform), id, removeNull)
 
 
 def createContext(data, id=None, keyTransform=None, removeNull=False):
@@ -1028,7 +1074,16 @@ def createContext(data, id=None, keyTransform=None, removeNull=False):
         :rtype: ``list``
     """
     if isinstance(data, (list, tuple)):
-        return [createContextSingle(d, id, keyTransform, removeNull) for d in data]
+        # rows usually share the same keys, so the schema of the previous row is reused without a cache lookup
+        res = []
+        keys = schema = None
+        for d in data:
+            row_keys = tuple(d.keys())
+            if row_keys != keys:
+                keys = row_keys
+                schema = _get_context_schema(keys, keyTransform)
+            res.append(_apply_context_schema(d, schema, id, removeNull))
+        return res
     else:
         return createContextSingle(data, id, keyTransform, removeNull)
 
@@ -2195,8 +2250,511 @@ H || val.SSDeep && val.SSDeep == obj.SSDeep)': {'Malicious': {'Vendor': 'Vendor'
                                .format(indicator_type, INDICATOR_TYPE_TO_CONTEXT_KEY.keys()))
 
 
+def _fetch_page_async(get_page, page_token):
+    """Fetches a page in a background thread, returns a function which waits for the page and returns it"""
+    result = {}
+
+    def fetch():
+        try:
+            result['page'] = get_page(page_token)
+        except Exception as exception:
+            result['error'] = exception
+
+    thread = threading.Thread(target=fetch)
+    thread.daemon = True
+    thread.start()
+
+    def wait():
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        return result['page']
+
+    return wait
+
+
+def paginate(get_page, page_token=None, prefetch=False, limit=None):
+    """
+    Lazily yields the items of a paged API, for APIs with a cursor, a next page link or a continuation token.
+    An empty page ends the iteration.
+
+    :type get_page: ``callable``
+    :param get_page:
+        A function which gets a page token (None for the first page, unless page_token is given) and returns
+        a tuple of the page items and the token of the next page (None if it is the last page).
+
+    :type page_token: ``object``
+    :param page_token: The token of the first page.
+
+    :type prefetch: ``bool``
+    :param prefetch: Whether to fetch the next page in the background while the items of the current page are used.
+
+    :type limit: ``int``
+    :param limit: The maximal number of items to yield. If None, will yield all the items.
+
+    :return: A generator of the items
+    :rtype: ``generator``
+    """
+    if limit is not None and limit <= 0:
+        # without fetching a page, as some APIs return their default page size for a size of 0
+        return
+    count = 0
+    page = get_page(page_token)
+    while True:
+        items, next_page_token = page
+        if not items or (limit is not None and count >= limit):
+            return
+
+        next_page = None
+        if prefetch and next_page_token is not None and (limit is None or count + len(items) < limit):
+            next_page = _fetch_page_async(get_page, next_page_token)
+
+        for item in items:
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield item
+
+        if next_page_token is None or (limit is not None and count >= limit):
+            return
+        page = next_page() if next_page else get_page(next_page_token)
+
+
+def paginate_offset(fetch_page, page_size, offset=0, prefetch=False, limit=None):
+    """
+    Lazily yields the items of a paged API with offset and limit parameters.
+    A page with less than the requested number of items is the last page.
+
+    :type fetch_page: ``callable``
+    :param fetch_page: A function which gets the offset and limit of a page and returns the list of its items.
+
+    :type page_size: ``int``
+    :param page_size: The number of items to request in each page.
+
+    :type offset: ``int``
+    :param offset: The offset of the first item.
+
+    :type prefetch: ``bool``
+    :param prefetch: Whether to fetch the next page in the background while the items of the current page are used.
+
+    :type limit: ``int``
+    :param limit: The maximal number of items to yield. If None, will yield all the items.
+
+    :return: A generator of the items
+    :rtype: ``generator``
+    """
+    def get_page(page_offset):
+        size = page_size if limit is None else min(page_size, limit - (page_offset - offset))
+        items = fetch_page(page_offset, size)
+        return items, page_offset + len(items) if len(items) >= size else None
+
+    return paginate(get_page, offset, prefetch, limit)
+
+
+def paginate_range_header(fetch_page, page_size, start=0, prefetch=False, limit=None):
+    """
+    Lazily yields the items of a paged API with a Range header, for example: 'Range: items=0-49'.
+    A page with less than the requested number of items is the last page.
+
+    :type fetch_page: ``callable``
+    :param fetch_page:
+        A function which gets the value of the Range header of a page (e.g. 'items=0-49', both ends included)
+        and returns the list of its items.
+
+    :type page_size: ``int``
+    :param page_size: The number of items to request in each page.
+
+    :type start: ``int``
+    :param start: The index of the first item.
+
+    :type prefetch: ``bool``
+    :param prefetch: Whether to fetch the next page in the background while the items of the current page are used.
+
+    :type limit: ``int``
+    :param limit: The maximal number of items to yield. If None, will yield all the items.
+
+    :return: A generator of the items
+    :rtype: ``generator``
+    """
+    def fetch_range(offset, size):
+        return fetch_page('items={}-{}'.format(offset, offset + size - 1))
+
+    return paginate_offset(fetch_range, page_size, start, prefetch, limit)
+
+
+class RateLimiter(object):
+    """Thread safe token bucket which limits the rate of calls, for example requests sent to the same API.
+
+    :type rate: ``float``
+    :param rate: The number of calls allowed per second.
+
+    :type burst: ``int``
+    :param burst: The number of calls that can be made at once before the rate is enforced.
+
+    :return: No data returned
+    :rtype: ``None``
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token from the bucket, waiting until one is available.
+
+        :return: The number of seconds waited
+        :rtype: ``float``
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            # a missing token is reserved ahead, so concurrent callers are served in order
+            self._tokens -= 1
+            wait_time = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+_rate_limiters = {}  # type: dict
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key, rate, burst=1):
+    """
+    Returns the rate limiter shared by all the callers in the process that use the same key (e.g. a base URL).
+
+    :type key: ``str``
+    :param key: The key of the rate limiter, for example the base URL of the API.
+
+    :type rate: ``float``
+    :param rate: The number of calls allowed per second.
+
+    :type burst: ``int``
+    :param burst: The number of calls that can be made at once before the rate is enforced.
+
+    :return: The rate limiter of the key
+    :rtype: ``RateLimiter``
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None or limiter.rate != float(rate) or limiter.burst != max(int(burst), 1):
+            limiter = RateLimiter(rate, burst)
+            _rate_limiters[key] = limiter
+        return limiter
+
+
+class IncidentFeatureStore(object):
+    """
+    Cache of records extracted from incidents (for example the features compared by similarity scripts), kept in
+    a Demisto list between script runs, so each run extracts only the records of new and modified incidents.
+    A record is reused as long as the modified time of its incident is the same and it is not older than
+    max_age_hours. The list holds the records as zlib compressed JSON, encoded in base64.
+
+    :type list_name: ``str``
+    :param list_name: The name of the list to keep the records in. If empty, nothing is kept between runs.
+
+    :type version: ``str``
+    :param version:
+        The version of the records, for example the arguments they were extracted with. Records of another
+        version are dropped.
+
+    :type max_age_hours: ``float``
+    :param max_age_hours: The number of hours a record is reused for, even if its incident was not modified.
+
+    :type max_records: ``int``
+    :param max_records: The maximal number of records to keep, the oldest records are dropped.
+
+    :return: No data returned
+    :rtype: ``None``
+    """
+
+    def __init__(self, list_name, version='', max_age_hours=24, max_records=5000):
+        self.list_name = list_name
+        self.version = version
+        self.max_age_seconds = float(max_age_hours) * 3600
+        self.max_records = max_records
+        self.records = {}  # type: dict
+        self.hits = 0
+        self.misses = 0
+        self._modified = False
+        self._loaded = False
+
+    @staticmethod
+    def encode(data):
+        return base64.b64encode(zlib.compress(json.dumps(data).encode('utf-8'))).decode('ascii')
+
+    @staticmethod
+    def decode(list_data):
+        return json.loads(zlib.decompress(base64.b64decode(list_data)).decode('utf-8'))
+
+    def load(self):
+        """Reads the records from the list, once."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.list_name:
+            return
+        res = demisto.executeCommand('getList', {'listName': self.list_name})
+        if not res or is_error(res) or not res[0].get('Contents'):
+            return
+        try:
+            data = self.decode(res[0]['Contents'])
+        except Exception:
+            demisto.debug('Ignoring invalid incident feature store list {}'.format(self.list_name))
+            return
+        if isinstance(data, dict) and data.get('version') == self.version:
+            self.records = data.get('records') or {}
+
+    def get(self, incident):
+        """
+        Returns the record of the incident, or None if it has no valid record.
+
+        :type incident: ``dict``
+        :param incident: The incident, as returned by getIncidents.
+
+        :return: The record of the incident
+        :rtype: ``object``
+        """
+        self.load()
+        entry = self.records.get(str(incident['id']))
+        is_valid = entry is not None and entry['modified'] == incident.get('modified') and \
+            time.time() - entry['stored'] <= self.max_age_seconds
+        if not is_valid:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['record']
+
+    def set(self, incident, record):
+        """
+        Keeps the record of the incident.
+
+        :type incident: ``dict``
+        :param incident: The incident, as returned by getIncidents.
+
+        :type record: ``object``
+        :param record: The record of the incident, anything which can be converted to JSON except None.
+
+        :return: No data returned
+        :rtype: ``None``
+        """
+        self.load()
+        self.records[str(incident['id'])] = {'modified': incident.get('modified'), 'stored': time.time(),
+                                             'record': record}
+        self._modified = True
+
+    def get_records(self, incidents, extract):
+        """
+        Returns the record of each of the incidents, extracting the records of the incidents without a valid one.
+
+        :type incidents: ``list``
+        :param incidents: The incidents, as returned by getIncidents.
+
+        :type extract: ``callable``
+        :param extract:
+            A function which gets a list of incidents and returns their records, in the same order. Called at most
+            once, with the incidents whose records are missing.
+
+        :return: The records, in the order of the incidents
+        :rtype: ``list``
+        """
+        incidents = list(incidents)
+        records = [self.get(incident) for incident in incidents]
+        missing = [index for index, record in enumerate(records) if record is None]
+        if missing:
+            extracted = extract([incidents[index] for index in missing])
+            for index, record in zip(missing, extracted):
+                records[index] = record
+                self.set(incidents[index], record)
+        return records
+
+    def save(self):
+        """Writes the records to the list, if any record was added. Expired and excess records are dropped."""
+        if not self.list_name or not self._modified:
+            return
+        now = time.time()
+        entries = sorted(((key, entry) for key, entry in self.records.items()
+                          if now - entry['stored'] <= self.max_age_seconds),
+                         key=lambda item: item[1]['stored'], reverse=True)
+        self.records = dict(entries[:self.max_records])
+        list_data = self.encode({'version': self.version, 'records': self.records})
+        res = demisto.executeCommand('setList', {'listName': self.list_name, 'listData': list_data})
+        if is_error(res):
+            # servers without setList can only create the list
+            res = demisto.executeCommand('createList', {'listName': self.list_name, 'listData': list_data})
+        if is_error(res):
+            demisto.debug('Failed to save the incident feature store list {}: {}'.format(
+                self.list_name, get_error(res)))
+        self._modified = False
+
+
+def project_context(context, keys):
+    """
+    Returns the part of a context with the given key paths only.
+
+    :type context: ``dict``
+    :param context: The context to project.
+
+    :type keys: ``list``
+    :param keys: The key paths to keep, separated by dots (for example Email.From). Lists along a path are projected
+        item by item, and their items which are not dicts are replaced with {}.
+
+    :return: The projected context
+    :rtype: ``dict``
+    """
+    def project(value, paths):
+        if any(not path for path in paths):
+            return value
+        if isinstance(value, list):
+            # items without the paths are kept as {}, so every item stays in its position
+            return [project(item, paths) if isinstance(item, (dict, list)) else {} for item in value]
+        if not isinstance(value, dict):
+            return None
+        sub_paths = {}  # type: dict
+        for path in paths:
+            key, _, rest = path.partition('.')
+            sub_paths.setdefault(key, []).append(rest)
+        projected = {}
+        for key, key_paths in sub_paths.items():
+            if key in value:
+                sub_value = project(value[key], key_paths)
+                if sub_value is not None:
+                    projected[key] = sub_value
+        return projected
+
+    if not keys:
+        return context
+    return project(context or {}, list(keys)) or {}
+
+
+def get_incidents_contexts(incident_ids, keys=None, batch_size=100):
+    """
+    Returns the contexts of the incidents. The getContext commands are sent in batches of batch_size commands, one
+    round trip per batch, when the server supports executeCommandBatch, and one by one otherwise.
+
+    :type incident_ids: ``list``
+    :param incident_ids: The ids of the incidents.
+
+    :type keys: ``list``
+    :param keys: The context key paths to keep, see project_context. If empty, the whole contexts are returned.
+
+    :type batch_size: ``int``
+    :param batch_size: The maximal number of getContext commands sent in one batch.
+
+    :return: The contexts, in the order of the ids ({} for an incident whose context could not be read)
+    :rtype: ``list``
+    """
+    def get_context(res):
+        try:
+            return project_context(res[0]['Contents'].get('context') or {}, keys)
+        except Exception:
+            return {}
+
+    incident_ids = list(incident_ids)
+    execute_command_batch = getattr(demisto, 'executeCommandBatch', None)
+    contexts = []  # type: list
+    for start in range(0, len(incident_ids), batch_size):
+        commands = [{'command': 'getContext', 'args': {'id': incident_id}}
+                    for incident_id in incident_ids[start:start + batch_size]]
+        if execute_command_batch:
+            results = execute_command_batch(commands)
+        else:
+            results = [demisto.executeCommand(command['command'], command['args']) for command in commands]
+        contexts.extend(get_context(res) for res in results)
+    return contexts
+
+
 # Will add only if 'requests' module imported
 if 'requests' in sys.modules:
+    def get_http_pool_params():
+        """
+        Returns the connection pool settings of the integration, which can be set with the optional integration
+        parameters: http_pool_size, http_connection_retries and http_keep_alive.
+
+        :return: The keyword arguments for create_pooled_session and get_pooled_session
+        :rtype: ``dict``
+        """
+        # scripts do not have integration parameters
+        params = demisto.params() if hasattr(demisto, 'params') else {}
+        return {
+            'pool_size': int(params.get('http_pool_size') or 10),
+            'connection_retries': int(params.get('http_connection_retries') or 0),
+            'keep_alive': params.get('http_keep_alive', True) not in (False, 'false', 'False')
+        }
+
+    def create_pooled_session(pool_size=10, connection_retries=0, keep_alive=True):
+        """
+        Creates a requests session with a tuned connection pool.
+
+        :type pool_size: ``int``
+        :param pool_size: The maximal number of connections kept open per host.
+
+        :type connection_retries: ``int``
+        :param connection_retries:
+            The number of times to retry failed connections. Does not apply to requests which got a response.
+
+        :type keep_alive: ``bool``
+        :param keep_alive: Whether to keep connections open between requests.
+
+        :return: The session
+        :rtype: ``requests.Session``
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size, max_retries=connection_retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    _pooled_sessions = {}  # type: dict
+    _pooled_sessions_lock = threading.Lock()
+
+    def get_pooled_session(pool_size=10, connection_retries=0, keep_alive=True):
+        """
+        Returns the session shared by all the callers in the process that use the same pool settings.
+
+        :type pool_size: ``int``
+        :param pool_size: The maximal number of connections kept open per host.
+
+        :type connection_retries: ``int``
+        :param connection_retries:
+            The number of times to retry failed connections. Does not apply to requests which got a response.
+
+        :type keep_alive: ``bool``
+        :param keep_alive: Whether to keep connections open between requests.
+
+        :return: The shared session
+        :rtype: ``requests.Session``
+        """
+        key = (pool_size, connection_retries, keep_alive)
+        with _pooled_sessions_lock:
+            if key not in _pooled_sessions:
+                _pooled_sessions[key] = create_pooled_session(pool_size, connection_retries, keep_alive)
+            return _pooled_sessions[key]
+
+    def pooled_request(method, url, **kwargs):
+        """
+        Sends a request through the shared session of the integration pool settings (see get_http_pool_params).
+        A drop-in replacement for requests.request in module level http_request functions, so connections
+        (and TLS handshakes) are reused between requests.
+
+        :type method: ``str``
+        :param method: The HTTP method, for example: GET, POST, and so on.
+
+        :type url: ``str``
+        :param url: The request URL.
+
+        :return: The response
+        :rtype: ``requests.Response``
+        """
+        return get_pooled_session(**get_http_pool_params()).request(method, url, **kwargs)
+
     class BaseClient(object):
         """Client to use in integrations with powerful _http_request
         :type base_url: ``str``
@@ -2223,21 +2781,145 @@ if 'requests' in sys.modules:
             The request authorization, for example: (username, password).
             Can be None.
 
+        :type retries: ``int``
+        :param retries:
+            The number of times to retry a request which returned one of the status_list_to_retry codes.
+            Default is 0 (no retries).
+
+        :type backoff_factor: ``float``
+        :param backoff_factor:
+            The base of the exponential backoff between retries, the n-th retry waits up to
+            backoff_factor * 2 ** (n - 1) seconds (with jitter). A Retry-After header of the response is honored.
+
+        :type max_backoff: ``float``
+        :param max_backoff: The maximal number of seconds to wait before a retry.
+
+        :type status_list_to_retry: ``tuple``
+        :param status_list_to_retry: The response status codes to retry on, for example: (429, 503).
+
+        :type rate_limit: ``float``
+        :param rate_limit:
+            The maximal number of requests per second to send to the base URL, shared by all clients in the process
+            that use the same base URL. Can be None (no rate limit).
+
+        :type rate_limit_burst: ``int``
+        :param rate_limit_burst: The number of requests that can be sent at once before the rate limit is enforced.
+
+        :type pool_size: ``int``
+        :param pool_size:
+            The maximal number of connections kept open to the server.
+            If None, will use the http_pool_size integration parameter (default 10).
+
+        :type connection_retries: ``int``
+        :param connection_retries:
+            The number of times to retry failed connections. Does not apply to requests which got a response.
+            If None, will use the http_connection_retries integration parameter (default 0).
+
+        :type keep_alive: ``bool``
+        :param keep_alive:
+            Whether to keep connections open between requests.
+            If None, will use the http_keep_alive integration parameter (default True).
+
         :return: No data returned
         :rtype: ``None``
         """
 
-        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None):
+        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None,
+                     retries=0, backoff_factor=1, max_backoff=60, status_list_to_retry=(429, 500, 502, 503, 504),
+                     rate_limit=None, rate_limit_burst=1, pool_size=None, connection_retries=None, keep_alive=None):
             self._base_url = base_url
             self._verify = verify
             self._ok_codes = ok_codes
             self._headers = headers
             self._auth = auth
-            self._session = requests.Session()
+            pool_params = get_http_pool_params()
+            self._session = create_pooled_session(
+                pool_size=pool_size if pool_size is not None else pool_params['pool_size'],
+                connection_retries=connection_retries if connection_retries is not None
+                else pool_params['connection_retries'],
+                keep_alive=keep_alive if keep_alive is not None else pool_params['keep_alive']
+            )
             if proxy:
                 self._proxies = handle_proxy()
             else:
                 self._proxies = None
+            self._retries = retries
+            self._backoff_factor = backoff_factor
+            self._max_backoff = max_backoff
+            self._status_list_to_retry = status_list_to_retry
+            self._rate_limiter = get_rate_limiter(base_url, rate_limit, rate_limit_burst) if rate_limit else None
+            # metrics are kept per thread, so they are correct for clients shared between threads
+            self._request_metrics = threading.local()
+
+        @property
+        def last_request_metrics(self):
+            """The metrics of the last request sent by the current thread, for example:
+            {'attempts': 2, 'retry_wait_time': 1.2, 'rate_limit_wait_time': 0.5, 'status_code': 200}
+
+            :return: The metrics of the last request, or None if no request was sent
+            :rtype: ``dict``
+            """
+            return getattr(self._request_metrics, 'last', None)
+
+        def _get_retry_wait_time(self, response, attempt):
+            """Returns the number of seconds to wait before retrying a request.
+
+            :type response: ``requests.Response``
+            :param response: The response of the failed attempt.
+
+            :type attempt: ``int``
+            :param attempt: The number of the failed attempt, starting from 1.
+
+            :return: The number of seconds to wait
+            :rtype: ``float``
+            """
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    wait_time = float(retry_after)
+                except ValueError:
+                    # Retry-After can also be an HTTP date
+                    from email.utils import parsedate_tz, mktime_tz
+                    parsed_date = parsedate_tz(retry_after)
+                    wait_time = mktime_tz(parsed_date) - time.time() if parsed_date else None
+                if wait_time is not None:
+                    return min(max(wait_time, 0), self._max_backoff)
+
+            backoff = min(float(self._backoff_factor) * 2 ** (attempt - 1), self._max_backoff)
+            # half of the backoff is randomized so clients that failed together do not retry together
+            return backoff / 2 + random.uniform(0, backoff / 2)
+
+        @staticmethod
+        def _get_body_streams(data, files):
+            """Returns each stream in the request body with its position, so the streams can be rewound before
+            a retry, as every attempt reads them.
+
+            :type data: ``object``
+            :param data: The data argument of the request.
+
+            :type files: ``dict`` or ``list``
+            :param files: The files argument of the request.
+
+            :return: A list of (stream, position) tuples, or None if a stream of the body cannot be rewound
+            :rtype: ``list``
+            """
+            values = [data]
+            if files:
+                file_values = files.values() if isinstance(files, dict) else [value for _, value in files]
+                values.extend(value[1] if isinstance(value, (tuple, list)) else value for value in file_values)
+            streams = []
+            for value in values:
+                if hasattr(value, 'read'):
+                    try:
+                        streams.append((value, value.tell()))
+                    except Exception:
+                        return None
+                    if not hasattr(value, 'seek'):
+                        return None
+                elif hasattr(value, '__next__') or hasattr(value, 'next'):
+                    # a generator is read once
+                    return None
+            return streams
 
         def _http_request(self, method, url_suffix, full_url=None, headers=None,
                           auth=None, json_data=None, params=None, data=None, files=None,
@@ -2300,21 +2982,42 @@ if 'requests' in sys.modules:
                 address = full_url if full_url else self._base_url + url_suffix
                 headers = headers if headers else self._headers
                 auth = auth if auth else self._auth
-                # Execute
-                res = self._session.request(
-                    method,
-                    address,
-                    verify=self._verify,
-                    params=params,
-                    data=data,
-                    json=json_data,
-                    files=files,
-                    headers=headers,
-                    auth=auth,
-                    timeout=timeout,
-                    proxies=self._proxies,
-                    **kwargs
-                )
+                metrics = {'attempts': 0, 'retry_wait_time': 0, 'rate_limit_wait_time': 0, 'status_code': None}
+                self._request_metrics.last = metrics
+                body_streams = self._get_body_streams(data, files) if self._retries else []
+                while True:
+                    if self._rate_limiter:
+                        metrics['rate_limit_wait_time'] += self._rate_limiter.acquire()
+                    # Execute
+                    res = self._session.request(
+                        method,
+                        address,
+                        verify=self._verify,
+                        params=params,
+                        data=data,
+                        json=json_data,
+                        files=files,
+                        headers=headers,
+                        auth=auth,
+                        timeout=timeout,
+                        proxies=self._proxies,
+                        **kwargs
+                    )
+                    metrics['attempts'] += 1
+                    metrics['status_code'] = res.status_code
+                    if metrics['attempts'] > self._retries or res.status_code not in self._status_list_to_retry \
+                            or self._is_status_code_valid(res, ok_codes):
+                        break
+                    if body_streams is None:
+                        # the body was read by the failed attempt and cannot be sent again
+                        break
+                    for stream, position in body_streams:
+                        stream.seek(position)
+                    wait_time = self._get_retry_wait_time(res, metrics['attempts'])
+                    metrics['retry_wait_time'] += wait_time
+                    time.sleep(wait_time)
+                if metrics['attempts'] > 1 or metrics['rate_limit_wait_time']:
+                    demisto.debug('Request {} {} metrics: {}'.format(method, address, metrics))
                 # Handle error responses gracefully
                 if not self._is_status_code_valid(res, ok_codes):
                     err_msg = 'Error in API call [{}] - {}' \
@@ -2363,6 +3066,62 @@ if 'requests' in sys.modules:
                     .format(err_type, exception.errno, exception.strerror)
                 raise DemistoException(err_msg, exception)
 
+        def _map_requests(self, func, items, max_workers=10):
+            """Calls func on each of the items concurrently, for example to enrich many indicators at once.
+            Requests sent with _http_request from func share the client session and rate limit.
+
+            :type func: ``callable``
+            :param func: The function to call with each item.
+
+            :type items: ``list``
+            :param items: The items to call the function with.
+
+            :type max_workers: ``int``
+            :param max_workers:
+                The maximal number of concurrent calls, should not be more than the connection pool size.
+
+            :return:
+                The result of each call in the order of the items. If a call raised an exception,
+                the exception is returned in its place, so the failures do not fail the other calls.
+            :rtype: ``list``
+            """
+            def call(item):
+                try:
+                    return func(item)
+                except Exception as exception:
+                    return exception
+
+            items = list(items)
+            if len(items) <= 1 or max_workers <= 1:
+                return [call(item) for item in items]
+
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(max_workers, len(items)))
+            try:
+                return pool.map(call, items)
+            finally:
+                pool.close()
+                pool.join()
+
+        def _http_request_many(self, requests_kwargs, max_workers=10):
+            """Sends many requests concurrently with _http_request.
+
+            :type requests_kwargs: ``list``
+            :param requests_kwargs:
+                The keyword arguments of each request, for example:
+                [{'method': 'GET', 'url_suffix': 'file/report', 'params': {'resource': resource}}, ...]
+
+            :type max_workers: ``int``
+            :param max_workers:
+                The maximal number of concurrent requests, should not be more than the connection pool size.
+
+            :return:
+                The result of each request in the order of requests_kwargs. If a request failed,
+                the exception (usually a DemistoException) is returned in its place.
+            :rtype: ``list``
+            """
+            return self._map_requests(lambda kwargs: self._http_request(**kwargs), requests_kwargs, max_workers)
+
         def _is_status_code_valid(self, response, ok_codes=None):
             """If the status code is OK, return 'True'.
 
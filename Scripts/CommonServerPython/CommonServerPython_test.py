@@ -4,6 +4,7 @@ import copy
 import json
 import os
 import sys
+import time
 import requests
 from pytest import raises, mark
 import pytest
@@ -315,6 +316,39 @@ def test_tbl_to_md_dict_with_special_character():
     assert table_with_character == expected_string_with_special_character
 
 
+def test_tbl_to_md_max_rows():
+    table = tableToMarkdown('tableToMarkdown test with max rows', DATA, maxRows=2)
+    expected_table = '''### tableToMarkdown test with max rows
+|header_1|header_2|header_3|
+|---|---|---|
+| a1 | b1 | c1 |
+| a2 | b2 | c2 |
+
+**1 more rows omitted.**
+'''
+    assert table == expected_table
+    assert tableToMarkdown('tableToMarkdown test', DATA, maxRows=3) == tableToMarkdown('tableToMarkdown test', DATA)
+
+
+def test_tbl_to_md_remove_null_keeps_headers_order():
+    data = [{'a': None, 'b': 'b1', 'c': []}, {'a': None, 'b': '', 'c': ['c2']}]
+    headers = ['c', 'a', 'b']
+    table = tableToMarkdown('tableToMarkdown test remove null', data, headers=headers, removeNull=True)
+    expected_table = '''### tableToMarkdown test remove null
+|c|b|
+|---|---|
+|  | b1 |
+| c2 |  |
+'''
+    assert table == expected_table
+    assert headers == ['c', 'a', 'b']
+
+
+def test_tbl_to_md_string_array_remove_null():
+    table = tableToMarkdown('tableToMarkdown test', ['foo', 'bar'], ['header_1'], removeNull=True)
+    assert table == '### tableToMarkdown test\n|header_1|\n|---|\n| foo |\n| bar |\n'
+
+
 def test_tbl_to_md_header_with_special_character():
     data = {
         'header_1': u'foo'
@@ -881,6 +915,169 @@ class TestBaseClient:
         response.status_code = 400
         assert not self.client._is_status_code_valid(response)
 
+    def test_http_request_retry_on_status(self, requests_mock, mocker):
+        from CommonServerPython import BaseClient
+        sleep_mock = mocker.patch('time.sleep')
+        requests_mock.get('http://example.com/api/v2/event', [
+            {'status_code': 503},
+            {'status_code': 429, 'headers': {'Retry-After': '3'}},
+            {'status_code': 200, 'text': json.dumps(self.text)},
+        ])
+        client = BaseClient('http://example.com/api/v2/', retries=2, backoff_factor=2)
+        res = client._http_request('get', 'event')
+        assert res == self.text
+        waits = [call[0][0] for call in sleep_mock.call_args_list]
+        assert 1 <= waits[0] <= 2
+        assert waits[1] == 3
+        metrics = client.last_request_metrics
+        assert metrics['attempts'] == 3
+        assert metrics['status_code'] == 200
+        assert metrics['retry_wait_time'] == sum(waits)
+
+    def test_http_request_retry_rewinds_files(self, requests_mock, mocker):
+        from io import BytesIO
+        from CommonServerPython import BaseClient
+        mocker.patch('time.sleep')
+        bodies = []
+
+        def upload(request, context):
+            bodies.append(request.body)
+            context.status_code = 503 if len(bodies) == 1 else 200
+            return json.dumps(self.text)
+
+        requests_mock.post('http://example.com/api/v2/upload', text=upload)
+        client = BaseClient('http://example.com/api/v2/', retries=1)
+        file_content = BytesIO(b'file content')
+        file_content.read(5)
+        client._http_request('post', 'upload', files={'file': ('name.txt', file_content), 'other': BytesIO(b'other')})
+
+        assert len(bodies) == 2
+        for body in bodies:
+            # each attempt sends the files from the position they were given at
+            assert b'content' in body and b'file content' not in body
+            assert b'other' in body
+
+    def test_http_request_no_retry_with_generator_body(self, requests_mock, mocker):
+        from CommonServerPython import BaseClient, DemistoException
+        mocker.patch('time.sleep')
+        requests_mock.post('http://example.com/api/v2/upload', status_code=503)
+        client = BaseClient('http://example.com/api/v2/', retries=2)
+        with raises(DemistoException, match="503"):
+            client._http_request('post', 'upload', data=(chunk for chunk in [b'a', b'b']))
+        assert requests_mock.call_count == 1
+
+    def test_http_request_retries_exhausted(self, requests_mock, mocker):
+        from CommonServerPython import BaseClient, DemistoException
+        mocker.patch('time.sleep')
+        requests_mock.get('http://example.com/api/v2/event', status_code=429)
+        client = BaseClient('http://example.com/api/v2/', retries=2)
+        with raises(DemistoException, match="429"):
+            client._http_request('get', 'event')
+        assert requests_mock.call_count == 3
+        assert client.last_request_metrics['attempts'] == 3
+
+    def test_http_request_no_retry_by_default(self, requests_mock, mocker):
+        from CommonServerPython import DemistoException
+        sleep_mock = mocker.patch('time.sleep')
+        requests_mock.get('http://example.com/api/v2/event', status_code=503)
+        with raises(DemistoException, match="503"):
+            self.client._http_request('get', 'event')
+        assert requests_mock.call_count == 1
+        assert not sleep_mock.called
+
+    def test_http_request_retry_after_date(self, requests_mock, mocker):
+        from email.utils import formatdate
+        from CommonServerPython import BaseClient
+        sleep_mock = mocker.patch('time.sleep')
+        retry_after = formatdate(time.time() + 3600, usegmt=True)
+        requests_mock.get('http://example.com/api/v2/event', [
+            {'status_code': 429, 'headers': {'Retry-After': retry_after}},
+            {'status_code': 200, 'text': json.dumps(self.text)},
+        ])
+        client = BaseClient('http://example.com/api/v2/', retries=1, max_backoff=30)
+        client._http_request('get', 'event')
+        assert sleep_mock.call_args[0][0] == 30
+
+    def test_http_request_rate_limit(self, requests_mock, mocker):
+        from CommonServerPython import BaseClient
+        mocker.patch('time.time', return_value=1000.0)
+        sleep_mock = mocker.patch('time.sleep')
+        requests_mock.get('http://rate-limited.com/api/event', text=json.dumps(self.text))
+        client = BaseClient('http://rate-limited.com/api/', rate_limit=2, rate_limit_burst=2)
+        other_client = BaseClient('http://rate-limited.com/api/', rate_limit=2, rate_limit_burst=2)
+        client._http_request('get', 'event')
+        other_client._http_request('get', 'event')
+        assert not sleep_mock.called
+        # the bucket is shared by the clients of the base URL
+        other_client._http_request('get', 'event')
+        client._http_request('get', 'event')
+        assert [call[0][0] for call in sleep_mock.call_args_list] == [0.5, 1.0]
+        assert client.last_request_metrics['rate_limit_wait_time'] == 1.0
+
+    def test_pool_settings_from_integration_params(self, mocker):
+        from CommonServerPython import BaseClient
+        mocker.patch.object(demisto, 'params', return_value={'http_pool_size': '50', 'http_connection_retries': '2',
+                                                             'http_keep_alive': False})
+        client = BaseClient('http://example.com/api/v2/')
+        adapter = client._session.get_adapter('https://example.com')
+        assert adapter._pool_maxsize == 50
+        assert adapter.max_retries.total == 2
+        assert client._session.headers['Connection'] == 'close'
+
+    def test_pool_settings_from_arguments(self, mocker):
+        from CommonServerPython import BaseClient
+        mocker.patch.object(demisto, 'params', return_value={'http_pool_size': '50'})
+        client = BaseClient('http://example.com/api/v2/', pool_size=5, keep_alive=True)
+        assert client._session.get_adapter('http://example.com')._pool_maxsize == 5
+        assert client._session.headers['Connection'] != 'close'
+
+    def test_http_request_many(self, requests_mock):
+        from CommonServerPython import DemistoException
+        for i in range(20):
+            requests_mock.get('http://example.com/api/v2/event/{}'.format(i), text=json.dumps({'id': i}))
+        requests_mock.get('http://example.com/api/v2/event/error', status_code=404)
+        requests_kwargs = [{'method': 'GET', 'url_suffix': 'event/{}'.format(i)} for i in range(20)]
+        requests_kwargs.insert(5, {'method': 'GET', 'url_suffix': 'event/error'})
+        res = self.client._http_request_many(requests_kwargs, max_workers=5)
+        assert len(res) == 21
+        assert isinstance(res[5], DemistoException)
+        assert [r['id'] for r in res[:5] + res[6:]] == list(range(20))
+
+    def test_map_requests_is_concurrent(self):
+        import threading
+        barrier_lock = threading.Condition()
+        running = []
+
+        def wait_for_all(item):
+            # every call waits until all of them are running, so this only finishes if they run concurrently
+            with barrier_lock:
+                running.append(item)
+                barrier_lock.notify_all()
+                while len(running) < 4:
+                    if not barrier_lock.wait(5):
+                        raise RuntimeError('calls are not concurrent')
+            return item * 2
+
+        assert self.client._map_requests(wait_for_all, [1, 2, 3, 4], max_workers=4) == [2, 4, 6, 8]
+
+    def test_map_requests_serial(self):
+        res = self.client._map_requests(lambda item: 10 // item, [1, 0, 5], max_workers=1)
+        assert res[0] == 10
+        assert isinstance(res[1], ZeroDivisionError)
+        assert res[2] == 2
+
+
+def test_pooled_request_reuses_session(requests_mock, mocker):
+    from CommonServerPython import pooled_request, get_pooled_session
+    mocker.patch.object(demisto, 'params', return_value={'http_pool_size': '20'})
+    requests_mock.get('http://example.com/api', text='ok')
+    assert pooled_request('GET', 'http://example.com/api').text == 'ok'
+    assert pooled_request('GET', 'http://example.com/api').text == 'ok'
+    session = get_pooled_session(pool_size=20)
+    assert session is get_pooled_session(pool_size=20)
+    assert session is not get_pooled_session(pool_size=10)
+    assert session.get_adapter('https://example.com')._pool_maxsize == 20
+
 
 def test_parse_date_string():
     # test unconverted data remains: Z
@@ -986,3 +1183,274 @@ class TestReturnOutputs:
         assert outputs == results['Contents']
         assert outputs == results['EntryContext']
         assert md == results['HumanReadable']
+
+
+class TestPaginate:
+    ITEMS = list(range(23))
+
+    def get_page(self, calls):
+        def get_page(cursor):
+            calls.append(cursor)
+            start = cursor or 0
+            next_cursor = start + 10 if start + 10 < len(self.ITEMS) else None
+            return self.ITEMS[start:start + 10], next_cursor
+        return get_page
+
+    @pytest.mark.parametrize('prefetch', [False, True])
+    def test_paginate_cursor(self, prefetch):
+        from CommonServerPython import paginate
+        calls = []
+        assert list(paginate(self.get_page(calls), prefetch=prefetch)) == self.ITEMS
+        assert calls == [None, 10, 20]
+
+    def test_paginate_is_lazy(self):
+        from CommonServerPython import paginate
+        calls = []
+        items = paginate(self.get_page(calls))
+        assert calls == []
+        assert next(items) == 0
+        assert calls == [None]
+
+    def test_paginate_limit(self):
+        from CommonServerPython import paginate
+        calls = []
+        assert list(paginate(self.get_page(calls), limit=10, prefetch=True)) == self.ITEMS[:10]
+        assert calls == [None]
+
+    def test_paginate_zero_limit(self):
+        from CommonServerPython import paginate, paginate_offset, paginate_range_header
+        calls = []
+
+        def fetch_page(*args):
+            calls.append(args)
+            return [1]
+
+        assert list(paginate(self.get_page(calls), limit=0)) == []
+        assert list(paginate_offset(fetch_page, 10, limit=0)) == []
+        assert list(paginate_range_header(fetch_page, 10, limit=0)) == []
+        assert calls == []
+
+    def test_paginate_empty_page(self):
+        from CommonServerPython import paginate
+        assert list(paginate(lambda token: ([], 'next'))) == []
+
+    def test_paginate_prefetch_error(self):
+        from CommonServerPython import paginate
+
+        def get_page(cursor):
+            if cursor:
+                raise ValueError('page error')
+            return [1, 2], 'next'
+
+        items = paginate(get_page, prefetch=True)
+        assert next(items) == 1
+        assert next(items) == 2
+        with raises(ValueError, match='page error'):
+            next(items)
+
+    @pytest.mark.parametrize('prefetch', [False, True])
+    def test_paginate_offset(self, prefetch):
+        from CommonServerPython import paginate_offset
+        calls = []
+
+        def fetch_page(offset, limit):
+            calls.append((offset, limit))
+            return self.ITEMS[offset:offset + limit]
+
+        assert list(paginate_offset(fetch_page, 10, prefetch=prefetch)) == self.ITEMS
+        assert calls == [(0, 10), (10, 10), (20, 10)]
+
+    def test_paginate_offset_limit(self):
+        from CommonServerPython import paginate_offset
+        calls = []
+
+        def fetch_page(offset, limit):
+            calls.append((offset, limit))
+            return self.ITEMS[offset:offset + limit]
+
+        assert list(paginate_offset(fetch_page, 10, offset=5, limit=12)) == self.ITEMS[5:17]
+        assert calls == [(5, 10), (15, 2)]
+
+    def test_paginate_range_header(self):
+        from CommonServerPython import paginate_range_header
+        ranges = []
+
+        def fetch_page(range_header):
+            ranges.append(range_header)
+            first, last = map(int, range_header.split('=')[1].split('-'))
+            return self.ITEMS[first:last + 1]
+
+        assert list(paginate_range_header(fetch_page, 10)) == self.ITEMS
+        assert ranges == ['items=0-9', 'items=10-19', 'items=20-29']
+
+
+def legacy_create_context_single(obj, id=None, keyTransform=None, removeNull=False):
+    res = {}
+    if keyTransform is None:
+        keyTransform = lambda s: s  # noqa
+    for key in obj.keys():
+        if removeNull and obj[key] in ('', None, [], {}):
+            continue
+        values = key.split('.')
+        current = res
+        for v in values[:-1]:
+            current.setdefault(v, {})
+            current = current[v]
+        current[keyTransform(values[-1])] = obj[key]
+    if id is not None:
+        res.setdefault('ID', id)
+    return res
+
+
+CONTEXT_ROWS = [
+    {'id': 1, 'file.name': 'a.exe', 'file.hash.md5': 'md5', 'file.hash.sha1': None, 'tags': []},
+    {'id': 2, 'file.name': 'b.exe', 'file.hash.md5': '', 'file.hash.sha1': 'sha1', 'tags': ['x']},
+    {'other': 'row', 'nested.other_key': {'a': 1}},
+]
+
+
+@pytest.mark.parametrize('id, keyTransform, removeNull', [
+    (None, None, False),
+    ('1234', None, True),
+    (None, underscoreToCamelCase, False),
+    ('1234', underscoreToCamelCase, True),
+])
+def test_create_context_same_as_legacy(id, keyTransform, removeNull):
+    from CommonServerPython import createContext, createContextSingle
+    expected = [legacy_create_context_single(row, id, keyTransform, removeNull) for row in CONTEXT_ROWS]
+    assert createContext(CONTEXT_ROWS, id, keyTransform, removeNull) == expected
+    # a second call uses the cached schemas
+    assert createContext(CONTEXT_ROWS, id, keyTransform, removeNull) == expected
+    assert createContextSingle(CONTEXT_ROWS[1], id, keyTransform, removeNull) == expected[1]
+    assert createContext(CONTEXT_ROWS[2], id, keyTransform, removeNull) == expected[2]
+
+
+def test_create_context_rows_do_not_share_objects():
+    from CommonServerPython import createContext
+    res = createContext([{'a.b': 1}, {'a.b': 2}])
+    assert res == [{'a': {'b': 1}}, {'a': {'b': 2}}]
+    assert res[0]['a'] is not res[1]['a']
+
+
+def test_create_context_schema_cache_is_bounded(mocker):
+    import CommonServerPython
+    mocker.patch.object(CommonServerPython, 'CONTEXT_SCHEMA_CACHE_SIZE', 2)
+    for i in range(5):
+        assert CommonServerPython.createContextSingle({'key{}.sub'.format(i): i}) == {'key{}'.format(i): {'sub': i}}
+    assert len(CommonServerPython._context_schema_cache) == 2
+
+
+class TestIncidentFeatureStore(object):
+    @staticmethod
+    def mock_lists(mocker, lists, commands=('getList', 'setList', 'createList')):
+        def execute_command(command, args):
+            if command not in commands:
+                return [{'Type': entryTypes['error'], 'Contents': 'Unsupported Command'}]
+            if command == 'getList':
+                if args['listName'] not in lists:
+                    return [{'Type': entryTypes['error'], 'Contents': 'Item not found (8)'}]
+                return [{'Type': entryTypes['note'], 'Contents': lists[args['listName']]}]
+            lists[args['listName']] = args['listData']
+            return [{'Type': entryTypes['note'], 'Contents': 'Done'}]
+
+        return mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+
+    def test_reuses_records_of_unmodified_incidents(self, mocker):
+        from CommonServerPython import IncidentFeatureStore
+        lists = {}
+        self.mock_lists(mocker, lists)
+        incidents = [{'id': '1', 'modified': 'a'}, {'id': '2', 'modified': 'a'}]
+        extract = mocker.Mock(side_effect=lambda extracted: [{'words': [i['id']]} for i in extracted])
+
+        store = IncidentFeatureStore('features', 'v1')
+        assert store.get_records(incidents, extract) == [{'words': ['1']}, {'words': ['2']}]
+        store.save()
+        assert 'features' in lists
+
+        incidents = [{'id': '2', 'modified': 'b'}, {'id': '1', 'modified': 'a'}, {'id': '3', 'modified': 'a'}]
+        store = IncidentFeatureStore('features', 'v1')
+        assert store.get_records(incidents, extract) == [{'words': ['2']}, {'words': ['1']}, {'words': ['3']}]
+        # only the modified and the new incidents are extracted, in one call
+        assert extract.call_args[0][0] == [incidents[0], incidents[2]]
+        assert (store.hits, store.misses) == (1, 2)
+
+    def test_drops_records_of_another_version_or_too_old(self, mocker):
+        from CommonServerPython import IncidentFeatureStore
+        lists = {}
+        self.mock_lists(mocker, lists)
+        incidents = [{'id': 1, 'modified': 'a'}]
+        store = IncidentFeatureStore('features', 'v1')
+        store.get_records(incidents, lambda extracted: [{}])
+        store.save()
+
+        assert IncidentFeatureStore('features', 'v2').get(incidents[0]) is None
+        assert IncidentFeatureStore('features', 'v1').get(incidents[0]) == {}
+        mocker.patch.object(time, 'time', return_value=time.time() + 25 * 3600)
+        assert IncidentFeatureStore('features', 'v1', max_age_hours=24).get(incidents[0]) is None
+
+    def test_keeps_newest_records(self, mocker):
+        from CommonServerPython import IncidentFeatureStore
+        lists = {}
+        self.mock_lists(mocker, lists, commands=('getList', 'createList'))
+        store = IncidentFeatureStore('features', max_records=2)
+        for i in range(3):
+            mocker.patch.object(time, 'time', return_value=1000 + i)
+            store.set({'id': i, 'modified': 'a'}, i)
+        store.save()
+
+        assert sorted(IncidentFeatureStore.decode(lists['features'])['records']) == ['1', '2']
+
+    def test_disabled_without_list_name(self, mocker):
+        from CommonServerPython import IncidentFeatureStore
+        execute_command = self.mock_lists(mocker, {})
+        store = IncidentFeatureStore('')
+        assert store.get_records([{'id': 1}], lambda extracted: ['record']) == ['record']
+        store.save()
+        assert execute_command.call_count == 0
+
+
+def test_project_context():
+    from CommonServerPython import project_context
+    context = {'Email': [{'From': 'a', 'To': 'b'}, {'From': 'c'}, 'text'],
+               'File': {'Name': 'f', 'Hash': {'MD5': 'm', 'SHA1': 's'}},
+               'Other': 1}
+
+    assert project_context(context, ['Email.From', 'File.Hash.MD5', 'Missing.Key']) == {
+        'Email': [{'From': 'a'}, {'From': 'c'}, {}], 'File': {'Hash': {'MD5': 'm'}}}
+    # the items of a mixed list stay in their positions
+    assert project_context({'Email': ['text', {'From': 'a'}, [{'From': 'b', 'To': 'c'}]]}, ['Email.From']) == {
+        'Email': [{}, {'From': 'a'}, [{'From': 'b'}]]}
+    assert project_context(context, ['File', 'File.Name']) == {'File': context['File']}
+    assert project_context(context, []) == context
+    assert project_context(None, ['Email']) == {}
+
+
+def test_get_incidents_contexts(mocker):
+    from CommonServerPython import get_incidents_contexts
+
+    def execute_command(command, args):
+        if args['id'] == 3:
+            return [{'Type': entryTypes['error'], 'Contents': 'Item not found'}]
+        return [{'Type': entryTypes['note'], 'Contents': {'context': {'Id': args['id'], 'Other': 'x'}}}]
+
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+    execute_command_batch = mocker.patch.object(
+        demisto, 'executeCommandBatch', side_effect=lambda commands: [execute_command(c['command'], c['args'])
+                                                                      for c in commands])
+
+    contexts = get_incidents_contexts([1, 2, 3, 4, 5], keys=['Id'], batch_size=2)
+
+    assert contexts == [{'Id': 1}, {'Id': 2}, {}, {'Id': 4}, {'Id': 5}]
+    assert [len(call[0][0]) for call in execute_command_batch.call_args_list] == [2, 2, 1]
+    assert execute_command_batch.call_args_list[0][0][0] == [{'command': 'getContext', 'args': {'id': 1}},
+                                                             {'command': 'getContext', 'args': {'id': 2}}]
+
+
+def test_get_incidents_contexts_without_batch_support(mocker):
+    from CommonServerPython import get_incidents_contexts
+    execute_command = mocker.patch.object(demisto, 'executeCommand', return_value=[
+        {'Type': entryTypes['note'], 'Contents': {'context': {'Id': 1}}}])
+    mocker.patch.object(demisto, 'executeCommandBatch', None)
+
+    assert get_incidents_contexts([1, 1]) == [{'Id': 1}, {'Id': 1}]
+    assert execute_command.call_count == 2
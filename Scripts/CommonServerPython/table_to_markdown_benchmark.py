@@ -0,0 +1,117 @@
+"""Benchmark of tableToMarkdown on large tables.
+
+Compares the current implementation with the previous one, which concatenated the result string row by row and
+scanned all the rows once per header for removeNull. Also verifies both produce the same output.
+Usage: python table_to_markdown_benchmark.py [rows ...]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+CONTENT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+sys.path.append(os.path.join(CONTENT_DIR, 'Tests', 'demistomock'))
+
+from CommonServerPython import tableToMarkdown, formatCell, stringEscapeMD, STRING_TYPES  # noqa: E402
+
+
+def legacy_table_to_markdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None):
+    mdResult = ''
+    if name:
+        mdResult = '### ' + name + '\n'
+
+    if metadata:
+        mdResult += metadata + '\n'
+
+    if not t or len(t) == 0:
+        mdResult += '**No entries.**\n'
+        return mdResult
+
+    if not isinstance(t, list):
+        t = [t]
+
+    if headers and isinstance(headers, STRING_TYPES):
+        headers = [headers]
+
+    if not isinstance(t[0], dict):
+        if headers and len(headers) > 0:
+            header = headers[0]
+            t = list(map(lambda item: dict((h, item) for h in [header]), t))
+        else:
+            raise Exception("Missing headers param for tableToMarkdown. Example: headers=['Some Header']")
+
+    if not headers:
+        headers = list(t[0].keys())
+        headers.sort()
+
+    if removeNull:
+        headers_aux = headers[:]
+        for header in headers_aux:
+            if all(obj.get(header) in ('', None, [], {}) for obj in t):
+                headers.remove(header)
+
+    if t and len(headers) > 0:
+        newHeaders = []
+        if headerTransform is None:  # noqa
+            headerTransform = lambda s: s  # noqa
+        for header in headers:
+            newHeaders.append(headerTransform(header))
+        mdResult += '|'
+        if len(newHeaders) == 1:
+            mdResult += newHeaders[0]
+        else:
+            mdResult += '|'.join(newHeaders)
+        mdResult += '|\n'
+        sep = '---'
+        mdResult += '|' + '|'.join([sep] * len(headers)) + '|\n'
+        for entry in t:
+            vals = [stringEscapeMD((formatCell(entry.get(h, ''), False) if entry.get(h) is not None else ''),
+                                   True, True) for h in headers]
+            mdResult += '| '
+            try:
+                mdResult += ' | '.join(vals)
+            except UnicodeDecodeError:
+                vals = [str(v) for v in vals]
+                mdResult += ' | '.join(vals)
+            mdResult += ' |\n'
+
+    else:
+        mdResult += '**No entries.**\n'
+
+    return mdResult
+
+
+def create_table(rows):
+    return [{
+        'ID': i,
+        'Name': 'row name {}'.format(i),
+        'Description': 'multi line\ndescription | with pipe' if i % 3 else None,
+        'Tags': ['tag1', 'tag2'],
+        'Details': {'severity': i % 4, 'source': 'benchmark'},
+        'Empty': None,
+        'Status': 'Active' if i % 2 else '',
+    } for i in range(rows)]
+
+
+def measure(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def main(argv):
+    sizes = [int(size) for size in argv] or [1000, 10000, 100000]
+    print('{:>8} {:>11} {:>10} {:>10} {:>8}'.format('rows', 'removeNull', 'legacy', 'current', 'speedup'))
+    for rows in sizes:
+        table = create_table(rows)
+        for remove_null in (False, True):
+            legacy_time, legacy_md = measure(legacy_table_to_markdown, 'Benchmark', table, removeNull=remove_null)
+            current_time, current_md = measure(tableToMarkdown, 'Benchmark', table, removeNull=remove_null)
+            if legacy_md != current_md:
+                raise AssertionError('tableToMarkdown output differs for {} rows'.format(rows))
+            print('{:>8} {:>11} {:>10.3f} {:>10.3f} {:>7.1f}x'.format(
+                rows, str(remove_null), legacy_time, current_time, legacy_time / current_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -79,6 +79,8 @@ def read_file(input_entry_or_string, file_type):
             file_content = BytesIO(f.read())
     if file_type.startswith('csv'):
         return json.loads(pd.read_csv(file_content).fillna('').to_json(orient='records'))
+    elif file_type.startswith('jsonl'):
+        return [json.loads(line) for line in file_content.getvalue().splitlines() if line.strip()]
     elif file_type.startswith('json'):
         return json.loads(file_content.getvalue())
     elif file_type.startswith('pickle'):
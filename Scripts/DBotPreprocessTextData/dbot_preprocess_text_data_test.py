@@ -55,6 +55,9 @@ def test_read_file(mocker):
         obj = read_file(b64_input, 'json_b64_string')
         assert len(obj) >= 1
 
+    jsonl_input = '\n'.join(json.dumps(row) for row in obj) + '\n'
+    assert read_file(jsonl_input, 'jsonl_string') == obj
+
 
 def test_concat_text_field(mocker):
     data = [
@@ -75,7 +75,9 @@ def read_file(input_entry_or_string, file_type):
         file_path = res['path']
         with open(file_path, 'rb') as f:
             file_content = BytesIO(f.read())
-    if file_type.startswith('json'):
+    if file_type.startswith('jsonl'):
+        return [json.loads(line) for line in file_content.getvalue().splitlines() if line.strip()]
+    elif file_type.startswith('json'):
         return json.loads(file_content.getvalue())
     elif file_type.startswith('pickle'):
         return pd.read_pickle(file_content, compression=None)
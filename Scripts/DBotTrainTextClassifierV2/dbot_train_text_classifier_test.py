@@ -25,6 +25,9 @@ def test_read_file(mocker):
         obj = read_file(b64_input, 'json_b64_string')
         assert len(obj) >= 1
 
+    jsonl_input = '\n'.join(json.dumps(row) for row in obj) + '\n'
+    assert read_file(jsonl_input, 'jsonl_string') == obj
+
 
 def test_read_files_by_name(mocker):
     mocker.patch.object(demisto, 'getFilePath', return_value={'path': './TestData/input_json_file_test'})
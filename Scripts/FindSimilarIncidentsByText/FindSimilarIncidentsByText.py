@@ -1,19 +1,21 @@
 # type: ignore
+import zlib
+from collections import defaultdict
 import dateutil.parser
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import linear_kernel
 
 from CommonServerPython import *
 
-HOURS_TIME_FRAME = float(demisto.args()['timeFrameHours'])
-THRESHOLD = float(demisto.args()['threshold'])
-TEXT_FIELDS = set(map(lambda x: x.lower(), demisto.args()['textFields'].split(',')))
-IGNORE_CLOSED = demisto.args()['ignoreClosedIncidents'] == 'yes'
-INCIDENT_QUERY_SIZE = int(demisto.args()['maximumNumberOfIncidents'])
 INCIDENT_TEXT_FIELD = 'incident_text_for_tfidf'
-MIN_TEXT_LENGTH = int(demisto.args()['minTextLength'])
-MAX_CANDIDATES_IN_LIST = int(demisto.args()['maxResults'])
-TIME_FIELD = demisto.args()['timeField']
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_PRIME = np.uint64((1 << 31) - 1)
+# random hash functions (a * x + b) % prime, the same in every run so kept signatures stay comparable
+_minhash_random = np.random.RandomState(1)
+MINHASH_A = _minhash_random.randint(1, int(MINHASH_PRIME), MINHASH_PERMUTATIONS).astype(np.uint64)
+MINHASH_B = _minhash_random.randint(0, int(MINHASH_PRIME), MINHASH_PERMUTATIONS).astype(np.uint64)
 
 
 def parse_datetime(datetime_str):
@@ -27,6 +29,59 @@ def get_similar_texts(text, other_texts):
     return similarity_vector[1:]
 
 
+def get_text_analyzer():
+    # the words compared by the tf-idf method
+    return TfidfVectorizer(min_df=1, stop_words='english').build_analyzer()
+
+
+def get_minhash_signature(words):
+    """MinHash signature of a set of words - the share of equal values in two signatures estimates the jaccard
+    similarity of their sets of words.
+    """
+    if not words:
+        return []
+    hashes = np.array([zlib.crc32(word.encode('utf-8')) & 0xffffffff for word in set(words)], dtype=np.uint64)
+    hashes %= MINHASH_PRIME
+    return ((np.outer(hashes, MINHASH_A) + MINHASH_B) % MINHASH_PRIME).min(axis=0).tolist()
+
+
+def get_lsh_bands(threshold, permutations=MINHASH_PERMUTATIONS):
+    """Split the signatures to bands of rows, so incidents with a similarity around 0.8 of the threshold
+    share at least one band, while less similar incidents rarely do.
+
+    Returns:
+        tuple. (number of bands, number of rows in a band)
+    """
+    bands, rows = permutations, 1
+    for band_rows in range(1, permutations + 1):
+        if permutations % band_rows == 0 and (1.0 / (permutations // band_rows)) ** (1.0 / band_rows) <= threshold * 0.8:
+            bands, rows = permutations // band_rows, band_rows
+    return bands, rows
+
+
+class MinHashLSH(object):
+    """Locality sensitive hashing index of MinHash signatures - a query gets only the signatures which share
+    a band with it, instead of comparing all of them.
+    """
+
+    def __init__(self, threshold):
+        self.bands, self.rows = get_lsh_bands(threshold)
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+
+    def get_band_keys(self, signature):
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, key, signature):
+        for bucket, band_key in zip(self.buckets, self.get_band_keys(signature)):
+            bucket[band_key].append(key)
+
+    def query(self, signature):
+        keys = set()
+        for bucket, band_key in zip(self.buckets, self.get_band_keys(signature)):
+            keys.update(bucket.get(band_key, []))
+        return keys
+
+
 def get_texts_from_incident(incident, text_fields):
     texts = []
     # labels
@@ -48,11 +103,11 @@ def add_text_to_incident(incident, text_fields):
 
 
 def get_incidents_by_time(incident_time, incident_type, incident_id, hours_time_frame, ignore_closed,
-                          max_number_of_results):
+                          max_number_of_results, time_field):
     incident_time = parse_datetime(incident_time)
     max_date = incident_time + timedelta(hours=hours_time_frame)
     min_date = incident_time - timedelta(hours=hours_time_frame)
-    query = '{0}:>="{1}" and {0}:<="{2}" and type:"{3}"'.format(TIME_FIELD, min_date.isoformat(), max_date.isoformat(),
+    query = '{0}:>="{1}" and {0}:<="{2}" and type:"{3}"'.format(time_field, min_date.isoformat(), max_date.isoformat(),
                                                                 incident_type)
 
     if ignore_closed:
@@ -63,7 +118,7 @@ def get_incidents_by_time(incident_time, incident_type, incident_id, hours_time_
 
     res = demisto.executeCommand("getIncidents",
                                  {'query': query,
-                                  'size': max_number_of_results, 'sort': '%s.desc' % TIME_FIELD})
+                                  'size': max_number_of_results, 'sort': '%s.desc' % time_field})
 
     if res[0]['Type'] == entryTypes['error']:
         raise Exception(str(res[0]['Contents']))
@@ -72,7 +127,7 @@ def get_incidents_by_time(incident_time, incident_type, incident_id, hours_time_
     return incident_list or []
 
 
-def incident_to_record(incident):
+def incident_to_record(incident, time_field):
     def parse_time(date_time_str):
         try:
             if date_time_str.find('.') > 0:
@@ -83,7 +138,7 @@ def incident_to_record(incident):
         except Exception:
             return date_time_str
 
-    occured_time = parse_time(incident[TIME_FIELD])
+    occured_time = parse_time(incident[time_field])
     return {'id': "[%s](#/Details/%s)" % (incident['id'], incident['id']),
             'rawId': incident['id'],
             'name': incident['name'],
@@ -93,49 +148,110 @@ def incident_to_record(incident):
             }
 
 
-incident = demisto.incidents()[0]
-incident_text = get_texts_from_incident(incident, TEXT_FIELDS)
-if len(incident_text) < MIN_TEXT_LENGTH:
-    demisto.results("The text is too short to compare - minimum of %d chars required" % MIN_TEXT_LENGTH)
-    sys.exit(0)
-
-# get initial candidates list
-candidates = get_incidents_by_time(incident[TIME_FIELD], incident['type'], incident['id'], HOURS_TIME_FRAME,
-                                   IGNORE_CLOSED, INCIDENT_QUERY_SIZE)
-
-# filter candidates with minimum length constraint
-map(lambda x: add_text_to_incident(x, TEXT_FIELDS), candidates)
-candidates = [x for x in candidates if len(x.get(INCIDENT_TEXT_FIELD, 0)) >= MIN_TEXT_LENGTH]
-
-# compare candidates to the orginial incident using TF-IDF
-similarity_vector = get_similar_texts(incident_text, map(lambda x: x[INCIDENT_TEXT_FIELD], candidates))
-similar_incidents = []
-for (i, similarity) in enumerate(similarity_vector):
-    candidates[i]['similarity'] = similarity
-    if similarity >= THRESHOLD:
-        similar_incidents.append(candidates[i])
-
-# update context
-if len(similar_incidents or []) > 0:
-    similar_incidents_rows = map(incident_to_record, similar_incidents)
-    similar_incidents_rows = sorted(similar_incidents_rows, key=lambda x: x['Time'])
-    context = {
-        'similarIncidentList': similar_incidents_rows[:MAX_CANDIDATES_IN_LIST],
-        'similarIncident': similar_incidents_rows[0],
-        'isSimilarIncidentFound': True
-    }
-    markdown_result = tableToMarkdown("Similar incidents",
-                                      similar_incidents_rows,
-                                      headers=['id', 'name', 'closedTime', 'Time', 'similarity'])
-    demisto.results({'ContentsFormat': formats['markdown'],
-                     'Type': entryTypes['note'],
-                     'Contents': markdown_result,
-                     'EntryContext': context})
-else:
-    context = {
-        'isSimilarIncidentFound': False
-    }
-    demisto.results({'ContentsFormat': formats['markdown'],
-                     'Type': entryTypes['note'],
-                     'Contents': 'No similar incidents has been found',
-                     'EntryContext': context})
+def get_similar_incidents_by_tfidf(incident_text, candidates, text_fields, min_text_length, threshold):
+    # filter candidates with minimum length constraint
+    map(lambda x: add_text_to_incident(x, text_fields), candidates)
+    candidates = [x for x in candidates if len(x.get(INCIDENT_TEXT_FIELD, 0)) >= min_text_length]
+
+    # compare candidates to the orginial incident using TF-IDF
+    similarity_vector = get_similar_texts(incident_text, map(lambda x: x[INCIDENT_TEXT_FIELD], candidates))
+    similar_incidents = []
+    for (i, similarity) in enumerate(similarity_vector):
+        candidates[i]['similarity'] = similarity
+        if similarity >= threshold:
+            similar_incidents.append(candidates[i])
+    return similar_incidents
+
+
+def get_similar_incidents_by_minhash(incident_text, candidates, text_fields, min_text_length, threshold,
+                                     index_list_name=None, hours_time_frame=24):
+    """Compare the candidates by the estimated jaccard similarity of their words. The signatures of the candidates
+    are kept in the index list (if given) between runs, so only new and modified incidents are hashed.
+    """
+    analyzer = get_text_analyzer()
+
+    def get_text_records(incidents):
+        texts = [get_texts_from_incident(x, text_fields) for x in incidents]
+        return [{'length': len(text), 'signature': get_minhash_signature(analyzer(text))} for text in texts]
+
+    # an incident is a candidate while it is in the time frame of other incidents
+    index_store = IncidentFeatureStore(index_list_name,
+                                       json.dumps(['FindSimilarIncidentsByText', 1, sorted(text_fields),
+                                                   MINHASH_PERMUTATIONS]),
+                                       max_age_hours=2 * hours_time_frame)
+    records = index_store.get_records(candidates, get_text_records)
+    index_store.save()
+
+    index = MinHashLSH(threshold)
+    for i, record in enumerate(records):
+        if record['length'] >= min_text_length and record['signature']:
+            index.add(i, record['signature'])
+
+    signature = np.array(get_minhash_signature(analyzer(incident_text)))
+    similar_incidents = []
+    if len(signature) == 0:
+        return similar_incidents
+    for i in index.query(signature.tolist()):
+        similarity = float(np.mean(signature == np.array(records[i]['signature'])))
+        if similarity >= threshold:
+            candidates[i]['similarity'] = similarity
+            similar_incidents.append(candidates[i])
+    return similar_incidents
+
+
+def main():
+    hours_time_frame = float(demisto.args()['timeFrameHours'])
+    threshold = float(demisto.args()['threshold'])
+    text_fields = set(map(lambda x: x.lower(), demisto.args()['textFields'].split(',')))
+    ignore_closed = demisto.args()['ignoreClosedIncidents'] == 'yes'
+    incident_query_size = int(demisto.args()['maximumNumberOfIncidents'])
+    min_text_length = int(demisto.args()['minTextLength'])
+    max_candidates_in_list = int(demisto.args()['maxResults'])
+    time_field = demisto.args()['timeField']
+    similarity_method = demisto.args().get('similarityMethod', 'tfidf')
+    index_list_name = demisto.args().get('indexListName')
+
+    incident = demisto.incidents()[0]
+    incident_text = get_texts_from_incident(incident, text_fields)
+    if len(incident_text) < min_text_length:
+        return "The text is too short to compare - minimum of %d chars required" % min_text_length
+
+    # get initial candidates list
+    candidates = get_incidents_by_time(incident[time_field], incident['type'], incident['id'], hours_time_frame,
+                                       ignore_closed, incident_query_size, time_field)
+
+    if similarity_method == 'minhash':
+        similar_incidents = get_similar_incidents_by_minhash(incident_text, candidates, text_fields, min_text_length,
+                                                             threshold, index_list_name, hours_time_frame)
+    else:
+        similar_incidents = get_similar_incidents_by_tfidf(incident_text, candidates, text_fields, min_text_length,
+                                                           threshold)
+
+    # update context
+    if len(similar_incidents or []) > 0:
+        similar_incidents_rows = map(lambda x: incident_to_record(x, time_field), similar_incidents)
+        similar_incidents_rows = sorted(similar_incidents_rows, key=lambda x: x['Time'])
+        context = {
+            'similarIncidentList': similar_incidents_rows[:max_candidates_in_list],
+            'similarIncident': similar_incidents_rows[0],
+            'isSimilarIncidentFound': True
+        }
+        markdown_result = tableToMarkdown("Similar incidents",
+                                          similar_incidents_rows,
+                                          headers=['id', 'name', 'closedTime', 'Time', 'similarity'])
+        return {'ContentsFormat': formats['markdown'],
+                'Type': entryTypes['note'],
+                'Contents': markdown_result,
+                'EntryContext': context}
+    else:
+        context = {
+            'isSimilarIncidentFound': False
+        }
+        return {'ContentsFormat': formats['markdown'],
+                'Type': entryTypes['note'],
+                'Contents': 'No similar incidents has been found',
+                'EntryContext': context}
+
+
+if __name__ in ['__builtin__', '__main__']:
+    demisto.results(main())
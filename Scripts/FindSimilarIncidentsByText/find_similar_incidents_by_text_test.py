@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from CommonServerPython import *
+from FindSimilarIncidentsByText import get_lsh_bands, get_minhash_signature, get_text_analyzer, MinHashLSH, \
+    MINHASH_PERMUTATIONS, main
+
+phishing_text = 'Your mailbox password expires today, click the link below to keep your current password ' \
+                'and avoid the suspension of your account'
+phishing_text_dup = 'Your mailbox password expires tonight, click the link below to keep your current password ' \
+                    'and avoid the suspension of your account'
+unrelated_text = 'The quarterly sales meeting moved to Thursday afternoon in the main conference room with ' \
+                 'the finance team'
+
+incident = {
+    'id': '1',
+    'name': 'Phishing 1',
+    'type': 'Phishing',
+    'created': '2019-10-01T10:00:00Z',
+    'closed': '0001-01-01T00:00:00Z',
+    'details': phishing_text,
+}
+candidates = [
+    dict(incident, id='2', name='Phishing 2', created='2019-10-01T09:00:00Z', details=phishing_text_dup),
+    dict(incident, id='3', name='Meeting', created='2019-10-01T08:00:00Z', details=unrelated_text),
+]
+
+default_args = {
+    'timeFrameHours': '24',
+    'threshold': '0.5',
+    'textFields': 'details',
+    'ignoreClosedIncidents': 'yes',
+    'maximumNumberOfIncidents': '100',
+    'minTextLength': '10',
+    'maxResults': '10',
+    'timeField': 'created',
+}
+
+
+def get_signature(text):
+    return get_minhash_signature(get_text_analyzer()(text))
+
+
+@pytest.mark.parametrize('threshold, expected_bands', [
+    (0.3, (32, 2)),
+    (0.5, (32, 2)),
+    (0.8, (16, 4)),
+    (1.0, (8, 8)),
+])
+def test_get_lsh_bands(threshold, expected_bands):
+    bands, rows = get_lsh_bands(threshold)
+    assert (bands, rows) == expected_bands
+    assert bands * rows == MINHASH_PERMUTATIONS
+    # incidents with a similarity of 0.8 of the threshold share a band with a probability of about a half
+    assert (1.0 / bands) ** (1.0 / rows) <= threshold * 0.8
+
+
+def test_minhash_signature():
+    assert get_signature('') == []
+    assert len(get_signature(phishing_text)) == MINHASH_PERMUTATIONS
+    assert get_signature(phishing_text) == get_signature(phishing_text.upper())
+    similarity = np.mean(np.array(get_signature(phishing_text)) == np.array(get_signature(phishing_text_dup)))
+    assert 0.5 <= similarity < 1
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.8])
+def test_minhash_lsh(threshold):
+    index = MinHashLSH(threshold)
+    index.add('dup', get_signature(phishing_text_dup))
+    index.add('unrelated', get_signature(unrelated_text))
+
+    assert index.query(get_signature(phishing_text)) == {'dup'}
+    assert index.query(get_signature(unrelated_text)) == {'unrelated'}
+
+
+def test_main_similarity_methods(mocker):
+    args = dict(default_args)
+    mocker.patch.object(demisto, 'args', return_value=args)
+    mocker.patch.object(demisto, 'incidents', return_value=[incident])
+    mocker.patch.object(demisto, 'executeCommand', side_effect=lambda command, args: [
+        {'Type': entryTypes['note'], 'Contents': {'data': [dict(c) for c in candidates]}}])
+
+    tfidf_entry = main()
+    args['similarityMethod'] = 'minhash'
+    minhash_entry = main()
+
+    for entry in (tfidf_entry, minhash_entry):
+        assert entry['EntryContext']['isSimilarIncidentFound']
+        assert [row['rawId'] for row in entry['EntryContext']['similarIncidentList']] == ['2']
+    assert set(minhash_entry['EntryContext']) == set(tfidf_entry['EntryContext'])
+    assert set(minhash_entry['EntryContext']['similarIncident']) == set(tfidf_entry['EntryContext']['similarIncident'])
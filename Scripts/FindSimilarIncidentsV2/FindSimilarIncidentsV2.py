@@ -142,14 +142,6 @@ def get_incidents_by_keys(similar_incident_keys, time_field, incident_time, inci
     return incident_list
 
 
-def get_context(incident_id):
-    res = demisto.executeCommand("getContext", {'id': incident_id})
-    try:
-        return res[0]['Contents']['context']
-    except Exception:
-        return {}
-
-
 def camel_case_to_space(s):
     return ''.join(map(lambda x: x if x.islower() else " " + x, s)).strip().capitalize()
 
@@ -317,9 +309,16 @@ def main():
                                ]
     # filter by context
     if incident_similar_context:
+        # the compared context keys of each incident are kept between runs, as getting the context is slow
+        feature_store = IncidentFeatureStore(demisto.args().get('featureStoreListName'),
+                                             json.dumps(['FindSimilarIncidentsV2', sorted(SIMILAR_CONTEXT_MAP.keys())]),
+                                             max_age_hours=float(demisto.args().get('featureStoreMaxAgeHours', 24)))
+        other_contexts = feature_store.get_records(duplicate_incidents, lambda incidents: [
+            get_map_from_nested_dict(context, SIMILAR_CONTEXT_MAP.keys())
+            for context in get_incidents_contexts([c['id'] for c in incidents], keys=SIMILAR_CONTEXT_MAP.keys())])
+        feature_store.save()
         filter_by_context = []
-        for c in duplicate_incidents:
-            other_context = get_map_from_nested_dict(get_context(c['id']), SIMILAR_CONTEXT_MAP.keys())
+        for c, other_context in zip(duplicate_incidents, other_contexts):
             if other_context:
                 if verify_map_equals(other_context,
                                      incident_similar_context,
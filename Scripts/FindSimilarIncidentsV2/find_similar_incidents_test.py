@@ -1,7 +1,7 @@
 import pytest
 
 from CommonServerPython import *
-from FindSimilarIncidentsV2 import main
+from FindSimilarIncidentsV2 import main, get_map_from_nested_dict
 
 default_args = {
     'hoursBack': 5,
@@ -173,3 +173,54 @@ def test_similar_context(mocker):
     assert len(result['EntryContext']['similarIncidentList']) == 2
     assert result['EntryContext']['similarIncidentList'][0]['rawId'] == 3
     assert result['EntryContext']['similarIncidentList'][1]['rawId'] == 2
+
+
+def test_similar_context_feature_store(mocker):
+    args = dict(default_args)
+    args.update({'similarIncidentFields': 'name', 'similarContextKeys': 'listValue.name',
+                 'featureStoreListName': 'similarContext'})
+    lists = {}
+
+    def execute_command_with_lists(command, args=None):
+        if command == 'getList':
+            return [{'Type': entryTypes['note'], 'Contents': lists.get(args['listName'])}]
+        if command == 'setList':
+            lists[args['listName']] = args['listData']
+            return [{'Type': entryTypes['note'], 'Contents': 'Done'}]
+        return execute_command(command, args)
+
+    mocker.patch.object(demisto, 'args', return_value=args)
+    mocker.patch.object(demisto, 'incidents', return_value=[incident1])
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command_with_lists)
+    mocker.patch.object(demisto, 'context', return_value=context1)
+
+    for _ in range(2):
+        result = main()
+        assert [row['rawId'] for row in result['EntryContext']['similarIncidentList']] == [3, 2]
+    # the second run reused the context keys of both incidents
+    assert [call[0][0] for call in demisto.executeCommand.call_args_list].count('getContext') == 2
+
+
+def test_similar_context_batch(mocker):
+    args = dict(default_args)
+    args.update({'similarIncidentFields': 'name', 'similarContextKeys': 'listValue.name'})
+    mocker.patch.object(demisto, 'args', return_value=args)
+    mocker.patch.object(demisto, 'incidents', return_value=[incident1])
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+    mocker.patch.object(demisto, 'context', return_value=context1)
+    execute_command_batch = mocker.patch.object(demisto, 'executeCommandBatch', side_effect=lambda commands: [
+        execute_command(c['command'], c['args']) for c in commands])
+
+    result = main()
+    assert [row['rawId'] for row in result['EntryContext']['similarIncidentList']] == [3, 2]
+    # the contexts of all the candidates are fetched in one batch
+    assert execute_command_batch.call_count == 1
+    assert [call[0][0] for call in demisto.executeCommand.call_args_list].count('getContext') == 0
+
+
+def test_projected_context_keeps_compared_values():
+    keys = ['Email.From', 'File.Name', 'Other']
+    context = {'Email': ['text', {'From': 'a'}], 'File': [{'Name': 'f', 'Size': 1}, {'Name': 'g'}], 'Other': 1,
+               'Ignored': {'Name': 'x'}}
+
+    assert get_map_from_nested_dict(project_context(context, keys), keys) == get_map_from_nested_dict(context, keys)
@@ -10,6 +10,7 @@ import editdistance
 import zlib
 from rfc822 import parseaddr  # type:ignore
 from urlparse import urlparse
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from datetime import datetime, timedelta
@@ -39,6 +40,8 @@ TIME_FIELD = 'created'
 LABELS_BLACKLIST = [BRAND_LABEL, INSTANCE_LABEL, EMAIL_SENDER_ADDRESS_LABEL, EMAIL_SENDER_NAME_LABEL,
                     EMAIL_SUBJECT_LABEL, EMAIL_RECEIVED_LABEL, EMAIL_ATTACHMENT_LABEL, EMAIL_DATE_LABEL,
                     EMAIL_TEXT_LABEL, EMAIL_HTML_LABEL]
+# the labels the features compare by value, the only labels kept in the feature store records
+COMPARED_LABELS = [INSTANCE_LABEL, EMAIL_SUBJECT_LABEL, EMAIL_ATTACHMENT_LABEL]
 
 EMAIL_LABELS_FEATURES = []  # type: list
 EMAIL_LABELS_MAP = {}  # type: dict
@@ -52,11 +55,16 @@ class Utils():
     email_pattern = re.compile(
         r"""[a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+@[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(?:\.[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*""")  # noqa: E501
 
+    tld_extract = None
+
     @staticmethod
     def extract_domain_from_url(url):
-        extract = tldextract.TLDExtract(cache_file='/tmp/.tld_set')
-        domain = extract(url).domain.lower()
-        suffix = extract(url).suffix.lower()
+        # the suffix list is loaded once per extractor, so keep a single one
+        if Utils.tld_extract is None:
+            Utils.tld_extract = tldextract.TLDExtract(cache_file='/tmp/.tld_set')
+        extract = Utils.tld_extract(url)
+        domain = extract.domain.lower()
+        suffix = extract.suffix.lower()
         if len(domain) > 0 and len(suffix) > 0:
             return ".".join([domain, suffix])
 
@@ -101,6 +109,22 @@ class Utils():
         except Exception:
             return None
 
+    @staticmethod
+    def parse_time(date):
+        try:
+            return date if isinstance(date, datetime) else dateutil.parser.parse(date)
+        except Exception:
+            return None
+
+    @staticmethod
+    def get_datetimes_diff_seconds(date1, date2):
+        if date1 is None or date2 is None:
+            return None
+        try:
+            return abs(date1 - date2).total_seconds()
+        except Exception:
+            return None
+
     @staticmethod
     def complete_email_missing_labels(labels):
         found_subject = EMAIL_SUBJECT_LABEL in labels
@@ -201,6 +225,21 @@ class Utils():
         union_cardinality = len(Utils.union_set(x, y))
         return intersection_cardinality / float(union_cardinality)
 
+    @staticmethod
+    def get_hashable_set(x):
+        if x is None:
+            return frozenset()
+        if isinstance(x, dict):
+            x = Utils.get_hashable_from_dict(x)
+        return frozenset(v for v in x if isinstance(v, collections.Hashable))
+
+    @staticmethod
+    def jaccard_similarity_of_sets(x, y):
+        """jaccard_similarity of the sets returned by get_hashable_set"""
+        if len(x) == 0 or len(y) == 0:
+            return 0
+        return len(x & y) / float(len(x | y))
+
     @staticmethod
     def canonize_ip_to_netrok(ip_address, mast_bits):
         try:
@@ -209,102 +248,167 @@ class Utils():
             return ip_address
 
 
-class IncidentFeatures:
-    def __init__(self, incident1, incident2):
-
-        self.incident1 = incident1
-        self.incident2 = incident2
-
-        self.indicators1 = incident1['indicators']
-        self.indicators2 = incident2['indicators']
-
-        self.labels_map1 = Utils.get_incident_labels_map(self.incident1['labels'])
-        self.labels_map2 = Utils.get_incident_labels_map(self.incident2['labels'])
-
-        domains1 = Utils.get_unique_list(
-            self.indicators1.get('Domain', []) + Utils.get_domains(self.indicators1, self.labels_map2))
-        domains2 = Utils.get_unique_list(
-            self.indicators2.get('Domain', []) + Utils.get_domains(self.indicators2, self.labels_map2))
-
-        if len(domains1) > 0:
-            self.indicators1['Domain'] = domains1
-        if len(domains2) > 0:
-            self.indicators2['Domain'] = domains2
-
-        if IP_MASK_BITS_FOR_COMPARISON < 32 and IP_MASK_BITS_FOR_COMPARISON > 0:
-            if 'IP' in self.indicators1:
-                self.indicators1['IP'] = map(lambda ip: Utils.canonize_ip_to_netrok(
-                    ip, IP_MASK_BITS_FOR_COMPARISON), self.indicators1['IP'])
-            if 'IP' in self.indicators2:
-                self.indicators2['IP'] = map(lambda ip: Utils.canonize_ip_to_netrok(
-                    ip, IP_MASK_BITS_FOR_COMPARISON), self.indicators2['IP'])
-
-    def get_email_labels_features(self):
-        def add_label_ld_feature(label_name):
-            if label_name in labels1 and label_name in labels2:
-                features[label_name] = editdistance.eval(labels1[label_name], labels2[label_name])
-
-        def add_label_text_feature(label_name):
-            if label_name in labels1 and label_name in labels2:
-                features[label_name] = Utils.jaccard_similarity(
-                    labels1[label_name].split(), labels2[label_name].split())
-
-        features = {}
-        labels1 = self.labels_map1
-        labels2 = self.labels_map2
-
-        if EMAIL_SENDER_ADDRESS_LABEL in labels1 and EMAIL_SENDER_ADDRESS_LABEL in labels2:
-            sender1 = Utils.get_email_address(labels1[EMAIL_SENDER_ADDRESS_LABEL])
-            sender2 = Utils.get_email_address(labels2[EMAIL_SENDER_ADDRESS_LABEL])
-            if sender1 and sender2:
-                features[EMAIL_SENDER_ADDRESS_LABEL] = editdistance.eval(sender1, sender2)
-
-        if EMAIL_DATE_LABEL in labels1 and EMAIL_DATE_LABEL in labels2:
-            time_diff = Utils.get_time_diff_seconds(labels1[EMAIL_DATE_LABEL],
-                                                    labels2[EMAIL_DATE_LABEL])
-            if time_diff is not None:
-                features[EMAIL_DATE_LABEL] = time_diff
-
-        add_label_ld_feature(EMAIL_SUBJECT_LABEL)
-        add_label_ld_feature(EMAIL_ATTACHMENT_LABEL)
-        add_label_text_feature(EMAIL_TEXT_LABEL)
-        add_label_text_feature(EMAIL_HTML_LABEL)
-
-        return features
-
-    def get_incident_features(self):
-        features = {}
-        incident_time_diff = Utils.get_time_diff_seconds(self.incident1[TIME_FIELD], self.incident2[TIME_FIELD])
-        features['incident_time_diff'] = incident_time_diff
-        features['same_type'] = self.incident1['type'] == self.incident2['type']
-        features['same_severity'] = self.incident1['severity'] == self.incident2['severity']
-        features['custom_fields_jaccard'] = Utils.jaccard_similarity(self.incident1.get('CustomFields', []),
-                                                                     self.incident2.get('CustomFields', []))
-        features['labels_jaccard'] = Utils.jaccard_similarity(
-            [(k, v) for (k, v) in self.labels_map1.items() if k not in LABELS_BLACKLIST],
-            [(k, v) for (k, v) in self.labels_map2.items() if k not in LABELS_BLACKLIST]
-        )
-
-        if INSTANCE_LABEL in self.labels_map1 and INSTANCE_LABEL in self.labels_map2:
-            features['same_instance'] = self.labels_map1[INSTANCE_LABEL] == self.labels_map2[INSTANCE_LABEL]
-
-        for indicator_type in INDICATORS_FOR_JACCARD:
-            if indicator_type in self.indicators1 and indicator_type in self.indicators2:
-                features['indicator_%s_jaccard' % indicator_type] = Utils.jaccard_similarity(
-                    self.indicators1[indicator_type],
-                    self.indicators2[indicator_type])
-
-        return features
-
-    def calculate_features(self, expected_features=FEATURES):
-        features = {}  # type: dict
-        features.update(self.get_incident_features())
-        features.update(self.get_email_labels_features())
-
-        for key in set(expected_features).difference(set(features.keys())):
-            features[key] = None
-
-        return features
+class IncidentRepresentation(object):
+    """Normalized form of an incident - its labels, indicators, email fields and times - computed once, to compare
+    the incident against any number of incidents.
+    """
+
+    def __init__(self, incident):
+        self.id = incident.get('id')
+        self.type = incident['type']
+        self.severity = incident['severity']
+        self.time = Utils.parse_time(incident[TIME_FIELD])
+        self.custom_fields = Utils.get_hashable_set(incident.get('CustomFields', []))
+
+        self.labels_map = labels_map = Utils.get_incident_labels_map(incident['labels'])
+        self.labels = Utils.get_hashable_set([(k, v) for (k, v) in labels_map.items() if k not in LABELS_BLACKLIST])
+        self.indicators = self.get_indicators(incident['indicators'], labels_map)
+
+        self.email_sender = None
+        if EMAIL_SENDER_ADDRESS_LABEL in labels_map:
+            self.email_sender = Utils.get_email_address(labels_map[EMAIL_SENDER_ADDRESS_LABEL])
+        self.email_date = None
+        if EMAIL_DATE_LABEL in labels_map:
+            self.email_date = Utils.parse_time(labels_map[EMAIL_DATE_LABEL])
+        self.email_words = {}
+        for label_name in (EMAIL_TEXT_LABEL, EMAIL_HTML_LABEL):
+            if label_name in labels_map:
+                self.email_words[label_name] = Utils.get_hashable_set(labels_map[label_name].split())
+
+    @staticmethod
+    def get_indicators(indicators, labels_map):
+        indicators = dict(indicators)
+        domains = Utils.get_unique_list(indicators.get('Domain', []) + Utils.get_domains(indicators, labels_map))
+        if len(domains) > 0:
+            indicators['Domain'] = domains
+
+        if IP_MASK_BITS_FOR_COMPARISON < 32 and IP_MASK_BITS_FOR_COMPARISON > 0 and 'IP' in indicators:
+            indicators['IP'] = [Utils.canonize_ip_to_netrok(ip, IP_MASK_BITS_FOR_COMPARISON) for ip in indicators['IP']]
+
+        return {indicator_type: Utils.get_hashable_set(values) for indicator_type, values in indicators.items()}
+
+    def to_record(self):
+        """JSON serializable form of the representation, for the feature store"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'severity': self.severity,
+            'time': self.time.isoformat() if self.time else None,
+            'custom_fields': list(self.custom_fields),
+            # the email bodies are kept as email_words
+            'labels_map': {k: v for (k, v) in self.labels_map.items() if k in COMPARED_LABELS},
+            'labels': list(self.labels),
+            'indicators': {indicator_type: list(values) for indicator_type, values in self.indicators.items()},
+            'email_sender': self.email_sender,
+            'email_date': self.email_date.isoformat() if self.email_date else None,
+            'email_words': {label_name: list(words) for label_name, words in self.email_words.items()},
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        def get_set(values):
+            # JSON turns the (key, value) tuples of the sets to lists
+            return Utils.get_hashable_set([tuple(value) if isinstance(value, list) else value for value in values])
+
+        representation = cls.__new__(cls)
+        representation.id = record['id']
+        representation.type = record['type']
+        representation.severity = record['severity']
+        representation.time = Utils.parse_time(record['time']) if record['time'] else None
+        representation.custom_fields = get_set(record['custom_fields'])
+        representation.labels_map = record['labels_map']
+        representation.labels = get_set(record['labels'])
+        representation.indicators = {indicator_type: get_set(values)
+                                     for indicator_type, values in record['indicators'].items()}
+        representation.email_sender = record['email_sender']
+        representation.email_date = Utils.parse_time(record['email_date']) if record['email_date'] else None
+        representation.email_words = {label_name: get_set(words) for label_name, words in record['email_words'].items()}
+        return representation
+
+
+def get_feature_store_version():
+    """The representations depend on these arguments, so the feature store keeps them apart for other values"""
+    return json.dumps(['GetDuplicatesMlv2', 2, TIME_FIELD, IP_MASK_BITS_FOR_COMPARISON, sorted(INDICATORS_FOR_JACCARD),
+                       sorted(EMAIL_LABELS_MAP.items())])
+
+
+def get_incidents_representations(incident_list, max_indicators, feature_store):
+    """Get the IncidentRepresentation of each incident by its id. Only incidents without a valid record in the
+    feature store are enriched by their indicators and normalized.
+    """
+    def extract_records(incidents):
+        enrich_incidents_by_indicators(incidents, max_indicators)
+        return [IncidentRepresentation(incident).to_record() for incident in incidents]
+
+    records = feature_store.get_records(incident_list, extract_records)
+    return {incident['id']: IncidentRepresentation.from_record(record)
+            for incident, record in zip(incident_list, records)}
+
+
+def get_candidates_features(incident, candidates, expected_features=FEATURES):
+    """Calculate the features of an incident against all its candidates, feature by feature.
+    A feature which can not be calculated for a candidate is NaN, and has no column at all if it can not be
+    calculated for any of them - the same frame as one created from a features dict per candidate.
+
+    Args:
+        incident (IncidentRepresentation): the incident to compare.
+        candidates (list): IncidentRepresentation of each candidate.
+        expected_features (list): features to have a column for in any case.
+
+    Returns:
+        pd.DataFrame. The features and id of each candidate, in the candidates order.
+    """
+    def add_feature(name, values):
+        if any(value is not None for value in values):
+            columns[name] = [np.nan if value is None else value for value in values]
+
+    def add_label_ld_feature(label_name):
+        if label_name in labels:
+            add_feature(label_name, [editdistance.eval(labels[label_name], candidate.labels_map[label_name])
+                                     if label_name in candidate.labels_map else None for candidate in candidates])
+
+    columns = {'id': [candidate.id for candidate in candidates]}  # type: dict
+    labels = incident.labels_map
+
+    columns['incident_time_diff'] = [Utils.get_datetimes_diff_seconds(incident.time, candidate.time)
+                                     for candidate in candidates]
+    columns['same_type'] = np.array([candidate.type for candidate in candidates], dtype=object) == incident.type
+    columns['same_severity'] = np.array([candidate.severity for candidate in candidates],
+                                        dtype=object) == incident.severity
+    columns['custom_fields_jaccard'] = [Utils.jaccard_similarity_of_sets(incident.custom_fields, candidate.custom_fields)
+                                        for candidate in candidates]
+    columns['labels_jaccard'] = [Utils.jaccard_similarity_of_sets(incident.labels, candidate.labels)
+                                 for candidate in candidates]
+
+    if INSTANCE_LABEL in labels:
+        add_feature('same_instance', [labels[INSTANCE_LABEL] == candidate.labels_map[INSTANCE_LABEL]
+                                      if INSTANCE_LABEL in candidate.labels_map else None for candidate in candidates])
+
+    for indicator_type in INDICATORS_FOR_JACCARD:
+        if indicator_type in incident.indicators:
+            add_feature('indicator_%s_jaccard' % indicator_type, [
+                Utils.jaccard_similarity_of_sets(incident.indicators[indicator_type],
+                                                 candidate.indicators[indicator_type])
+                if indicator_type in candidate.indicators else None for candidate in candidates])
+
+    if incident.email_sender:
+        add_feature(EMAIL_SENDER_ADDRESS_LABEL, [editdistance.eval(incident.email_sender, candidate.email_sender)
+                                                 if candidate.email_sender else None for candidate in candidates])
+
+    add_feature(EMAIL_DATE_LABEL, [Utils.get_datetimes_diff_seconds(incident.email_date, candidate.email_date)
+                                   for candidate in candidates])
+
+    add_label_ld_feature(EMAIL_SUBJECT_LABEL)
+    add_label_ld_feature(EMAIL_ATTACHMENT_LABEL)
+
+    for label_name, words in incident.email_words.items():
+        add_feature(label_name, [Utils.jaccard_similarity_of_sets(words, candidate.email_words[label_name])
+                                 if label_name in candidate.email_words else None for candidate in candidates])
+
+    for feature in expected_features:
+        columns.setdefault(feature, [None] * len(candidates))
+
+    return pd.DataFrame(columns, columns=sorted(columns))
 
 
 ##################################################################################
@@ -363,29 +467,39 @@ def get_unique_key_for_pair(id1, id2):
     return "%s_%s" % (key_tuple[0], key_tuple[1])
 
 
-def get_my_duplicate_incidents_features(incident_type, days_to_fetch_duplicates, max_number_of_results, max_indicators):
+def get_my_duplicate_incidents_features(incident_type, days_to_fetch_duplicates, max_number_of_results, max_indicators,
+                                        feature_store):
     since_date = datetime.now() - timedelta(days=days_to_fetch_duplicates)
     query = "linkedIncidents:* and %s:>=%s and type:%s" % (TIME_FIELD, since_date.isoformat(), incident_type)
     res = demisto.executeCommand("getIncidents", {'query': query, 'size': max_number_of_results, 'sort': '%s.desc' % TIME_FIELD})
     incident_list = res[0]['Contents']['data']
     if incident_list is None:
         return None
-    incidents = enrich_incidents_by_indicators(incident_list, max_indicators)
-
-    related_features = {}  # type: dict
+    incidents = {incident['id']: incident for incident in incident_list}
+    representations = get_incidents_representations(incidents.values(), max_indicators, feature_store)
+    related_pairs = set()  # type: set
+    related_features = []
     for incident in incidents.values():
         related_incidents = incident.get('linkedIncidents')
         if related_incidents:
             for related_incident_id in related_incidents:
                 if related_incident_id in incidents:
                     related_incidents += list(set(incidents[related_incident_id]['linkedIncidents']).difference(related_incidents))  # noqa E501 line too long
+            related_candidates = []
             for related_incident_id in related_incidents:
                 key = get_unique_key_for_pair(incident['id'], related_incident_id)
-                if incident['id'] == related_incident_id or key in related_features or related_incident_id not in incidents:
+                if incident['id'] == related_incident_id or key in related_pairs or related_incident_id not in incidents:
                     continue
-                related_features[key] = IncidentFeatures(incident, incidents[related_incident_id]).calculate_features()
-                related_features[key][DUPLICATE_COL] = 1
-    return pd.DataFrame.from_dict(related_features.values())
+                related_pairs.add(key)
+                related_candidates.append(representations[related_incident_id])
+            if related_candidates:
+                related_features.append(get_candidates_features(representations[incident['id']],
+                                                                related_candidates).drop('id', axis=1))
+    if not related_features:
+        return pd.DataFrame()
+    features = pd.concat(related_features, ignore_index=True)
+    features[DUPLICATE_COL] = 1
+    return features
 
 
 def filter_features(features, selected_features=FEATURES):
@@ -473,6 +587,8 @@ def main():
     MAX_INDICATORS = MAX_INCIDENTS * 100
     THRESHOLD = float(demisto.args().get('threshold', 0.5))
     TIME_FIELD = demisto.args().get('timeField', 'created')
+    feature_store = IncidentFeatureStore(demisto.args().get('featureStoreListName'), get_feature_store_version(),
+                                         max_age_hours=float(demisto.args().get('featureStoreMaxAgeHours', 24)))
 
     incident = enrich_incidents_by_indicators(demisto.incidents(), MAX_INDICATORS).values()[0]
 
@@ -494,36 +610,30 @@ def main():
     use_features = set(features_df.columns).intersection(use_features)
     if USE_MY_DUPLICATES_X_DAYS_AGO > 0:
         my_tagged_data_features = get_my_duplicate_incidents_features(incident['type'], USE_MY_DUPLICATES_X_DAYS_AGO,
-                                                                      MAX_INCIDENTS, MAX_INDICATORS)
+                                                                      MAX_INCIDENTS, MAX_INDICATORS, feature_store)
         features_df = union_complete_missing_values(features_df, my_tagged_data_features).reset_index()
 
     X = filter_features(features_df, use_features)
     Y = features_df[DUPLICATE_COL]
     model = get_ml_model()
     model.fit(X, Y)
-    candidates = enrich_incidents_by_indicators(get_incidents_by_time_diff(incident.get('id'),
-                                                                           incident[TIME_FIELD],
-                                                                           IGNORE_CLOSED_INCIDENTS,
-                                                                           MAX_INCIDENTS, TIME_DIFF_HOURS), MAX_INDICATORS)
-    candidates.pop(incident['id'], None)
-
-    candidates_features_list = []
-    for candidate in candidates.values():
-        feature_dict = IncidentFeatures(incident, candidate).calculate_features()
-        feature_dict['id'] = candidate['id']
-        candidates_features_list.append(feature_dict)
-    if len(candidates_features_list) == 0:
+    candidates_list = get_incidents_by_time_diff(incident.get('id'), incident[TIME_FIELD], IGNORE_CLOSED_INCIDENTS,
+                                                 MAX_INCIDENTS, TIME_DIFF_HOURS) or []
+    candidates = {candidate['id']: candidate for candidate in candidates_list if candidate['id'] != incident['id']}
+    if len(candidates) == 0:
         demisto.results('Did not find any duplicate incidents candidates')
         return
 
-    candidates_features = pd.DataFrame.from_dict(candidates_features_list)
+    candidates_representations = get_incidents_representations(candidates.values(), MAX_INDICATORS, feature_store)
+    feature_store.save()
+    demisto.debug('Feature store: %d incidents reused, %d extracted' % (feature_store.hits, feature_store.misses))
+    candidates_features = get_candidates_features(IncidentRepresentation(incident), candidates_representations.values())
     candidates_features = candidates_features.dropna(axis=0, thresh=(len(use_features) * (1 - CANDIDATES_FEATURES_NA_RATIO)))
     candidates_features_x = filter_features(candidates_features, use_features)
     candidates_features_x = union_complete_missing_values(X, candidates_features_x, ['features', 'candidates']).loc['candidates']
     predications_prob = model.predict_proba(candidates_features_x)
-    predications = model.predict(candidates_features_x)
     result = []
-    for i in range(0, len(predications)):
+    for i in range(0, len(predications_prob)):
         incident_id = candidates_features.iloc[i]['id']
         probability = predications_prob[i][1]
         if probability >= THRESHOLD:
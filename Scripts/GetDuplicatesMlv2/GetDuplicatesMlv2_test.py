@@ -1,7 +1,20 @@
+import json
+import time
+import random
+from datetime import datetime, timedelta
+import editdistance
+import pandas as pd
 import demistomock as demisto
-from GetDuplicatesMlv2 import main, Utils
+import GetDuplicatesMlv2
+from GetDuplicatesMlv2 import main, Utils, IncidentRepresentation, get_candidates_features, LABELS_BLACKLIST, \
+    INSTANCE_LABEL, EMAIL_SENDER_ADDRESS_LABEL, EMAIL_DATE_LABEL, EMAIL_SUBJECT_LABEL, EMAIL_ATTACHMENT_LABEL, \
+    EMAIL_TEXT_LABEL, EMAIL_HTML_LABEL, COMPARED_LABELS
 from CommonServerPython import entryTypes
 
+INDICATORS_FOR_JACCARD = ['Email', 'IP', 'Domain', 'URL']
+WORDS = ['invoice', 'payment', 'urgent', 'account', 'password', 'update', 'report', 'meeting', 'review', 'alert']
+DOMAINS = ['example.com', 'mail.example.org', 'payments.example.net', 'example.co.uk']
+
 
 def test_main(mocker):
     def executeCommand(name, args=None):
@@ -42,3 +55,134 @@ def test_extract_domain_from_url():
     assert res == 'google.com'
     res = Utils.extract_domain_from_url("https://www.google.co.il")  # disable-secrets-detection
     assert res == 'google.co.il'
+
+
+def create_incident(incident_id, base_time):
+    domain = random.choice(DOMAINS)
+    sender = 'user%d@%s' % (random.randint(0, 20), domain)
+    incident_time = base_time + timedelta(minutes=random.randint(-2000, 2000))
+    labels = [
+        {'type': 'Instance', 'value': random.choice(['mail1', 'mail2'])},
+        {'type': 'Email/headers/From', 'value': 'Sender Name <%s>' % sender},
+        {'type': 'Email/headers/Subject', 'value': ' '.join(random.sample(WORDS, 3))},
+        {'type': 'Email/headers/Date', 'value': incident_time.strftime('%a, %d %b %Y %H:%M:%S +0000')},
+        {'type': 'Email/text', 'value': ' '.join(random.choice(WORDS) for _ in range(30))},
+        {'type': 'Email/attachments', 'value': random.choice(['invoice.pdf', 'report.docx', ''])},
+        {'type': 'Custom/reporter', 'value': 'https://%s/report/%d' % (random.choice(DOMAINS), random.randint(0, 5))},
+    ]
+    return {
+        'id': str(incident_id),
+        'type': random.choice(['Phishing', 'Malware']),
+        'severity': random.randint(0, 3),
+        'created': incident_time.isoformat() + 'Z',
+        'CustomFields': {'field%d' % i: random.choice(WORDS) for i in range(3)},
+        'labels': random.sample(labels, random.randint(3, len(labels))),
+        'indicators': {
+            'Email': [sender],
+            'IP': ['10.0.%d.%d' % (random.randint(0, 2), random.randint(0, 5)) for _ in range(random.randint(0, 3))],
+            'URL': ['https://%s/login' % domain] if random.random() > 0.5 else [],
+        },
+    }
+
+
+def create_incidents(candidates_count, seed=0):
+    random.seed(seed)
+    base_time = datetime(2019, 9, 1)
+    incident = create_incident('incident', base_time)
+    return incident, [create_incident(i, base_time) for i in range(candidates_count)]
+
+
+def get_indicators(incident, labels):
+    indicators = dict(incident['indicators'])
+    domains = Utils.get_unique_list(indicators.get('Domain', []) + Utils.get_domains(indicators, labels))
+    if len(domains) > 0:
+        indicators['Domain'] = domains
+    return indicators
+
+
+def get_pair_features(incident1, incident2):
+    """The features of a single pair, calculated from the raw incidents as was done for every pair before
+    get_candidates_features.
+    """
+    labels1 = Utils.get_incident_labels_map(incident1['labels'])
+    labels2 = Utils.get_incident_labels_map(incident2['labels'])
+    indicators1 = get_indicators(incident1, labels1)
+    indicators2 = get_indicators(incident2, labels2)
+    features = {
+        'id': incident2['id'],
+        'incident_time_diff': Utils.get_time_diff_seconds(incident1['created'], incident2['created']),
+        'same_type': incident1['type'] == incident2['type'],
+        'same_severity': incident1['severity'] == incident2['severity'],
+        'custom_fields_jaccard': Utils.jaccard_similarity(incident1.get('CustomFields', []),
+                                                          incident2.get('CustomFields', [])),
+        'labels_jaccard': Utils.jaccard_similarity([(k, v) for (k, v) in labels1.items() if k not in LABELS_BLACKLIST],
+                                                   [(k, v) for (k, v) in labels2.items() if k not in LABELS_BLACKLIST]),
+    }
+    if INSTANCE_LABEL in labels1 and INSTANCE_LABEL in labels2:
+        features['same_instance'] = labels1[INSTANCE_LABEL] == labels2[INSTANCE_LABEL]
+    for indicator_type in INDICATORS_FOR_JACCARD:
+        if indicator_type in indicators1 and indicator_type in indicators2:
+            features['indicator_%s_jaccard' % indicator_type] = Utils.jaccard_similarity(indicators1[indicator_type],
+                                                                                         indicators2[indicator_type])
+    if EMAIL_SENDER_ADDRESS_LABEL in labels1 and EMAIL_SENDER_ADDRESS_LABEL in labels2:
+        sender1 = Utils.get_email_address(labels1[EMAIL_SENDER_ADDRESS_LABEL])
+        sender2 = Utils.get_email_address(labels2[EMAIL_SENDER_ADDRESS_LABEL])
+        if sender1 and sender2:
+            features[EMAIL_SENDER_ADDRESS_LABEL] = editdistance.eval(sender1, sender2)
+    if EMAIL_DATE_LABEL in labels1 and EMAIL_DATE_LABEL in labels2:
+        time_diff = Utils.get_time_diff_seconds(labels1[EMAIL_DATE_LABEL], labels2[EMAIL_DATE_LABEL])
+        if time_diff is not None:
+            features[EMAIL_DATE_LABEL] = time_diff
+    for label_name in (EMAIL_SUBJECT_LABEL, EMAIL_ATTACHMENT_LABEL):
+        if label_name in labels1 and label_name in labels2:
+            features[label_name] = editdistance.eval(labels1[label_name], labels2[label_name])
+    for label_name in (EMAIL_TEXT_LABEL, EMAIL_HTML_LABEL):
+        if label_name in labels1 and label_name in labels2:
+            features[label_name] = Utils.jaccard_similarity(labels1[label_name].split(), labels2[label_name].split())
+    return features
+
+
+def test_get_candidates_features(mocker):
+    mocker.patch.object(GetDuplicatesMlv2, 'INDICATORS_FOR_JACCARD', INDICATORS_FOR_JACCARD)
+    incident, candidates = create_incidents(50)
+
+    features = get_candidates_features(IncidentRepresentation(incident),
+                                       [IncidentRepresentation(candidate) for candidate in candidates], [])
+
+    expected = pd.DataFrame.from_dict([get_pair_features(incident, candidate) for candidate in candidates])
+    pd.testing.assert_frame_equal(features, expected[sorted(expected.columns)], check_dtype=False)
+
+
+def test_incident_representation_record(mocker):
+    mocker.patch.object(GetDuplicatesMlv2, 'INDICATORS_FOR_JACCARD', INDICATORS_FOR_JACCARD)
+    incident, candidates = create_incidents(20)
+    representations = [IncidentRepresentation(candidate) for candidate in candidates]
+    # the records are kept as JSON by the feature store
+    loaded_representations = [IncidentRepresentation.from_record(json.loads(json.dumps(representation.to_record())))
+                              for representation in representations]
+    assert all(set(representation.to_record()['labels_map']) <= set(COMPARED_LABELS)
+               for representation in representations)
+
+    pd.testing.assert_frame_equal(get_candidates_features(IncidentRepresentation(incident), loaded_representations, []),
+                                  get_candidates_features(IncidentRepresentation(incident), representations, []))
+
+
+def benchmark_candidates_features(candidates_count=1000):
+    GetDuplicatesMlv2.INDICATORS_FOR_JACCARD = INDICATORS_FOR_JACCARD
+    incident, candidates = create_incidents(candidates_count)
+    # load the suffix list of the domains extraction before timing
+    Utils.extract_domain_from_url('https://www.example.com')
+
+    start = time.time()
+    pd.DataFrame.from_dict([get_pair_features(incident, candidate) for candidate in candidates])
+    pairs_time = time.time() - start
+
+    start = time.time()
+    get_candidates_features(IncidentRepresentation(incident),
+                            [IncidentRepresentation(candidate) for candidate in candidates], [])
+    batch_time = time.time() - start
+    print('%d candidates: features per pair %.2fs, batch %.2fs' % (candidates_count, pairs_time, batch_time))
+
+
+if __name__ == '__main__':
+    benchmark_candidates_features()
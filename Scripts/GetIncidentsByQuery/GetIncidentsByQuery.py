@@ -12,14 +12,6 @@ def parse_datetime(datetime_str):
         return datetime_str
 
 
-def get_context(incident_id):
-    res = demisto.executeCommand("getContext", {'id': incident_id})
-    try:
-        return res[0]['Contents'].get('context') or {}
-    except Exception:
-        return {}
-
-
 def build_incidents_query(extra_query, incident_types, time_field, from_date, to_date, non_empty_fields):
     query_parts = []
     if extra_query:
@@ -43,8 +35,11 @@ def build_incidents_query(extra_query, incident_types, time_field, from_date, to
     return query
 
 
-def get_incidents(query, time_field, size):
-    res = demisto.executeCommand("getIncidents", {"query": query, "size": size, "sort": time_field})
+def get_incidents(query, time_field, size, page=None):
+    args = {"query": query, "size": size, "sort": time_field}
+    if page is not None:
+        args["page"] = page
+    res = demisto.executeCommand("getIncidents", args)
     if res[0]['Type'] == entryTypes['error']:
         error_message = str(res[0]['Contents'])
         return_error("Failed to get incidents by query: %s error: %s" % (query, error_message))
@@ -52,6 +47,58 @@ def get_incidents(query, time_field, size):
     return incident_list
 
 
+def get_incidents_pages(query, time_field, limit, page_size):
+    page_number = 0
+    count = 0
+    while count < limit:
+        page = get_incidents(query, time_field, page_size, page_number)[:limit - count]
+        if not page:
+            return
+        yield page
+        count += len(page)
+        if len(page) < page_size:
+            return
+        page_number += 1
+
+
+def prepare_incidents(incident_list, include_context, context_keys, populate_fields):
+    # extend incidents fields \ context
+    for i in incident_list:
+        # we flat the custom field to the incident structure, like in the context
+        custom_fields = i.get('CustomFields', {}) or {}
+        i.update(custom_fields)
+    if include_context:
+        contexts = get_incidents_contexts([i['id'] for i in incident_list], keys=context_keys)
+        for i, context in zip(incident_list, contexts):
+            i['context'] = context
+    if populate_fields:
+        fields = (populate_fields + ['context']) if include_context else populate_fields
+        incident_list = [{field: i[field] for field in fields if field in i} for i in incident_list]
+    return incident_list
+
+
+def write_incidents_file(file_path, pages, output_format):
+    count = 0
+    with open(file_path, 'wb') as f:
+        if output_format == 'json':
+            f.write(b'[')
+        for page in pages:
+            if output_format == 'pickle':
+                # only without pageSize, as a single page
+                pickle.dump(page, f)
+            else:
+                for index, i in enumerate(page):
+                    if output_format == 'json' and count + index > 0:
+                        f.write(b',')
+                    f.write(json.dumps(i).encode('utf-8'))
+                    if output_format == 'jsonl':
+                        f.write(b'\n')
+            count += len(page)
+        if output_format == 'json':
+            f.write(b']')
+    return count
+
+
 def main():
     # fetch query
     query = build_incidents_query(demisto.args().get('query'),
@@ -60,29 +107,39 @@ def main():
                                   demisto.args().get('fromDate'),
                                   demisto.args().get('toDate'),
                                   demisto.args().get('NonEmptyFields'))
-    incident_list = get_incidents(query, demisto.args()['timeField'], int(demisto.args()['limit']))
+    time_field = demisto.args()['timeField']
+    limit = int(demisto.args()['limit'])
+    page_size = int(demisto.args().get('pageSize') or 0)
     include_context = demisto.args()['includeContext'] == 'true'
-    # extend incidents fields \ context
-    for i in incident_list:
-        # we flat the custom field to the incident structure, like in the context
-        custom_fields = i.get('CustomFields', {}) or {}
-        i.update(custom_fields)
-        if include_context:
-            i['context'] = get_context(i['id'])
+    context_keys = argToList(demisto.args().get('contextKeys'))
+    populate_fields = argToList(demisto.args().get('populateFields'))
+    output_format = demisto.args()['outputFormat']
+    if output_format not in ['pickle', 'json', 'jsonl']:
+        return_error("Invalid output format: %s" % output_format)
+    if page_size > 0 and output_format == 'pickle':
+        # a single pickle would hold all the incidents in memory, and readers load only the first of several pickles
+        return_error("The pickle output format is not supported with pageSize, use the jsonl or json output format")
+
+    if page_size > 0:
+        # paged mode: each page is prepared and written to the file before the next one is fetched
+        pages = (prepare_incidents(page, include_context, context_keys, populate_fields)
+                 for page in get_incidents_pages(query, time_field, limit, page_size))
+        incident_list = None
+    else:
+        incident_list = prepare_incidents(get_incidents(query, time_field, limit), include_context, context_keys,
+                                          populate_fields)
+        pages = iter([incident_list])
 
     # output
     file_name = str(uuid.uuid4())
-
-    output_format = demisto.args()['outputFormat']
-    if output_format == 'pickle':
-        data_encoded = pickle.dumps(incident_list)
-    elif output_format == 'json':
-        data_encoded = json.dumps(incident_list)
-    else:
-        return_error("Invalid output format: %s" % output_format)
-    entry = fileResult(file_name, data_encoded)
-    entry['Contents'] = incident_list
-    entry['HumanReadable'] = "Fetched %d incidents successfully by the query: %s" % (len(incident_list), query)
+    count = write_incidents_file(file_name, pages, output_format)
+    entry = file_result_existing_file(file_name)
+    entry['Contents'] = incident_list if incident_list is not None else {
+        'Filename': file_name,
+        'FileFormat': output_format,
+        'Count': count,
+    }
+    entry['HumanReadable'] = "Fetched %d incidents successfully by the query: %s" % (count, query)
     entry['EntryContext'] = {
         'GetIncidentsByQuery': {
             'Filename': file_name,
@@ -1,4 +1,5 @@
 from CommonServerPython import *
+import pytest
 from GetIncidentsByQuery import build_incidents_query, main
 
 incident1 = {
@@ -58,3 +59,68 @@ def test_main(mocker):
     args['includeContext'] = 'true'
     entry = main()
     assert {} == entry['Contents'][0]['context']
+
+
+def test_main_context_keys(mocker):
+    args = get_args()
+    args.update({'includeContext': 'true', 'contextKeys': 'Email.From'})
+    mocker.patch.object(demisto, 'args', return_value=args)
+
+    def execute_command(command, args):
+        if command == 'getContext':
+            return [{'Type': entryTypes['note'],
+                     'Contents': {'context': {'Email': {'From': 'a', 'To': 'b'}, 'Id': args['id']}}}]
+        return [{'Type': entryTypes['note'], 'Contents': {'data': [dict(incident1), dict(incident2)]}}]
+
+    mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+    execute_command_batch = mocker.patch.object(demisto, 'executeCommandBatch', side_effect=lambda commands: [
+        execute_command(c['command'], c['args']) for c in commands])
+    entry = main()
+    assert [i['context'] for i in entry['Contents']] == [{'Email': {'From': 'a'}}, {'Email': {'From': 'a'}}]
+    assert execute_command_batch.call_count == 1
+
+
+def test_main_paged(mocker):
+    args = get_args()
+    args.update({'limit': '5', 'pageSize': '2', 'populateFields': 'id,testField', 'outputFormat': 'jsonl'})
+    mocker.patch.object(demisto, 'args', return_value=args)
+    incidents = [dict(incident1, id=i) for i in range(10)]
+
+    def execute_command(command, args):
+        page = incidents[args['page'] * args['size']:(args['page'] + 1) * args['size']]
+        return [{'Type': entryTypes['note'], 'Contents': {'data': [dict(i) for i in page]}}]
+
+    execute_command_mock = mocker.patch.object(demisto, 'executeCommand', side_effect=execute_command)
+    written = {}
+
+    def file_result_existing_file(file_name):
+        with open(file_name, 'rb') as f:
+            written['data'] = f.read()
+        os.remove(file_name)
+        return {}
+
+    mocker.patch('GetIncidentsByQuery.file_result_existing_file', side_effect=file_result_existing_file)
+
+    entry = main()
+    assert entry['Contents'] == {'Filename': entry['EntryContext']['GetIncidentsByQuery']['Filename'],
+                                 'FileFormat': 'jsonl', 'Count': 5}
+    assert [call[0][1]['page'] for call in execute_command_mock.call_args_list] == [0, 1, 2]
+    rows = [json.loads(line) for line in written['data'].splitlines()]
+    assert [row['id'] for row in rows] == [0, 1, 2, 3, 4]
+    assert rows[1] == {'id': 1, 'testField': 'testValue'}
+
+    args['outputFormat'] = 'json'
+    main()
+    assert [i['id'] for i in json.loads(written['data'])] == [0, 1, 2, 3, 4]
+
+
+def test_main_paged_rejects_pickle(mocker):
+    args = get_args()
+    args.update({'pageSize': '2', 'outputFormat': 'pickle'})
+    mocker.patch.object(demisto, 'args', return_value=args)
+    execute_command = mocker.patch.object(demisto, 'executeCommand')
+    mocker.patch('GetIncidentsByQuery.return_error', side_effect=ValueError)
+
+    with pytest.raises(ValueError):
+        main()
+    assert execute_command.call_count == 0
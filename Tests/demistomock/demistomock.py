@@ -474,6 +474,10 @@ def executeCommand(command, args):
     return ""
 
 
+def executeCommandBatch(commands):
+    return [executeCommand(c['command'], c.get('args', {})) for c in commands]
+
+
 def getParam(param):
     return params().get(param)
 
@@ -2,14 +2,26 @@ import os
 import signal
 import string
 import time
+import threading
 import unicodedata
+from io import BytesIO
+from collections import deque
+from contextlib import contextmanager
 import urllib3
+import requests
 import demisto_client.demisto_api
-from subprocess import call, Popen, PIPE, check_call, check_output
+from requests.adapters import HTTPAdapter
+from subprocess import call, Popen, PIPE, check_call, check_output, CalledProcessError
+
+try:
+    from urllib.parse import urlsplit, parse_qsl
+except ImportError:  # python 2
+    from urlparse import urlsplit, parse_qsl
 
 VALID_FILENAME_CHARS = '-_.() %s%s' % (string.ascii_letters, string.digits)
 PROXY_PROCESS_INIT_TIMEOUT = 20
-PROXY_PROCESS_INIT_INTERVAL = 1
+PROXY_PROCESS_INIT_INTERVAL = 0.1
+DEFAULT_PORTS = {'http': 80, 'https': 443}
 
 # Disable insecure warnings
 urllib3.disable_warnings()
@@ -205,7 +217,15 @@ class MITMProxy:
                                                    method='POST', body=data)
 
     def get_mock_file_size(self, filepath):
-        return self.ami.check_output(['stat', '-c', '%s', filepath]).strip()
+        """Get the size of a file on the AMI, in a single SSH call.
+
+        Returns:
+            string. The file size, None if the file does not exist.
+        """
+        try:
+            return silence_output(self.ami.check_output, ['stat', '-c', '%s', filepath], stderr='null').strip()
+        except CalledProcessError:
+            return None
 
     def has_mock_file(self, playbook_id):
         command = ["[", "-f", os.path.join(self.current_folder, get_mock_file_path(playbook_id)), "]"]
@@ -233,15 +253,15 @@ class MITMProxy:
         src_files = os.path.join(self.tmp_folder, get_folder_path(playbook_id) + '*')
         dst_folder = os.path.join(self.repo_folder, get_folder_path(playbook_id))
 
-        if not self.has_mock_file(playbook_id):
+        mock_file_size = self.get_mock_file_size(src_filepath)
+        if mock_file_size is None:
             print('Mock file not created!')
-        elif self.get_mock_file_size(src_filepath) == '0':
+        elif mock_file_size == '0':
             print('Mock file is empty, ignoring.')
             self.empty_files.append(playbook_id)
         else:
             # Move to repo folder
-            self.ami.call(['mkdir', '--parents', dst_folder])
-            self.ami.call(['mv', src_files, dst_folder])
+            self.ami.call(['mkdir', '--parents', dst_folder, '&&', 'mv', src_files, dst_folder])
 
     def start(self, playbook_id, path=None, record=False):
         """Start the proxy process and direct traffic through it.
@@ -275,18 +295,14 @@ class MITMProxy:
         if self.process.returncode is not None:
             raise Exception("Proxy process terminated unexpectedly.\nExit code: {}\noutputs:\nSTDOUT\n{}\n\nSTDERR\n{}"
                             .format(self.process.returncode, self.process.stdout.read(), self.process.stderr.read()))
-        log_file_exists = False
-        seconds_since_init = 0
-        # Make sure process is up and running
-        while not log_file_exists and seconds_since_init < PROXY_PROCESS_INIT_TIMEOUT:
-            # Check if log file exist
-            log_file_exists = silence_output(self.ami.call, ['ls', log_file], stdout='null', stderr='null') == 0
-            time.sleep(PROXY_PROCESS_INIT_INTERVAL)
-            seconds_since_init += PROXY_PROCESS_INIT_INTERVAL
-        if not log_file_exists:
+        # Make sure process is up and running - wait for the log file on the AMI itself, in a single SSH call
+        start_time = time.time()
+        wait_command = ['timeout', str(PROXY_PROCESS_INIT_TIMEOUT), 'sh', '-c',
+                        "'while [ ! -f {} ]; do sleep {}; done'".format(log_file, PROXY_PROCESS_INIT_INTERVAL)]
+        if silence_output(self.ami.call, wait_command, stdout='null', stderr='null') != 0:
             self.stop()
             raise Exception("Proxy process took to long to go up.")
-        print('Proxy process up and running. Took {} seconds'.format(seconds_since_init))
+        print('Proxy process up and running. Took {:.1f} seconds'.format(time.time() - start_time))
 
     def stop(self):
         if not self.process:
@@ -302,3 +318,235 @@ class MITMProxy:
             print(self.process.stderr.read())
 
         self.process = None
+
+
+def _native_str(value):
+    """Convert bytes of the mock files to the native str type (a no-op on python 2)."""
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode('latin-1')
+    return value
+
+
+def parse_tnetstring(data, offset=0):
+    """Parse a single tnetstring value - the serialization format of mitmproxy flow files.
+
+    Args:
+        data (bytes): the serialized data.
+        offset (int): index in data at which the value starts.
+
+    Returns:
+        tuple. The parsed value and the index in data right after it.
+    """
+    colon = data.index(b':', offset)
+    start = colon + 1
+    end = start + int(data[offset:colon])
+    payload = data[start:end]
+    value_type = data[end:end + 1]
+    if value_type == b',':
+        value = payload
+    elif value_type == b';':
+        value = payload.decode('utf-8', 'replace')
+    elif value_type == b'#':
+        value = int(payload)
+    elif value_type == b'^':
+        value = float(payload)
+    elif value_type == b'!':
+        value = payload == b'true'
+    elif value_type == b'~':
+        value = None
+    elif value_type == b']':
+        value = []
+        index = start
+        while index < end:
+            item, index = parse_tnetstring(data, index)
+            value.append(item)
+    elif value_type == b'}':
+        value = {}
+        index = start
+        while index < end:
+            key, index = parse_tnetstring(data, index)
+            value[_native_str(key)], index = parse_tnetstring(data, index)
+    else:
+        raise ValueError('Unknown tnetstring type {!r} at offset {}'.format(value_type, end))
+    return value, end + 1
+
+
+def dump_tnetstring(value):
+    """Serialize a value to a tnetstring, the inverse of parse_tnetstring.
+
+    Returns:
+        bytes. The serialized value.
+    """
+    if value is None:
+        payload, value_type = b'', b'~'
+    elif isinstance(value, bool):
+        payload, value_type = b'true' if value else b'false', b'!'
+    elif isinstance(value, int):
+        payload, value_type = str(value).encode(), b'#'
+    elif isinstance(value, float):
+        payload, value_type = repr(value).encode(), b'^'
+    elif isinstance(value, bytes):
+        payload, value_type = value, b','
+    elif isinstance(value, (list, tuple)):
+        payload, value_type = b''.join(dump_tnetstring(item) for item in value), b']'
+    elif isinstance(value, dict):
+        payload = b''.join(dump_tnetstring(key) + dump_tnetstring(item) for key, item in value.items())
+        value_type = b'}'
+    else:
+        payload, value_type = value.encode('utf-8'), b';'
+    return str(len(payload)).encode() + b':' + payload + value_type
+
+
+def get_request_key(method, scheme, host, port, path, content):
+    """Get the key a request is matched by on playback.
+    Same as the default of mitmdump --server-replay: the headers are ignored and the query params are compared
+    in their order.
+
+    Returns:
+        tuple. The request key.
+    """
+    path, _, query = path.partition('?')
+    return (int(port), scheme, method.upper(), path, content or b'', host,
+            tuple(parse_qsl(query, keep_blank_values=True)))
+
+
+def read_mock_flows(mock_file_path):
+    """Read the recorded HTTP flows of a mock file.
+
+    Args:
+        mock_file_path (string): path to a mock file saved by mitmdump --save-stream-file.
+
+    Returns:
+        list. (request key, response) tuples in the recorded order. A response is a dict with the status_code,
+        reason, headers (list of (name, value) tuples) and content (still encoded by its Content-Encoding).
+    """
+    with open(mock_file_path, 'rb') as mock_file:
+        data = mock_file.read()
+    flows = []
+    offset = 0
+    while offset < len(data):
+        flow, offset = parse_tnetstring(data, offset)
+        request = flow.get('request')
+        response = flow.get('response')
+        if _native_str(flow.get('type')) != 'http' or not request or not response:
+            continue
+        key = get_request_key(_native_str(request['method']), _native_str(request['scheme']),
+                              _native_str(request['host']), request['port'], _native_str(request['path']),
+                              request.get('content'))
+        flows.append((key, {
+            'status_code': response['status_code'],
+            'reason': _native_str(response.get('reason') or ''),
+            'headers': [(_native_str(name), _native_str(value)) for name, value in response.get('headers') or []],
+            'content': response.get('content') or b'',
+        }))
+    return flows
+
+
+class MockReplayEngine(object):
+    """In-process playback of mock files, serving the recorded responses to requests without a proxy process.
+
+    Requests are matched like mitmdump --server-replay matches them, through a dict indexed by the request key.
+    Each recorded response is replayed once, in the recorded order, so repeated requests get their responses in turn.
+    An engine serves a single test run - use a new one (from_file is cached) for every run, and mount it on its own
+    session to run tests in parallel in the same process.
+
+    Attributes:
+        responses (dict): request key to a deque of the recorded responses not replayed yet.
+        unmatched_requests (list): (method, url) of the requests that had no recorded response left.
+            mitmdump --server-replay-kill-extra kills such requests, they get a ConnectionError here.
+    """
+
+    # mock file path to (mtime, size, flows)
+    _flows_cache = {}
+
+    def __init__(self, flows):
+        self.responses = {}
+        for key, response in flows:
+            self.responses.setdefault(key, deque()).append(response)
+        self.unmatched_requests = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, mock_file_path):
+        """Create an engine replaying a mock file. The parsed flows are cached until the file changes."""
+        stat = os.stat(mock_file_path)
+        cached = cls._flows_cache.get(mock_file_path)
+        if not cached or cached[:2] != (stat.st_mtime, stat.st_size):
+            cached = cls._flows_cache[mock_file_path] = (stat.st_mtime, stat.st_size, read_mock_flows(mock_file_path))
+        return cls(cached[2])
+
+    @classmethod
+    def for_playbook(cls, playbook_id, folder=MITMProxy.MOCKS_GIT_PATH):
+        """Create an engine replaying the mock file of a test playbook.
+
+        Args:
+            playbook_id (string): ID of the test playbook.
+            folder (string): path to a local clone of the content-test-data git repo.
+        """
+        return cls.from_file(os.path.join(folder, get_mock_file_path(playbook_id)))
+
+    def match(self, method, url, content=b''):
+        """Get the next recorded response of a request.
+
+        Returns:
+            dict. The recorded response, None if there is none left.
+        """
+        parsed_url = urlsplit(url)
+        scheme = parsed_url.scheme.lower()
+        path = parsed_url.path or '/'
+        if parsed_url.query:
+            path += '?' + parsed_url.query
+        key = get_request_key(method, scheme, parsed_url.hostname, parsed_url.port or DEFAULT_PORTS.get(scheme, 80),
+                              path, content)
+        with self._lock:
+            responses = self.responses.get(key)
+            if responses:
+                return responses.popleft()
+            self.unmatched_requests.append((method, url))
+            return None
+
+    def get_adapter(self):
+        return MockReplayAdapter(self)
+
+    def mount(self, session):
+        """Serve all the requests of a requests session from the mock file."""
+        adapter = self.get_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @contextmanager
+    def patch_requests(self):
+        """Serve the requests of all requests sessions from the mock file, for unit-test style runs of integrations.
+        Affects the whole process, use mount to run tests in parallel.
+        """
+        adapter = self.get_adapter()
+        get_adapter = requests.Session.get_adapter
+        requests.Session.get_adapter = lambda session, url: adapter
+        try:
+            yield self
+        finally:
+            requests.Session.get_adapter = get_adapter
+
+
+class MockReplayAdapter(HTTPAdapter):
+    """requests transport adapter responding from a MockReplayEngine instead of the network."""
+
+    def __init__(self, engine):
+        super(MockReplayAdapter, self).__init__()
+        self.engine = engine
+
+    def send(self, request, **kwargs):
+        content = request.body
+        if hasattr(content, 'read'):
+            content = content.read()
+        if content is not None and not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        recorded = self.engine.match(request.method, request.url, content)
+        if recorded is None:
+            raise requests.exceptions.ConnectionError(
+                'No recorded response left for {} {}'.format(request.method, request.url), request=request)
+        raw = urllib3.HTTPResponse(body=BytesIO(recorded['content']), headers=recorded['headers'],
+                                   status=recorded['status_code'], reason=recorded['reason'],
+                                   preload_content=False, decode_content=True)
+        return self.build_response(request, raw)
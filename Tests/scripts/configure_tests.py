@@ -7,8 +7,10 @@ import os
 import sys
 import json
 import glob
+import time
 import random
 import argparse
+from collections import deque, defaultdict
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONTENT_DIR = os.path.abspath(SCRIPT_DIR + '/../..')
@@ -33,6 +35,8 @@ ALL_TESTS = ["scripts/script-CommonIntegration.yml", "scripts/script-CommonInteg
 # secrets white list file to be ignored in tests to prevent full tests running each time it is updated
 SECRETS_WHITE_LIST = 'secrets_white_list.json'
 
+ID_SET_PATH = './Tests/id_set.json'
+
 # Global used to indicate if failed during any of the validation states
 _FAILED = False
 
@@ -132,7 +136,7 @@ def get_tests(file_path):
         return data_dictionary.get('tests', [])
 
 
-def collect_tests(script_ids, playbook_ids, integration_ids, catched_scripts, catched_playbooks, tests_set):
+def collect_tests(script_ids, playbook_ids, integration_ids, catched_scripts, catched_playbooks, tests_set, id_set):
     """Collect tests for the affected script_ids,playbook_ids,integration_ids.
 
     :param script_ids: The ids of the affected scripts in your change set.
@@ -141,6 +145,7 @@ def collect_tests(script_ids, playbook_ids, integration_ids, catched_scripts, ca
     :param catched_scripts: The names of the scripts we already identified a test for.
     :param catched_playbooks: The names of the scripts we already v a test for.
     :param tests_set: The names of the tests we alredy identified.
+    :param id_set: The loaded id_set.json.
 
     :return: (test_ids, missing_ids) - All the names of possible tests, the ids we didn't match a test for.
     """
@@ -149,9 +154,6 @@ def collect_tests(script_ids, playbook_ids, integration_ids, catched_scripts, ca
 
     test_ids, skipped_tests = get_test_ids()
 
-    with open("./Tests/id_set.json", 'r') as conf_file:
-        id_set = json.load(conf_file)
-
     integration_set = id_set['integrations']
     test_playbooks_set = id_set['TestPlaybooks']
     integration_to_command = get_integration_commands(integration_ids, integration_set)
@@ -242,10 +244,11 @@ def find_tests_for_modified_files(modified_files):
     playbook_names = set([])
     integration_ids = set([])
 
+    id_set = load_id_set()
     tests_set, catched_scripts, catched_playbooks = collect_changed_ids(integration_ids, playbook_names,
-                                                                        script_names, modified_files)
+                                                                        script_names, modified_files, id_set)
     test_ids, missing_ids, caught_missing_test = collect_tests(script_names, playbook_names, integration_ids,
-                                                               catched_scripts, catched_playbooks, tests_set)
+                                                               catched_scripts, catched_playbooks, tests_set, id_set)
     missing_ids = update_with_tests_sections(missing_ids, modified_files, test_ids, tests_set)
 
     if len(missing_ids) > 0:
@@ -286,7 +289,7 @@ def update_with_tests_sections(missing_ids, modified_files, test_ids, tests):
     return missing_ids
 
 
-def collect_changed_ids(integration_ids, playbook_names, script_names, modified_files):
+def collect_changed_ids(integration_ids, playbook_names, script_names, modified_files, id_set):
     tests_set = set([])
     updated_script_names = set([])
     updated_playbook_names = set([])
@@ -318,27 +321,15 @@ def collect_changed_ids(integration_ids, playbook_names, script_names, modified_
             integration_ids.add(_id)
             integration_to_version[_id] = (get_from_version(file_path), get_to_version(file_path))
 
-    with open("./Tests/id_set.json", 'r') as conf_file:
-        id_set = json.load(conf_file)
-
-    script_set = id_set['scripts']
-    playbook_set = id_set['playbooks']
-    integration_set = id_set['integrations']
-
-    for script_id in script_names:
-        enrich_for_script_id(script_id, script_to_version[script_id], script_names, script_set, playbook_set,
-                             playbook_names, updated_script_names, updated_playbook_names, catched_scripts,
-                             catched_playbooks, tests_set)
-
-    integration_to_command = get_integration_commands(integration_ids, integration_set)
-    for integration_id, integration_commands in integration_to_command.items():
-        enrich_for_integration_id(integration_id, integration_to_version[integration_id], integration_commands,
-                                  script_set, playbook_set, playbook_names, script_names, updated_script_names,
-                                  updated_playbook_names, catched_scripts, catched_playbooks, tests_set)
-
-    for playbook_id in playbook_names:
-        enrich_for_playbook_id(playbook_id, playbook_to_version[playbook_id], playbook_names, script_set, playbook_set,
-                               updated_playbook_names, catched_playbooks, tests_set)
+    start_time = time.time()
+    graph = build_id_set_graph(id_set)
+    index_time = time.time()
+    enrich_affected_ids(graph, script_to_version, playbook_to_version, integration_to_version, script_names,
+                        playbook_names, updated_script_names, updated_playbook_names, catched_scripts,
+                        catched_playbooks, tests_set)
+    print('Indexed the id_set in {:.2f} seconds, found {} affected scripts and {} affected playbooks in {:.2f} '
+          'seconds'.format(index_time - start_time, len(updated_script_names), len(updated_playbook_names),
+                           time.time() - index_time))
 
     for new_script in updated_script_names:
         script_names.add(new_script)
@@ -358,143 +349,184 @@ def collect_changed_ids(integration_ids, playbook_names, script_names, modified_
     return tests_set, catched_scripts, catched_playbooks
 
 
-def enrich_for_integration_id(integration_id, given_version, integration_commands, script_set, playbook_set,
-                              playbook_names, script_names, updated_script_names, updated_playbook_names,
-                              catched_scripts, catched_playbooks, tests_set):
+def load_id_set(id_set_path=ID_SET_PATH):
+    """Load the id_set.json file once per test collection"""
+    with open(id_set_path, 'r') as id_set_file:
+        return json.load(id_set_file)
+
+
+def build_id_set_graph(id_set):
+    """Build the reverse dependency index of the id_set.
+
+    Each entry is indexed by the ids it depends on, so finding the entities affected by a changed id is a dictionary
+    lookup instead of a scan of the whole id_set. The candidates of every index keep the id_set order.
+
+    :param id_set: The loaded id_set.json.
+
+    :return: dict of the reverse indexes:
+        script_callers - script id -> scripts executing it.
+        script_playbooks - script id -> playbooks implementing it.
+        playbook_parents - playbook id -> playbooks using it as a sub playbook.
+        command_playbooks - command -> playbooks running it.
+        command_scripts - command -> scripts depending on it.
+        integration_commands - integration id -> its commands.
+        package_has_unittest - package directory -> whether it has a unittest (filled lazily).
+    """
+    graph = {
+        'script_callers': defaultdict(list),
+        'script_playbooks': defaultdict(list),
+        'playbook_parents': defaultdict(list),
+        'command_playbooks': defaultdict(list),
+        'command_scripts': defaultdict(list),
+        'integration_commands': {},
+        'package_has_unittest': {},
+    }
+
+    for position, script in enumerate(id_set['scripts']):
+        script_data = list(script.values())[0]
+        for script_id in set(script_data.get('script_executions', [])):
+            graph['script_callers'][script_id].append((position, script_data))
+
+        for command in set(script_data.get('depends_on', [])):
+            graph['command_scripts'][command].append((position, script_data))
+
+    for position, playbook in enumerate(id_set['playbooks']):
+        playbook_data = list(playbook.values())[0]
+        for script_id in set(playbook_data.get('implementing_scripts', [])):
+            graph['script_playbooks'][script_id].append((position, playbook_data))
+
+        for playbook_id in set(playbook_data.get('implementing_playbooks', [])):
+            graph['playbook_parents'][playbook_id].append((position, playbook_data))
+
+        for command in playbook_data.get('command_to_integration', {}).keys():
+            graph['command_playbooks'][command].append((position, playbook_data))
+
+    for integration in id_set['integrations']:
+        integration_id = list(integration.keys())[0]
+        integration_data = list(integration.values())[0]
+        graph['integration_commands'][integration_id] = integration_data.get('commands', [])
+
+    return graph
+
+
+def has_unittest(graph, package_name):
+    """Check if the package has a unittest, globing the file system only once per package"""
+    if package_name not in graph['package_has_unittest']:
+        graph['package_has_unittest'][package_name] = bool(glob.glob(package_name + "/*_test.py"))
+
+    return graph['package_has_unittest'][package_name]
+
+
+def get_command_candidates(index, commands):
+    """Get the entities running any of the commands, in the id_set order and without duplicates"""
+    candidates = {}
+    for command in commands:
+        for position, data in index.get(command, []):
+            candidates[position] = data
+
+    return [candidates[position] for position in sorted(candidates)]
+
+
+def enrich_affected_ids(graph, script_to_version, playbook_to_version, integration_to_version, script_names,
+                        playbook_names, updated_script_names, updated_playbook_names, catched_scripts,
+                        catched_playbooks, tests_set):
     """Enrich the list of affected scripts/playbooks by your change set.
 
-    :param integration_id: The name of the integration we changed.
-    :param given_version: the version of the integration we changed.
-    :param integration_commands: The commands of the changed integation
-    :param script_set: The set of existing scripts within Content repo.
-    :param playbook_set: The set of existing playbooks within Content repo.
-    :param playbook_names: The names of the playbooks affected by your changes.
+    Walks the reverse dependency graph breadth first, starting from the changed scripts, integrations and playbooks.
+    Every affected script or playbook is visited once.
+
+    :param graph: The reverse dependency index of the id_set, see build_id_set_graph.
+    :param script_to_version: The changed scripts and their (fromversion, toversion).
+    :param playbook_to_version: The changed playbooks and their (fromversion, toversion).
+    :param integration_to_version: The changed integrations and their (fromversion, toversion).
     :param script_names: The names of the scripts affected by your changes.
+    :param playbook_names: The names of the playbooks affected by your changes.
     :param updated_script_names: The names of scripts we identify as affected to your change set.
     :param updated_playbook_names: The names of playbooks we identify as affected to your change set.
     :param catched_scripts: The names of scripts we found tests for.
     :param catched_playbooks: The names of playbooks we found tests for.
     :param tests_set: The names of the caught tests.
     """
-    for playbook in playbook_set:
-        playbook_data = list(playbook.values())[0]
-        playbook_name = playbook_data.get('name')
-        playbook_fromversion = playbook_data.get('fromversion', '0.0.0')
-        playbook_toversion = playbook_data.get('toversion', '99.99.99')
-        command_to_integration = playbook_data.get('command_to_integration', {})
-        implementing_commands = command_to_integration.keys()
-        for integration_command in integration_commands:
-            if integration_command in implementing_commands and playbook_toversion >= given_version[1]:
-                if playbook_name not in playbook_names and playbook_name not in updated_playbook_names:
-                    if not command_to_integration.get(integration_command) or \
-                            command_to_integration.get(integration_command) == integration_id:
-
-                        tests = playbook_data.get('tests', [])
-                        if tests:
-                            catched_playbooks.add(playbook_name)
-                            update_test_set(tests, tests_set)
-
-                        updated_playbook_names.add(playbook_name)
-                        new_versions = (playbook_fromversion, playbook_toversion)
-                        enrich_for_playbook_id(playbook_name, new_versions, playbook_names, script_set, playbook_set,
-                                               updated_playbook_names, catched_playbooks, tests_set)
-
-    for script in script_set:
-        script_data = list(script.values())[0]
-        script_name = script_data.get('name')
-        script_file_path = script_data.get('file_path')
-        script_fromversion = script_data.get('fromversion', '0.0.0')
-        script_toversion = script_data.get('toversion', '99.99.99')
-        command_to_integration = script_data.get('command_to_integration', {})
-        for integration_command in integration_commands:
-            if integration_command in script_data.get('depends_on', []) and not script_data.get('deprecated'):
-                if integration_command in command_to_integration.keys() and \
-                        command_to_integration[integration_command] == integration_id and \
-                        script_toversion >= given_version[1]:
-
-                    if script_name not in script_names and script_name not in updated_script_names:
-                        tests = script_data.get('tests', [])
-                        if tests:
-                            catched_scripts.add(script_name)
-                            update_test_set(tests, tests_set)
-
-                        package_name = os.path.dirname(script_file_path)
-                        if glob.glob(package_name + "/*_test.py"):
-                            catched_scripts.add(script_name)
-                            tests.add('Found a unittest for the script {}'.format(script_name))
-
-                        updated_script_names.add(script_name)
-                        new_versions = (script_fromversion, script_toversion)
-                        enrich_for_script_id(script_name, new_versions, script_names, script_set, playbook_set,
-                                             playbook_names, updated_script_names, updated_playbook_names,
-                                             catched_scripts, catched_playbooks, tests_set)
-
-
-def enrich_for_playbook_id(given_playbook_id, given_version, playbook_names, script_set, playbook_set,
-                           updated_playbook_names, catched_playbooks, tests_set):
-    for playbook in playbook_set:
-        playbook_data = list(playbook.values())[0]
-        playbook_name = playbook_data.get('name')
-        playbook_fromversion = playbook_data.get('fromversion', '0.0.0')
-        playbook_toversion = playbook_data.get('toversion', '99.99.99')
-        if given_playbook_id in playbook_data.get('implementing_playbooks', []) and \
-                playbook_toversion >= given_version[1]:
-
-            if playbook_name not in playbook_names and playbook_name not in updated_playbook_names:
-                tests = playbook_data.get('tests', [])
-                if tests:
-                    catched_playbooks.add(playbook_name)
-                    update_test_set(tests, tests_set)
-
-                updated_playbook_names.add(playbook_name)
-                new_versions = (playbook_fromversion, playbook_toversion)
-                enrich_for_playbook_id(playbook_name, new_versions, playbook_names, script_set, playbook_set,
-                                       updated_playbook_names, catched_playbooks, tests_set)
-
-
-def enrich_for_script_id(given_script_id, given_version, script_names, script_set, playbook_set, playbook_names,
-                         updated_script_names, updated_playbook_names, catched_scripts, catched_playbooks, tests_set):
-    for script in script_set:
-        script_data = list(script.values())[0]
+    queue = deque()
+
+    def visit_script(script_data):
         script_name = script_data.get('name')
-        script_file_path = script_data.get('file_path')
-        script_fromversion = script_data.get('fromversion', '0.0.0')
-        script_toversion = script_data.get('toversion', '99.99.99')
-        if given_script_id in script_data.get('script_executions', []) and not script_data.get('deprecated') and \
-                script_toversion >= given_version[1]:
-            if script_name not in script_names and script_name not in updated_script_names:
-                tests = set(script_data.get('tests', []))
-                if tests:
-                    catched_scripts.add(script_name)
-                    update_test_set(tests, tests_set)
-
-                package_name = os.path.dirname(script_file_path)
-                if glob.glob(package_name + "/*_test.py"):
-                    catched_scripts.add(script_name)
-                    tests.add('Found a unittest for the script {}'.format(script_name))
-
-                updated_script_names.add(script_name)
-                new_versions = (script_fromversion, script_toversion)
-                enrich_for_script_id(script_name, new_versions, script_names, script_set, playbook_set, playbook_names,
-                                     updated_script_names, updated_playbook_names, catched_scripts, catched_playbooks,
-                                     tests_set)
-
-    for playbook in playbook_set:
-        playbook_data = list(playbook.values())[0]
+        tests = script_data.get('tests', [])
+        if tests:
+            catched_scripts.add(script_name)
+            update_test_set(tests_set, tests)
+
+        if has_unittest(graph, os.path.dirname(script_data.get('file_path'))):
+            catched_scripts.add(script_name)
+            tests_set.add('Found a unittest for the script {}'.format(script_name))
+
+        updated_script_names.add(script_name)
+        queue.append(('script', script_name, get_versions(script_data)))
+
+    def visit_playbook(playbook_data):
         playbook_name = playbook_data.get('name')
-        playbook_fromversion = playbook_data.get('fromversion', '0.0.0')
-        playbook_toversion = playbook_data.get('toversion', '99.99.99')
-        if given_script_id in playbook_data.get('implementing_scripts', []) and playbook_toversion >= given_version[1]:
-            if playbook_name not in playbook_names and playbook_name not in updated_playbook_names:
-                tests = playbook_data.get('tests', [])
-                if tests:
-                    catched_playbooks.add(playbook_name)
-                    update_test_set(tests, tests_set)
-
-                updated_playbook_names.add(playbook_name)
-                new_versions = (playbook_fromversion, playbook_toversion)
-                enrich_for_playbook_id(playbook_name, new_versions, playbook_names, script_set, playbook_set,
-                                       updated_playbook_names, catched_playbooks, tests_set)
+        tests = playbook_data.get('tests', [])
+        if tests:
+            catched_playbooks.add(playbook_name)
+            update_test_set(tests_set, tests)
+
+        updated_playbook_names.add(playbook_name)
+        queue.append(('playbook', playbook_name, get_versions(playbook_data)))
+
+    def is_new_script(script_data):
+        return script_data.get('name') not in script_names and script_data.get('name') not in updated_script_names
+
+    def is_new_playbook(playbook_data):
+        return playbook_data.get('name') not in playbook_names and \
+            playbook_data.get('name') not in updated_playbook_names
+
+    for script_id in script_names:
+        queue.append(('script', script_id, script_to_version[script_id]))
+
+    for integration_id in integration_to_version:
+        if integration_id in graph['integration_commands']:
+            queue.append(('integration', integration_id, integration_to_version[integration_id]))
+
+    for playbook_id in playbook_names:
+        queue.append(('playbook', playbook_id, playbook_to_version[playbook_id]))
+
+    while queue:
+        entity_type, entity_id, given_version = queue.popleft()
+        if entity_type == 'script':
+            for _, script_data in graph['script_callers'].get(entity_id, []):
+                if not script_data.get('deprecated') and get_versions(script_data)[1] >= given_version[1] and \
+                        is_new_script(script_data):
+                    visit_script(script_data)
+
+            for _, playbook_data in graph['script_playbooks'].get(entity_id, []):
+                if get_versions(playbook_data)[1] >= given_version[1] and is_new_playbook(playbook_data):
+                    visit_playbook(playbook_data)
+
+        elif entity_type == 'playbook':
+            for _, playbook_data in graph['playbook_parents'].get(entity_id, []):
+                if get_versions(playbook_data)[1] >= given_version[1] and is_new_playbook(playbook_data):
+                    visit_playbook(playbook_data)
+
+        else:
+            integration_commands = graph['integration_commands'][entity_id]
+            for playbook_data in get_command_candidates(graph['command_playbooks'], integration_commands):
+                command_to_integration = playbook_data.get('command_to_integration', {})
+                if get_versions(playbook_data)[1] >= given_version[1] and is_new_playbook(playbook_data) and \
+                        any(not command_to_integration[command] or command_to_integration[command] == entity_id
+                            for command in integration_commands if command in command_to_integration):
+                    visit_playbook(playbook_data)
+
+            for script_data in get_command_candidates(graph['command_scripts'], integration_commands):
+                command_to_integration = script_data.get('command_to_integration', {})
+                if not script_data.get('deprecated') and get_versions(script_data)[1] >= given_version[1] and \
+                        is_new_script(script_data) and \
+                        any(command_to_integration.get(command) == entity_id for command in integration_commands
+                            if command in script_data.get('depends_on', [])):
+                    visit_script(script_data)
+
+
+def get_versions(entity_data):
+    return entity_data.get('fromversion', '0.0.0'), entity_data.get('toversion', '99.99.99')
 
 
 def update_test_set(tests_set, tests):
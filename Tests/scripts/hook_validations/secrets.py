@@ -6,6 +6,7 @@ import json
 import string
 import argparse
 import PyPDF2
+from collections import Counter
 
 from bs4 import BeautifulSoup
 from Tests.scripts.constants import *
@@ -14,6 +15,7 @@ from Tests.test_utils import run_command, print_error, str2bool, print_color, LO
 # secrets settings
 # Entropy score is determined by shanon's entropy algorithm, most English words will score between 1.5 and 3.5
 ENTROPY_THRESHOLD = 4.0
+PRINTABLE_CHARS_ORDER = {char: index for index, char in enumerate(string.printable)}
 ACCEPTED_FILE_STATUSES = ['m', 'a']
 SKIPPED_FILES = {'secrets_white_list', 'id_set.json', 'conf.json', 'Pipfile', 'secrets-ignore', 'ami_builds.json',
                  'secrets_test.py', 'secrets.py'}
@@ -54,6 +56,12 @@ DATES_REGEX = r'((\d{4}[/.-]\d{2}[/.-]\d{2})[T\s](\d{2}:?\d{2}:?\d{2}:?(\.\d{5,1
 UUID_REGEX = r'([\w]{8}-[\w]{4}-[\w]{4}-[\w]{4}-[\w]{8,12})'
 # disable-secrets-detection-end
 
+# compiled white list matchers, regexes and loaded white list files, see get_white_list_matcher,
+# remove_white_list_regex and get_white_listed_items
+_white_list_matchers = {}
+_white_list_regexes = {}
+_white_list_files = {}
+
 
 def get_secrets(branch_name, is_circle):
     secrets_found = {}
@@ -148,11 +156,17 @@ def search_potential_secrets(secrets_file_paths: list):
         if is_pack:
             file_contents = remove_white_list_regex(file_contents, secrets_white_list)
             secrets_white_list = set()
+        is_white_listed = get_white_list_matcher(secrets_white_list)
+        is_ioc_white_listed = get_white_list_matcher(ioc_white_list)
         yml_file_contents = get_related_yml_contents(file_path)
+        temp_white_list = set()
         # Add all context output paths keywords to whitelist temporary
         if file_extension == YML_FILE_EXTENSION or yml_file_contents:
             temp_white_list = create_temp_white_list(yml_file_contents if yml_file_contents else file_contents)
-            secrets_white_list = secrets_white_list.union(temp_white_list)
+        # the temp white list is specific to the file, so it is not cached
+        is_temp_white_listed = get_white_list_matcher(temp_white_list, use_cache=False)
+        # lower cased false positives found in the file so far, white listed in the lines after them
+        false_positives_white_list = set()
         # Search by lines after strings with high entropy / IoCs regex as possibly suspicious
         for line in file_contents.split('\n'):
             # if detected disable-secrets comments, skip the line/s
@@ -163,10 +177,10 @@ def search_potential_secrets(secrets_file_paths: list):
             # REGEX scanning for IOCs and false positive groups
             regex_secrets, false_positives = regex_for_secrets(line)
             for regex_secret in regex_secrets:
-                if not any(ioc.lower() in regex_secret.lower() for ioc in ioc_white_list):
+                if not is_ioc_white_listed(regex_secret.lower()):
                     secrets_found_with_regex.append(regex_secret)
             # added false positives into white list array before testing the strings in line
-            secrets_white_list = secrets_white_list.union(false_positives)
+            false_positives_white_list.update(false_positive.lower() for false_positive in false_positives)
             # due to nature of eml files, skip string by string secret detection - only regex
             if file_extension in SKIP_FILE_TYPE_ENTROPY_CHECKS or \
                     any(demisto_type in file_name for demisto_type in SKIP_DEMISTO_TYPE_ENTROPY_CHECKS):
@@ -175,7 +189,9 @@ def search_potential_secrets(secrets_file_paths: list):
             # calculate entropy for each string in the file
             for string_ in line.split():
                 # compare the lower case of the string against both generic whitelist & temp white list
-                if not any(white_list_string.lower() in string_.lower() for white_list_string in secrets_white_list):
+                lower_string = string_.lower()
+                if not is_white_listed(lower_string) and not is_temp_white_listed(lower_string) and \
+                        not any(false_positive in lower_string for false_positive in false_positives_white_list):
                     entropy = calculate_shannon_entropy(string_)
                     if entropy >= ENTROPY_THRESHOLD:
                         high_entropy_strings.append(string_)
@@ -190,10 +206,53 @@ def search_potential_secrets(secrets_file_paths: list):
 
 def remove_white_list_regex(file_contents, secrets_white_list):
     for regex in secrets_white_list:
-        file_contents = re.sub(regex, '', file_contents)
+        # packs white lists may be larger than the re module cache, so keep them compiled across files
+        if regex not in _white_list_regexes:
+            _white_list_regexes[regex] = re.compile(regex)
+        file_contents = _white_list_regexes[regex].sub('', file_contents)
     return file_contents
 
 
+def get_white_list_matcher(white_list, use_cache=True):
+    """Get a function checking if a lower cased string contains any of the white list strings (case insensitive).
+
+    The white list is compiled once, to a single regex of the white list strings trie, and cached by its content.
+    :param white_list: the white listed strings
+    :param use_cache: whether to cache the compiled white list
+    :return: function(lower_string) -> bool
+    """
+    key = frozenset(white_list)
+    if key in _white_list_matchers:
+        return _white_list_matchers[key]
+
+    matcher = build_white_list_regex(key).search if key else lambda lower_string: False
+    if use_cache:
+        _white_list_matchers[key] = matcher
+    return matcher
+
+
+def build_white_list_regex(white_list):
+    trie = {}
+    for white_item in white_list:
+        node = trie
+        for char in white_item.lower():
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return re.compile(_trie_to_regex(trie))
+
+
+def _trie_to_regex(node):
+    prefix = ''
+    while '' not in node and len(node) == 1:
+        char, node = next(iter(node.items()))
+        prefix += re.escape(char)
+    if '' in node:
+        # a white listed string ends here, so longer ones starting with it are not needed to match
+        return prefix
+    alternatives = [re.escape(char) + _trie_to_regex(child) for char, child in sorted(node.items())]
+    return prefix + '(?:' + '|'.join(alternatives) + ')'
+
+
 def create_temp_white_list(file_contents):
     temp_white_list = set()
     context_paths = re.findall(r'contextPath: (\S+\.+\S+)', file_contents)
@@ -277,20 +336,22 @@ def calculate_shannon_entropy(data):
     if not data:
         return 0
     entropy = 0
-    # each unicode code representation of all characters which are considered printable
-    for char in (ord(c) for c in string.printable):
+    chars_count = Counter(data)
+    # all the characters of the data which are considered printable, summed in the order of string.printable
+    for char in sorted((c for c in chars_count if c in PRINTABLE_CHARS_ORDER), key=PRINTABLE_CHARS_ORDER.get):
         # probability of event X
-        p_x = float(data.count(chr(char))) / len(data)
-        if p_x > 0:
-            # the information in every possible news, in bits
-            entropy += - p_x * math.log(p_x, 2)
+        p_x = float(chars_count[char]) / len(data)
+        # the information in every possible news, in bits
+        entropy += - p_x * math.log(p_x, 2)
     return entropy
 
 
 def get_white_listed_items(is_pack, pack_name):
     whitelist_path = os.path.join(PACKS_PATH, pack_name, PACKS_WHITELIST_FILE_NAME) if is_pack else WHITELIST_PATH
-    final_white_list, ioc_white_list, files_while_list = get_packs_white_list(whitelist_path) if is_pack else\
-        get_generic_white_list(whitelist_path)
+    if whitelist_path not in _white_list_files:
+        _white_list_files[whitelist_path] = get_packs_white_list(whitelist_path) if is_pack else\
+            get_generic_white_list(whitelist_path)
+    final_white_list, ioc_white_list, files_while_list = _white_list_files[whitelist_path]
     return set(final_white_list), set(ioc_white_list), set(files_while_list)
 
 
@@ -0,0 +1,134 @@
+"""Benchmark of the secrets detection on the largest text files of the repo.
+
+Compares the current implementation with the previous one, which checked every string of the file against every
+white list item, counted each printable character separately for the entropy, and recompiled the packs white list
+regexes once they did not fit the re module cache. Also verifies both find the same secrets.
+Usage: python3 Tests/scripts/hook_validations/secrets_benchmark.py [number of files]
+"""
+import os
+import re
+import sys
+import math
+import string
+import time
+
+CONTENT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.append(CONTENT_DIR)
+
+from Tests.scripts.hook_validations import secrets  # noqa: E402
+
+TEXT_DIRS = ('Integrations', 'Scripts', 'Playbooks', 'TestPlaybooks', 'Packs', 'Beta_Integrations')
+
+
+def legacy_remove_white_list_regex(file_contents, secrets_white_list):
+    for regex in secrets_white_list:
+        file_contents = re.sub(regex, '', file_contents)
+    return file_contents
+
+
+def legacy_calculate_shannon_entropy(data):
+    if not data:
+        return 0
+    entropy = 0
+    for char in (ord(c) for c in string.printable):
+        p_x = float(data.count(chr(char))) / len(data)
+        if p_x > 0:
+            entropy += - p_x * math.log(p_x, 2)
+    return entropy
+
+
+def legacy_search_potential_secrets(secrets_file_paths):
+    secrets_found = {}
+    for file_path in secrets_file_paths:
+        is_pack = secrets.is_file_path_in_pack(file_path)
+        pack_name = secrets.get_pack_name(file_path)
+        secrets_white_list, ioc_white_list, files_white_list = secrets.get_white_listed_items(is_pack, pack_name)
+        if file_path in files_white_list:
+            continue
+        file_name = os.path.basename(file_path)
+        high_entropy_strings = []
+        secrets_found_with_regex = []
+        _, file_extension = os.path.splitext(file_path)
+        skip_secrets = {'skip_once': False, 'skip_multi': False}
+        file_contents = secrets.get_file_contents(file_path, file_extension)
+        if is_pack:
+            file_contents = legacy_remove_white_list_regex(file_contents, secrets_white_list)
+            secrets_white_list = set()
+        yml_file_contents = secrets.get_related_yml_contents(file_path)
+        if file_extension == secrets.YML_FILE_EXTENSION or yml_file_contents:
+            temp_white_list = secrets.create_temp_white_list(yml_file_contents if yml_file_contents else file_contents)
+            secrets_white_list = secrets_white_list.union(temp_white_list)
+        for line in file_contents.split('\n'):
+            skip_secrets = secrets.is_secrets_disabled(line, skip_secrets)
+            if skip_secrets['skip_once'] or skip_secrets['skip_multi']:
+                skip_secrets['skip_once'] = False
+                continue
+            regex_secrets, false_positives = secrets.regex_for_secrets(line)
+            for regex_secret in regex_secrets:
+                if not any(ioc.lower() in regex_secret.lower() for ioc in ioc_white_list):
+                    secrets_found_with_regex.append(regex_secret)
+            secrets_white_list = secrets_white_list.union(false_positives)
+            if file_extension in secrets.SKIP_FILE_TYPE_ENTROPY_CHECKS or \
+                    any(demisto_type in file_name for demisto_type in secrets.SKIP_DEMISTO_TYPE_ENTROPY_CHECKS):
+                continue
+            line = secrets.remove_false_positives(line)
+            for string_ in line.split():
+                if not any(white_list_string.lower() in string_.lower() for white_list_string in secrets_white_list):
+                    entropy = legacy_calculate_shannon_entropy(string_)
+                    if entropy >= secrets.ENTROPY_THRESHOLD:
+                        high_entropy_strings.append(string_)
+
+        if high_entropy_strings or secrets_found_with_regex:
+            file_secrets = list(set(high_entropy_strings + secrets_found_with_regex))
+            secrets_found[file_name] = file_secrets
+
+    return secrets_found
+
+
+def get_largest_text_files(count):
+    text_files = []
+    for text_dir in TEXT_DIRS:
+        for root, _, files in os.walk(text_dir):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                _, file_extension = os.path.splitext(file_path)
+                if file_extension in secrets.TEXT_FILE_TYPES and file_extension != '.pdf':
+                    text_files.append(file_path)
+    return sorted(text_files, key=os.path.getsize, reverse=True)[:count]
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def main():
+    os.chdir(CONTENT_DIR)
+    files_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    file_paths = get_largest_text_files(files_count)
+    # load the white lists once, so both runs time only the detection itself
+    secrets.get_white_listed_items(False, '')
+    total_size = sum(os.path.getsize(file_path) for file_path in file_paths)
+    print('Searching secrets in {} files, {} KB'.format(len(file_paths), total_size // 1024))
+
+    legacy_found, legacy_time = timed(legacy_search_potential_secrets, file_paths)
+    found, current_time = timed(secrets.search_potential_secrets, file_paths)
+    legacy_found = {file_name: set(file_secrets) for file_name, file_secrets in legacy_found.items()}
+    found = {file_name: set(file_secrets) for file_name, file_secrets in found.items()}
+    assert found == legacy_found, 'different secrets found'
+    print('search_potential_secrets: legacy {:.2f}s, current {:.2f}s, same findings in {} files'.format(
+        legacy_time, current_time, len(found)))
+
+    # packs white lists are regexes, use the generic white list as one to time removing them from the files
+    white_list, _, _ = secrets.get_white_listed_items(False, '')
+    regexes = {re.escape(white_item) for white_item in white_list}
+    contents = [secrets.get_file_contents(file_path, os.path.splitext(file_path)[1]) for file_path in file_paths]
+    legacy_removed, legacy_time = timed(lambda: [legacy_remove_white_list_regex(c, regexes) for c in contents])
+    removed, current_time = timed(lambda: [secrets.remove_white_list_regex(c, regexes) for c in contents])
+    print('remove_white_list_regex with {} regexes: legacy {:.2f}s, current {:.2f}s, same output: {}'.format(
+        len(regexes), legacy_time, current_time, removed == legacy_removed))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,7 @@ import sys
 
 from Tests.scripts.constants import *
 from Tests.test_utils import print_error, print_warning, run_command, get_yaml, get_json, checked_type, \
-    get_release_notes_file_path, get_latest_release_notes_text
+    get_release_notes_file_path, get_latest_release_notes_text, load_file
 
 try:
     from pykwalify.core import Core
@@ -279,9 +279,7 @@ class StructureValidator(object):
             print_error("An unknown error has occurred. Please retry.")
 
         load_function = file_type_suffix_to_loading_func[file_extension]
-        with open(self.file_path, 'r') as file_obj:
-            loaded_file_data = load_function(file_obj)
-            return loaded_file_data
+        return load_file(load_function, self.file_path)
 
     @staticmethod
     def get_file_id_from_loaded_file_data(loaded_file_data):
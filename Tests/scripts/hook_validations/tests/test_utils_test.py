@@ -14,8 +14,23 @@ class TestGetFile:
     def test_get_yaml(self, file_path, func):
         assert func(file_path)
 
+    @pytest.mark.parametrize('file_path, func', FILE_PATHS)
+    def test_get_file_in_files_cache(self, file_path, func):
+        with test_utils.files_cache():
+            assert func(file_path) is func(file_path)
+
+        assert func(file_path) is not func(file_path)
+
 
 class TestGetRemoteFile:
+    def test_prefetch_remote_files(self, mocker):
+        fetch = mocker.patch.object(test_utils, '_fetch_remote_file', return_value=({'name': 'Gmail'}, None))
+        with test_utils.files_cache():
+            test_utils.prefetch_remote_files([('Integrations/Gmail/Gmail.yml', 'master')] * 2)
+            assert test_utils.get_remote_file('Integrations/Gmail/Gmail.yml') == {'name': 'Gmail'}
+
+        assert fetch.call_count == 1
+
     def test_get_remote_file_sanity(self):
         gmail_yml = test_utils.get_remote_file('Integrations/Gmail/Gmail.yml')
         assert gmail_yml
@@ -1,5 +1,10 @@
+import gzip
+import pytest
+import requests
+from io import BytesIO
 from mock import patch
-from Tests.mock_server import AMIConnection, clean_filename, get_mock_file_path, get_log_file_path, get_folder_path
+from Tests.mock_server import AMIConnection, clean_filename, get_mock_file_path, get_log_file_path, get_folder_path, \
+    parse_tnetstring, dump_tnetstring, MockReplayEngine
 from Tests.test_content import organize_tests
 
 
@@ -47,3 +52,67 @@ def test_integration_list_split_by_unmockable():
 
     assert mockable == [test3]
     assert unmockable == [test1, test2]
+
+
+def test_tnetstring():
+    value = {'request': {b'method': b'GET', 'port': 443, 'host': u'example.com', 'is_replay': False,
+                         'timestamp_start': 1.5, 'headers': [[b'Accept', b'*/*']], 'content': None}}
+    serialized = dump_tnetstring(value)
+    assert parse_tnetstring(serialized) == ({'request': {'method': b'GET', 'port': 443, 'host': u'example.com',
+                                                         'is_replay': False, 'timestamp_start': 1.5,
+                                                         'headers': [[b'Accept', b'*/*']], 'content': None}},
+                                            len(serialized))
+
+
+def create_flow(method, host, path, content, response_content, headers=()):
+    return dump_tnetstring({
+        'type': 'http',
+        'version': [4, 0, 4],
+        'request': {'method': method, 'scheme': b'https', 'host': host, 'port': 443, 'path': path,
+                    'http_version': b'HTTP/1.1', 'headers': [[b'Host', host.encode()]], 'content': content},
+        'response': {'status_code': 200, 'reason': b'OK', 'http_version': b'HTTP/1.1',
+                     'headers': [[b'Content-Type', b'application/json']] + list(headers),
+                     'content': response_content},
+    })
+
+
+@pytest.fixture
+def mock_file(tmpdir):
+    compressed = BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_file:
+        gzip_file.write(b'{"page": 2}')
+    mock_file = tmpdir.join('test.mock')
+    mock_file.write_binary(b''.join([
+        create_flow(b'GET', u'example.com', b'/api/items?page=1&size=10', b'', b'{"page": 1}'),
+        create_flow(b'GET', u'example.com', b'/api/items?page=2&size=10', b'', compressed.getvalue(),
+                    headers=[[b'Content-Encoding', b'gzip']]),
+        create_flow(b'POST', u'example.com', b'/api/login', b'{"user": "admin"}', b'{"token": "first"}'),
+        create_flow(b'POST', u'example.com', b'/api/login', b'{"user": "admin"}', b'{"token": "second"}'),
+        dump_tnetstring({'type': 'http', 'request': {'method': b'GET'}, 'response': None}),
+    ]))
+    return str(mock_file)
+
+
+def test_mock_replay_engine(mock_file):
+    engine = MockReplayEngine.from_file(mock_file)
+    session = engine.mount(requests.Session())
+
+    assert session.get('https://example.com/api/items', params={'page': 1, 'size': 10}).json() == {'page': 1}
+    # the recorded gzip content is decoded like a real response
+    assert session.get('https://example.com:443/api/items?page=2&size=10').json() == {'page': 2}
+    # repeated requests get the recorded responses in turn
+    assert session.post('https://example.com/api/login', data='{"user": "admin"}').json() == {'token': 'first'}
+    assert session.post('https://example.com/api/login', data='{"user": "admin"}').json() == {'token': 'second'}
+    assert not engine.unmatched_requests
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post('https://example.com/api/login', data='{"user": "admin"}')
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get('https://example.com/api/items?size=10&page=1')
+    assert engine.unmatched_requests == [('POST', 'https://example.com/api/login'),
+                                         ('GET', 'https://example.com/api/items?size=10&page=1')]
+
+    # a new engine replays the file from the start
+    with MockReplayEngine.from_file(mock_file).patch_requests() as engine:
+        assert requests.post('https://example.com/api/login', data='{"user": "admin"}').json() == {'token': 'first'}
+    assert not engine.unmatched_requests
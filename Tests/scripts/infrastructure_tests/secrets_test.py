@@ -2,7 +2,7 @@ import os
 from Tests.scripts.hook_validations.secrets import get_secrets, get_diff_text_files, is_text_file, \
     search_potential_secrets, remove_white_list_regex, create_temp_white_list, get_file_contents, \
     retrieve_related_yml, regex_for_secrets, calculate_shannon_entropy, get_packs_white_list, get_generic_white_list, \
-    remove_false_positives, is_secrets_disabled, ignore_base64
+    remove_false_positives, is_secrets_disabled, ignore_base64, get_white_list_matcher
 
 
 class TestSecrets:
@@ -97,3 +97,20 @@ class TestSecrets:
         file_contents = self.TEST_BASE_64_STRING
         file_contents = ignore_base64(file_contents)
         assert file_contents.lstrip() == 'sade'
+
+    def test_get_white_list_matcher(self):
+        is_white_listed = get_white_list_matcher({'Boop', 'sade.txt', 'sad', 'sade@sade.sade'})
+        assert is_white_listed('xxboopxx')
+        assert is_white_listed('sadness')
+        assert is_white_listed('sade.txt')
+        assert not is_white_listed('sa')
+        assert not is_white_listed('sa_txt')
+        assert get_white_list_matcher({'sad', 'Boop', 'sade@sade.sade', 'sade.txt'}) == is_white_listed
+        assert not get_white_list_matcher(set())('boop')
+        assert get_white_list_matcher({''})('boop')
+
+    def test_get_white_list_matcher_same_as_substring_search(self):
+        white_list = {'ab', 'abc', 'a.b', 'b*', 'xyz', 'y', 'SADE'}
+        is_white_listed = get_white_list_matcher(white_list, use_cache=False)
+        for string_ in ['a', 'ab', 'a.b', 'axb', 'b*', 'bb', 'wxy', 'xz', 'sade', 'bab', 'c']:
+            assert bool(is_white_listed(string_)) == any(white_item.lower() in string_ for white_item in white_list)
@@ -0,0 +1,93 @@
+import time
+import threading
+
+from Tests.test_content import shard_tests, run_tests_concurrently, ShardedTestsResults, \
+    BufferedTestsOutput
+
+
+def test_shard_tests():
+    tests = [{'playbookID': 'long', 'timeout': 100}, {'playbookID': 'a'}, {'playbookID': 'b'},
+             {'playbookID': 'c', 'timeout': 50}, {'playbookID': 'd'}]
+
+    shards = shard_tests(tests, 2, default_test_timeout=30)
+
+    assert [[test['playbookID'] for _, test in shard] for shard in shards] == [['long', 'd'], ['a', 'b', 'c']]
+    assert [[index for index, _ in shard] for shard in shards] == [[0, 4], [1, 2, 3]]
+
+
+def test_run_tests_concurrently_never_runs_shared_integrations_together():
+    tests = list(enumerate([
+        {'playbookID': 'pb1', 'integrations': ['A', 'B']},
+        {'playbookID': 'pb2', 'integrations': 'A'},
+        {'playbookID': 'pb3', 'integrations': ['C']},
+        {'playbookID': 'pb4'},
+        {'playbookID': 'pb5', 'integrations': ['B', 'C']},
+        {'playbookID': 'pb6', 'integrations': ['D']},
+    ]))
+    lock = threading.Lock()
+    running_integrations = []
+    ran_tests = []
+    overlaps = []
+
+    def run_test(index, test):
+        integrations = test.get('integrations', [])
+        integrations = integrations if isinstance(integrations, list) else [integrations]
+        with lock:
+            overlaps.extend(integration for integration in integrations if integration in running_integrations)
+            running_integrations.extend(integrations)
+        time.sleep(0.05)
+        with lock:
+            for integration in integrations:
+                running_integrations.remove(integration)
+            ran_tests.append(index)
+
+    run_tests_concurrently(tests, 4, run_test)
+
+    assert not overlaps
+    assert sorted(ran_tests) == [0, 1, 2, 3, 4, 5]
+
+
+def test_sharded_tests_results_merge_in_tests_order():
+    results = ShardedTestsResults()
+
+    def succeed(playbook_id):
+        return lambda succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration: \
+            succeed_playbooks.append(playbook_id)
+
+    def fail(playbook_id):
+        return lambda succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration: \
+            failed_playbooks.append(playbook_id)
+
+    results.run_test((ShardedTestsResults.MOCKLESS_TESTS, 0), succeed('mockless0'))
+    results.run_test((ShardedTestsResults.MOCKLESS_TESTS, 3), fail('mockless3'))
+    results.run_test((ShardedTestsResults.MOCK_TESTS, 2), succeed('mock2'))
+    results.run_test((ShardedTestsResults.MOCKLESS_TESTS, 1), succeed('mockless1'))
+    results.run_test((ShardedTestsResults.MOCK_TESTS, 4), fail('mock4'))
+
+    succeed_playbooks, failed_playbooks, _, _ = results.merge()
+
+    assert succeed_playbooks == ['mock2', 'mockless0', 'mockless1']
+    assert failed_playbooks == ['mock4', 'mockless3']
+
+
+def test_buffered_tests_output_prints_each_test_at_once():
+    class Stream(object):
+        def __init__(self):
+            self.writes = []
+
+        def write(self, data):
+            self.writes.append(data)
+
+        def flush(self):
+            pass
+
+    stream = Stream()
+    tests_output = BufferedTestsOutput(stream)
+    tests_output.write('not in a test\n')
+    tests_output.start_test()
+    tests_output.write('test ')
+    tests_output.write('output\n')
+    assert stream.writes == ['not in a test\n']
+    tests_output.end_test()
+
+    assert stream.writes == ['not in a test\n', 'test output\n']
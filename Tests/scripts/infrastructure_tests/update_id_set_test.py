@@ -1,6 +1,8 @@
 import unittest
+import os
 import pytest
-from Tests.scripts.update_id_set import has_duplicate, get_integration_data, get_script_data, get_playbook_data
+from Tests.scripts.update_id_set import has_duplicate, get_integration_data, get_script_data, get_playbook_data, \
+    get_path_hash, map_with_cache, split_diff, get_parser_hash
 
 MOCKED_DATA = [
     (
@@ -161,5 +163,73 @@ class TestIntegration(unittest.TestCase):
         self.assertDictEqual(data['command_to_integration'], PLAYBOOK_DATA['command_to_integration'])
 
 
+class FakePool(object):
+    def __init__(self):
+        self.processed = []
+
+    def map(self, func, paths):
+        self.processed.extend(paths)
+        return [func(path) for path in paths]
+
+
+def test_map_with_cache_parses_only_changed_files(tmpdir):
+    first = tmpdir.join('first.yml')
+    second = tmpdir.join('second.yml')
+    first.write('name: first')
+    second.write('name: second')
+    paths = [str(first), str(second)]
+    pool = FakePool()
+    cache = {}
+    assert map_with_cache(lambda: pool, len, paths, {}, cache) == [len(path) for path in paths]
+    assert pool.processed == paths
+
+    second.write('name: changed')
+    pool.processed = []
+    new_cache = {}
+    map_with_cache(lambda: pool, len, paths, cache, new_cache)
+    assert pool.processed == [str(second)]
+    assert new_cache['len:' + str(first)] is cache['len:' + str(first)]
+    assert new_cache['len:' + str(second)]['hash'] == get_path_hash(str(second))
+
+
+def test_get_path_hash_of_package(tmpdir):
+    package = tmpdir.mkdir('Script')
+    package.join('Script.yml').write('name: Script')
+    package.join('Script.py').write('demisto.results(1)')
+    package_hash = get_path_hash(str(package))
+
+    package.join('Script.py').write('demisto.results(2)')
+    assert get_path_hash(str(package)) != package_hash
+
+
+def test_split_diff():
+    diff = """diff --git a/Playbooks/playbook-A.yml b/Playbooks/playbook-A.yml
+index 1..2 100644
+--- a/Playbooks/playbook-A.yml
++++ b/Playbooks/playbook-A.yml
+@@ -1 +1,2 @@
++fromversion: 5.0.0
+diff --git a/Scripts/script-B.yml b/Scripts/script-B.yml
+new file mode 100644
+--- /dev/null
++++ b/Scripts/script-B.yml
+@@ -0,0 +1 @@
++name: B
+"""
+    files_string, file_diffs = split_diff(diff)
+    assert files_string == 'M\tPlaybooks/playbook-A.yml\nA\tScripts/script-B.yml'
+    assert '+fromversion: 5.0.0' in file_diffs['Playbooks/playbook-A.yml']
+    assert 'fromversion' not in file_diffs['Scripts/script-B.yml']
+
+
 if __name__ == '__main__':
     unittest.main()
+
+
+def test_parser_hash_covers_parser_helpers(mocker):
+    parser_hash = get_parser_hash()
+    path_hash = get_path_hash
+    mocker.patch('Tests.scripts.update_id_set.get_path_hash', side_effect=lambda path: (
+        'changed' if path.endswith(os.path.join('Tests', 'test_utils.py')) else path_hash(path)))
+
+    assert get_parser_hash() != parser_hash
@@ -1,3 +1,8 @@
+from __future__ import print_function
+import sys
+
+import pytest
+
 from Tests.scripts.validate_files import FilesValidator
 # from Tests.scripts.hook_validations.conf_json import ConfJsonValidator
 
@@ -74,3 +79,33 @@ D       Integrations/integration-Recorded_Future.yml'''
     assert len(modified) == 0
     assert len(added) == 0
     assert len(deleted) == 0
+
+
+def test_run_validations_keeps_files_order(mocker, capsys):
+    mocker.patch('Tests.scripts.hook_validations.conf_json.ConfJsonValidator.load_conf_file', return_value={})
+    file_validator = FilesValidator(workers=2)
+    mocker.patch.object(FilesValidator, 'validate_file_scheme', autospec=True,
+                        side_effect=lambda validator, file_path, display_name: print('Validating ' + display_name))
+
+    file_validator.run_validations('validate_file_scheme', [(str(i), str(i)) for i in range(10)])
+
+    assert capsys.readouterr().out == ''.join('Validating {}\n'.format(i) for i in range(10))
+    assert file_validator._is_valid
+
+
+def test_run_validations_raises_worker_exit(mocker, capsys):
+    mocker.patch('Tests.scripts.hook_validations.conf_json.ConfJsonValidator.load_conf_file', return_value={})
+    file_validator = FilesValidator(workers=2)
+
+    def validate_file_scheme(validator, file_path, display_name):
+        if file_path == '3':
+            # run_command exits when git writes to stderr
+            sys.exit(1)
+        print('Validating ' + display_name)
+
+    mocker.patch.object(FilesValidator, 'validate_file_scheme', autospec=True, side_effect=validate_file_scheme)
+
+    with pytest.raises(SystemExit):
+        file_validator.run_validations('validate_file_scheme', [(str(i), str(i)) for i in range(10)])
+
+    assert capsys.readouterr().out.startswith('Validating 0\nValidating 1\nValidating 2\n')
@@ -8,7 +8,10 @@ import hashlib
 import sys
 import shutil
 import time
+import fcntl
+import tempfile
 from datetime import datetime
+from contextlib import contextmanager
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONTENT_DIR = os.path.abspath(SCRIPT_DIR + '/../..')
@@ -24,6 +27,7 @@ CONTAINER_SETUP_SCRIPT = '{}/{}'.format(SCRIPT_DIR, CONTAINER_SETUP_SCRIPT_NAME)
 RUN_MYPY_SCRIPT = '{}/run_mypy.sh'.format(SCRIPT_DIR)
 LOG_VERBOSE = False
 DOCKER_LOGIN_COMPLETED = False
+IMAGE_LOCKS_DIR = os.path.join(tempfile.gettempdir(), 'devtest-image-locks')
 
 
 def get_docker_images(script_obj):
@@ -129,10 +133,56 @@ def docker_login():
     return True
 
 
+def get_dev_image_name(docker_base_image, requirements):
+    """
+    Get the name of the dev image of a base image. The tag is a hash of the requirements and the setup script,
+    so the same base image and requirements always result in the same image
+
+    Arguments:
+        docker_base_image {string} -- docker image (with a tag) to use as base for installing dev deps
+        requirements {string} -- requirements doc
+
+    Returns:
+        string -- image name
+    """
+    with open(CONTAINER_SETUP_SCRIPT, "rb") as f:
+        setup_script_data = f.read()
+    md5 = hashlib.md5(requirements.encode('utf-8') + setup_script_data).hexdigest()
+    return 'devtest' + docker_base_image + '-' + md5
+
+
+def docker_image_exists(image):
+    res = subprocess.run(['docker', 'image', 'inspect', image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return res.returncode == 0
+
+
+@contextmanager
+def image_create_lock(target_image):
+    """
+    Lock for creating an image, shared by all the processes of the machine.
+    The lock is released by the OS if the process holding it dies, so there are no stale locks to clean
+    """
+    os.makedirs(IMAGE_LOCKS_DIR, exist_ok=True)
+    lock_path = os.path.join(IMAGE_LOCKS_DIR, target_image.replace('/', '-').replace(':', '-'))
+    with open(lock_path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("{}: Waiting for image: {} to be created by another process".format(datetime.now(), target_image))
+            start = time.time()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            print_v("Waited {:.0f} seconds for lock: {}".format(time.time() - start, lock_path))
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def docker_image_create(docker_base_image, requirements):
     """
     Create the docker image with dev dependencies. Will check if already existing.
-    Uses a hash of the requirements to determine the image tag
+    Uses a hash of the requirements to determine the image tag. Concurrent calls for the same image wait for
+    a single process to create it
 
     Arguments:
         docker_base_image {string} -- docker image to use as base for installing dev deps
@@ -141,40 +191,24 @@ def docker_image_create(docker_base_image, requirements):
     Returns:
         string -- image name to use
     """
-
     if ':' not in docker_base_image:
         docker_base_image += ':latest'
-    with open(CONTAINER_SETUP_SCRIPT, "rb") as f:
-        setup_script_data = f.read()
-    md5 = hashlib.md5(requirements.encode('utf-8') + setup_script_data).hexdigest()
-    target_image = 'devtest' + docker_base_image + '-' + md5
-    lock_file = ".lock-" + target_image.replace("/", "-")
-    try:
-        if (time.time() - os.path.getctime(lock_file)) > (60 * 5):
-            print("{}: Deleting old lock file: {}".format(datetime.now(), lock_file))
-            os.remove(lock_file)
-    except Exception as ex:
-        print_v("Failed check and delete for lock file: {}. Error: {}".format(lock_file, ex))
-    wait_print = True
-    for x in range(60):
-        images_ls = subprocess.check_output(['docker', 'image', 'ls', '--format',
-                                            '{{.Repository}}:{{.Tag}}', target_image], universal_newlines=True).strip()
-        if images_ls == target_image:
-            print('{}: Using already existing docker image: {}'.format(datetime.now(), target_image))
+    target_image = get_dev_image_name(docker_base_image, requirements)
+    if docker_image_exists(target_image):
+        print('{}: Using already existing docker image: {}'.format(datetime.now(), target_image))
+        return target_image
+
+    with image_create_lock(target_image):
+        # the image may have been created while waiting for the lock
+        if docker_image_exists(target_image):
+            print('{}: Using docker image: {} created by another process'.format(datetime.now(), target_image))
             return target_image
-        if wait_print:
-            print("{}: Existing image: {} not found will obtain lock file or wait for image".format(datetime.now(),
-                                                                                                    target_image))
-            wait_print = False
-        print_v("Trying to obtain lock file: " + lock_file)
-        try:
-            f = open(lock_file, "x")
-            f.close()
-            print("{}: Obtained lock file: {}".format(datetime.now(), lock_file))
-            break
-        except Exception as ex:
-            print_v("Failed getting lock. Will wait {}".format(str(ex)))
-            time.sleep(5)
+        create_dev_image(docker_base_image, target_image, requirements)
+    return target_image
+
+
+def create_dev_image(docker_base_image, target_image, requirements):
+    container_id = None
     try:
         # try doing a pull
         try:
@@ -182,7 +216,7 @@ def docker_image_create(docker_base_image, requirements):
             pull_res = subprocess.check_output(['docker', 'pull', target_image],
                                                stderr=subprocess.STDOUT, universal_newlines=True)
             print("Pull succeeded with output: {}".format(pull_res))
-            return target_image
+            return
         except subprocess.CalledProcessError as cpe:
             print_v("Failed docker pull (will create image) with status: {}. Output: {}".format(cpe.returncode,
                                                                                                 cpe.output))
@@ -197,8 +231,6 @@ def docker_image_create(docker_base_image, requirements):
                                         universal_newlines=True))
         print_v(subprocess.check_output(['docker', 'commit', container_id, target_image], stderr=subprocess.STDOUT,
                                         universal_newlines=True))
-        print_v(subprocess.check_output(['docker', 'rm', container_id], stderr=subprocess.STDOUT,
-                                        universal_newlines=True))
         if docker_login():
             print("{}: Pushing image: {} to docker hub".format(datetime.now(), target_image))
             print_v(subprocess.check_output(['docker', 'push', target_image], stderr=subprocess.STDOUT,
@@ -207,12 +239,9 @@ def docker_image_create(docker_base_image, requirements):
         print("Failed executing command with  error: {} Output: \n{}".format(err, err.output))
         raise err
     finally:
-        try:
-            os.remove(lock_file)
-        except Exception as ex:
-            print("{}: Error removing file: {}".format(datetime.now(), ex))
+        if container_id:
+            subprocess.run(['docker', 'rm', container_id], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     print('{}: Done creating docker image: {}'.format(datetime.now(), target_image))
-    return target_image
 
 
 def docker_run(project_dir, docker_image, no_test, no_lint, keep_container, use_root=False, cpu_num=0):
@@ -1,16 +1,37 @@
 #!/usr/bin/env python3
 import os
 import sys
+import json
+import hashlib
 import subprocess
 import concurrent.futures
-from typing import List, Optional, Tuple
-from pkg_dev_test_tasks import get_dev_requirements
+from typing import Dict, List, Optional, Set, Tuple
+from pkg_dev_test_tasks import get_dev_requirements, get_pipenv_dir, RUN_SH_FILE, CONTAINER_SETUP_SCRIPT, \
+    RUN_MYPY_SCRIPT
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONTENT_DIR = os.path.abspath(SCRIPT_DIR + '/../..')
 sys.path.append(CONTENT_DIR)
 from Tests.test_utils import print_color, LOG_COLORS  # noqa: E402
 
+PKG_ROOT_DIRS = ["Integrations", "Scripts", "Beta_Integrations"]
+RESULTS_CACHE_DIR = CONTENT_DIR + '/Tests/pkg_dev_tasks_cache'
+# files every package run depends on, besides the package itself
+SHARED_INPUT_FILES = [
+    CONTENT_DIR + '/Scripts/CommonServerPython/CommonServerPython.py',
+    CONTENT_DIR + '/Tests/demistomock/demistomock.py',
+    CONTENT_DIR + '/Tests/scripts/dev_envs/pytest/conftest.py',
+    get_pipenv_dir(2.7) + '/Pipfile.lock',
+    get_pipenv_dir(3.7) + '/Pipfile.lock',
+    SCRIPT_DIR + '/pkg_dev_test_tasks.py',
+    RUN_SH_FILE,
+    CONTAINER_SETUP_SCRIPT,
+    RUN_MYPY_SCRIPT,
+]
+# files and dirs which setup_dev_files or the dev tasks create in the package
+GENERATED_FILES = {'demistomock.py', 'CommonServerUserPython.py', 'CommonServerPython.py', 'conftest.py'}
+GENERATED_DIRS = {'__pycache__', '.pytest_cache', '.mypy_cache'}
+
 
 def run_dev_task(pkg_dir: str, params: Optional[List[str]]) -> Tuple[subprocess.CompletedProcess, str]:
     args = [SCRIPT_DIR + '/pkg_dev_test_tasks.py', '-d', pkg_dir]
@@ -23,17 +44,77 @@ def run_dev_task(pkg_dir: str, params: Optional[List[str]]) -> Tuple[subprocess.
     return (res, pkg_dir)
 
 
-def should_run_pkg(pkg_dir: str) -> bool:
+def get_changed_pkg_dirs(pkg_dirs: List[str]) -> List[str]:
+    """Get the package dirs which have changed files, by a single git diff of all the packages root dirs"""
     diff_compare = os.getenv("DIFF_COMPARE")
     if not diff_compare:
-        return True
+        return pkg_dirs
     if os.getenv('CONTENT_PRECOMMIT_RUN_DEV_TASKS'):
         # if running in precommit we check against staged
         diff_compare = '--staged'
-    res = subprocess.run(["git", "diff", "--name-only", diff_compare, "--", pkg_dir], text=True, capture_output=True)
-    if res.stdout:
-        return True
-    return False
+    # without renames, a file moved between packages marks both of them as changed
+    res = subprocess.run(["git", "diff", "--name-only", "--no-renames", diff_compare, "--"] + PKG_ROOT_DIRS,
+                         text=True, capture_output=True)
+    changed_dirs: Set[str] = set()
+    for changed_file in res.stdout.splitlines():
+        changed_dirs.add('/'.join(changed_file.split('/')[:2]))
+    return [pkg_dir for pkg_dir in pkg_dirs if pkg_dir in changed_dirs]
+
+
+def hash_files(paths: List[str], sha1=None):
+    sha1 = sha1 or hashlib.sha1()
+    for path in paths:
+        # relative paths, so the hashes don't depend on where the repo is checked out
+        sha1.update(os.path.relpath(path, CONTENT_DIR).encode('utf-8') + b'\0')
+        if os.path.isfile(path):
+            with open(path, 'rb') as input_file:
+                sha1.update(input_file.read())
+        sha1.update(b'\0')
+    return sha1
+
+
+def get_shared_inputs_hash(params: Optional[List[str]]) -> str:
+    """Hash of the python version, dev requirements, shared files and parameters every package run depends on"""
+    sha1 = hashlib.sha1('{}\0{}\0'.format(sys.version_info[:2], params).encode('utf-8'))
+    return hash_files(SHARED_INPUT_FILES, sha1).hexdigest()
+
+
+def get_pkg_results_key(pkg_dir: str, shared_inputs_hash: str) -> str:
+    """Hash of the package files and the shared inputs, the cached result of the package is valid while it's the same"""
+    paths = []
+    for root, dirs, files in os.walk(pkg_dir):
+        dirs[:] = sorted(dir_name for dir_name in dirs if dir_name not in GENERATED_DIRS)
+        for file_name in sorted(files):
+            is_generated = file_name in GENERATED_FILES and not (
+                file_name == 'CommonServerPython.py' and pkg_dir.endswith('Scripts/CommonServerPython'))
+            if not is_generated and not file_name.endswith('.pyc'):
+                paths.append(os.path.join(root, file_name))
+    sha1 = hashlib.sha1(shared_inputs_hash.encode('utf-8'))
+    return hash_files(paths, sha1).hexdigest()
+
+
+def get_results_cache_path(pkg_dir: str) -> str:
+    return os.path.join(RESULTS_CACHE_DIR, pkg_dir.strip('/').replace('/', '_') + '.json')
+
+
+def load_cached_result(pkg_dir: str, results_key: str) -> Optional[Tuple[subprocess.CompletedProcess, str]]:
+    try:
+        with open(get_results_cache_path(pkg_dir), 'r') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    if cached.get('key') != results_key:
+        return None
+    stdout = '{}\n[cached result, set NO_RESULTS_CACHE=1 to run again]'.format(cached['stdout'])
+    return subprocess.CompletedProcess(cached['args'], cached['returncode'], stdout, cached['stderr']), pkg_dir
+
+
+def save_result(res: Tuple[subprocess.CompletedProcess, str], results_key: str):
+    os.makedirs(RESULTS_CACHE_DIR, exist_ok=True)
+    completed, pkg_dir = res
+    with open(get_results_cache_path(pkg_dir), 'w') as cache_file:
+        json.dump({'key': results_key, 'args': completed.args, 'returncode': completed.returncode,
+                   'stdout': completed.stdout, 'stderr': completed.stderr}, cache_file)
 
 
 def handle_run_res(res: Tuple[subprocess.CompletedProcess, str], fail_pkgs: list, good_pkgs: list):
@@ -52,21 +133,32 @@ def main():
         print("Run pkg_dev_test_tasks.py in parallel. Accepts same parameters as pkg_dev_test_tasks.py.\n"
               "Additionally you can specify the following environment variables:\n"
               "DIFF_COMPARE: specify how to do a git compare. Leave empty to run on all.\n"
-              "MAX_WORKERS: max amount of workers to use for running "
+              "MAX_WORKERS: max amount of workers to use for running\n"
+              "NO_RESULTS_CACHE: run also packages which their inputs did not change since their last run.\n"
+              "  Packages are always run, without the cache, when the CI env var is set."
               )
         sys.exit(1)
     max_workers = int(os.getenv("MAX_WORKERS", "10"))
-    find_out = subprocess.check_output(["find", "Integrations", "Scripts", "Beta_Integrations",
-                                        "-maxdepth", "1", "-mindepth", "1", "-type", "d", "-print"], text=True)
+    use_results_cache = not os.getenv("NO_RESULTS_CACHE") and not os.getenv("CI")
+    find_args = ["-maxdepth", "1", "-mindepth", "1", "-type", "d", "-print"]
+    find_out = subprocess.check_output(["find"] + PKG_ROOT_DIRS + find_args, text=True)
     pkg_dirs = find_out.splitlines()
-    pkgs_to_run = []
-    for dir in pkg_dirs:
-        if should_run_pkg(dir):
-            pkgs_to_run.append(dir)
-    print("Starting parallel run for [{}] packages with [{}] max workers".format(len(pkgs_to_run), max_workers))
+    pkgs_to_run = get_changed_pkg_dirs(pkg_dirs)
     params = sys.argv[1::]
-    fail_pkgs = []
-    good_pkgs = []
+    fail_pkgs: List[str] = []
+    good_pkgs: List[str] = []
+    results_keys: Dict[str, str] = {}
+    if use_results_cache:
+        shared_inputs_hash = get_shared_inputs_hash(params)
+        for pkg_dir in list(pkgs_to_run):
+            results_keys[pkg_dir] = get_pkg_results_key(pkg_dir, shared_inputs_hash)
+            cached_res = load_cached_result(pkg_dir, results_keys[pkg_dir])
+            if cached_res:
+                pkgs_to_run.remove(pkg_dir)
+                handle_run_res(cached_res, fail_pkgs, good_pkgs)
+        if results_keys:
+            print("Using cached results for [{}] packages".format(len(results_keys) - len(pkgs_to_run)))
+    print("Starting parallel run for [{}] packages with [{}] max workers".format(len(pkgs_to_run), max_workers))
     if(len(pkgs_to_run) > 1):  # setup pipenv before hand to avoid conflics
         get_dev_requirements(2.7)
         get_dev_requirements(3.7)
@@ -76,11 +168,15 @@ def main():
         pkgs_to_run.remove('Scripts/CommonServerPython')
         res = run_dev_task('Scripts/CommonServerPython', params)
         handle_run_res(res, fail_pkgs, good_pkgs)
+        if use_results_cache:
+            save_result(res, results_keys[res[1]])
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures_submit = [executor.submit(run_dev_task, dir, params) for dir in pkgs_to_run]
         for future in concurrent.futures.as_completed(futures_submit):
             res = future.result()
             handle_run_res(res, fail_pkgs, good_pkgs)
+            if use_results_cache:
+                save_result(res, results_keys[res[1]])
     if fail_pkgs:
         print_color("\n******* FAIL PKGS: *******", LOG_COLORS.RED)
         print_color("\n\t{}\n".format("\n\t".join(fail_pkgs)), LOG_COLORS.RED)
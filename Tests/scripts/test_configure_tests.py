@@ -2,7 +2,7 @@ import os
 import re
 import unittest
 
-from Tests.scripts.configure_tests import get_modified_files, get_test_list
+from Tests.scripts.configure_tests import get_modified_files, get_test_list, build_id_set_graph, enrich_affected_ids
 
 FILTER_CONF = "Tests/filter_file.txt"
 
@@ -174,5 +174,45 @@ A       Integrations/Active_Directory_Query/key.pem
         self.assertIn('Integrations/Active_Directory_Query/Active_Directory_Query.yml', files_list)
 
 
+class TestConfigureTests_AffectedIdsGraph(unittest.TestCase):
+    ID_SET = {
+        'scripts': [
+            {'Caller': {'name': 'Caller', 'file_path': 'Scripts/script-Caller.yml', 'script_executions': ['Base']}},
+            {'Old': {'name': 'Old', 'file_path': 'Scripts/script-Old.yml', 'script_executions': ['Base'],
+                     'toversion': '4.0.0'}},
+            {'CmdUser': {'name': 'CmdUser', 'file_path': 'Scripts/script-CmdUser.yml', 'depends_on': ['cmd'],
+                         'command_to_integration': {'cmd': 'Other'}}},
+        ],
+        'playbooks': [
+            {'Child': {'name': 'Child', 'implementing_scripts': ['Caller'], 'tests': ['Child Test']}},
+            {'Parent': {'name': 'Parent', 'implementing_playbooks': ['Child']}},
+            {'Cmd': {'name': 'Cmd', 'command_to_integration': {'cmd': ''}, 'tests': ['Cmd Test']}},
+        ],
+        'integrations': [{'Integ': {'name': 'Integ', 'commands': ['cmd']}}],
+    }
+
+    def enrich(self, script_to_version=None, integration_to_version=None):
+        script_to_version = script_to_version or {}
+        updated_scripts, updated_playbooks, tests = set([]), set([]), set([])
+        enrich_affected_ids(build_id_set_graph(self.ID_SET), script_to_version, {}, integration_to_version or {},
+                            set(script_to_version), set([]), updated_scripts, updated_playbooks, set([]), set([]),
+                            tests)
+        return updated_scripts, updated_playbooks, tests
+
+    def test_script_change(self):
+        scripts, playbooks, tests = self.enrich(script_to_version={'Base': ('0.0.0', '99.99.99')})
+
+        self.assertEqual(scripts, {'Caller'})
+        self.assertEqual(playbooks, {'Child', 'Parent'})
+        self.assertEqual(tests, {'Child Test'})
+
+    def test_integration_change(self):
+        scripts, playbooks, tests = self.enrich(integration_to_version={'Integ': ('0.0.0', '99.99.99')})
+
+        self.assertEqual(scripts, set([]))
+        self.assertEqual(playbooks, {'Cmd'})
+        self.assertEqual(tests, {'Cmd Test'})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import itertools
+import hashlib
 import re
 import os
 import glob
@@ -21,6 +22,15 @@ from Tests.test_utils import get_yaml, get_to_version, get_from_version, collect
     LOG_COLORS, print_color, run_command, print_error, print_warning  # noqa: E402
 
 
+ID_SET_PATH = './Tests/id_set.json'
+ID_SET_CACHE_PATH = './Tests/id_set_cache.json'
+# The code extracting the id_set records: update_id_set.py and the helper modules its parsers import
+PARSER_FILES = (
+    os.path.join(SCRIPT_DIR, 'update_id_set.py'),
+    os.path.join(SCRIPT_DIR, 'constants.py'),
+    os.path.join(CONTENT_DIR, 'Tests', 'test_utils.py'),
+)
+
 CHECKED_TYPES_REGEXES = (
     # Integrations
     INTEGRATION_REGEX,
@@ -228,8 +238,9 @@ def get_depends_on(data_dict):
     return depends_on_list, command_to_integration
 
 
-def update_object_in_id_set(obj_id, obj_data, file_path, instances_set):
-    change_string = run_command("git diff HEAD {0}".format(file_path))
+def update_object_in_id_set(obj_id, obj_data, file_path, instances_set, change_string=None):
+    if change_string is None:
+        change_string = run_command("git diff HEAD {0}".format(file_path))
     is_added_from_version = True if re.search(r'\+fromversion: .*', change_string) else False
     is_added_to_version = True if re.search(r'\+toversion: .*', change_string) else False
 
@@ -257,12 +268,12 @@ def update_object_in_id_set(obj_id, obj_data, file_path, instances_set):
 def add_new_object_to_id_set(obj_id, obj_data, instances_set):
     obj_in_set = False
 
-    dict_value = obj_data.values()[0]
+    dict_value = list(obj_data.values())[0]
     file_to_version = dict_value.get('toversion', '99.99.99')
     file_from_version = dict_value.get('fromversion', '0.0.0')
 
     for instance in instances_set:
-        instance_id = instance.keys()[0]
+        instance_id = list(instance.keys())[0]
         integration_to_version = instance[instance_id].get('toversion', '99.99.99')
         integration_from_version = instance[instance_id].get('fromversion', '0.0.0')
         if obj_id == instance_id and file_from_version == integration_from_version and \
@@ -433,30 +444,116 @@ def get_test_playbooks_paths():
     return test_playbook_files
 
 
-def re_create_id_set():
+def get_path_hash(file_path):
+    """Hash the content of a file, or of all the files in a package directory"""
+    if os.path.isdir(file_path):
+        paths = sorted(path for path in glob.glob(os.path.join(file_path, '*')) if os.path.isfile(path))
+    else:
+        paths = [file_path]
+
+    sha1 = hashlib.sha1()
+    for path in paths:
+        sha1.update(os.path.basename(path).encode('utf-8') + b'\0')
+        with open(path, 'rb') as content_file:
+            sha1.update(content_file.read())
+        sha1.update(b'\0')
+
+    return sha1.hexdigest()
+
+
+def get_parser_hash():
+    """Hash of the code extracting the id_set records, the cache is invalid once it changes"""
+    return hashlib.sha1(''.join(get_path_hash(path) for path in PARSER_FILES).encode('utf-8')).hexdigest()
+
+
+def load_id_set_cache(cache_path=ID_SET_CACHE_PATH):
+    """Load the cached id_set records of the previous run.
+
+    Returns:
+        dict -- cache key -> {'hash': content hash, 'result': the processed records}
+    """
+    if not os.path.isfile(cache_path):
+        return {}
+
+    with open(cache_path, 'r') as cache_file:
+        try:
+            cache = json.load(cache_file, object_pairs_hook=OrderedDict)
+        except ValueError:
+            print_warning('Ignoring the corrupted id_set cache {}'.format(cache_path))
+            return {}
+
+    if cache.get('parser_hash') != get_parser_hash():
+        return {}
+
+    return cache.get('entries', {})
+
+
+def save_id_set_cache(entries, cache_path=ID_SET_CACHE_PATH):
+    with open(cache_path, 'w') as cache_file:
+        json.dump({'parser_hash': get_parser_hash(), 'entries': entries}, cache_file)
+
+
+def map_with_cache(get_pool, process_func, file_paths, cache, new_cache):
+    """Process the file paths, re-parsing only the files whose content changed since the cache was saved
+
+    Arguments:
+        get_pool {function} -- returns the process pool to parse the changed files with
+        process_func {function} -- the function processing a single file path
+        file_paths {list} -- the paths to process
+        cache {dict} -- the cache of the previous run
+        new_cache {dict} -- the cache of this run, updated with the records of all the file paths
+
+    Returns:
+        list -- the result of process_func for each of the file paths
+    """
+    keys = ['{}:{}'.format(process_func.__name__, file_path) for file_path in file_paths]
+    missing = []
+    for key, file_path in zip(keys, file_paths):
+        path_hash = get_path_hash(file_path)
+        if cache.get(key, {}).get('hash') == path_hash:
+            new_cache[key] = cache[key]
+        else:
+            missing.append((key, path_hash, file_path))
+
+    if missing:
+        results = get_pool().map(process_func, [file_path for _, _, file_path in missing])
+        for (key, path_hash, _), result in zip(missing, results):
+            new_cache[key] = {'hash': path_hash, 'result': result}
+
+    return [new_cache[key]['result'] for key in keys]
+
+
+def re_create_id_set(use_cache=True, cache_path=ID_SET_CACHE_PATH):
     start_time = time.time()
     scripts_list = []
     playbooks_list = []
     integration_list = []
     testplaybooks_list = []
 
-    pool = Pool(processes=cpu_count() * 2)
+    cache = load_id_set_cache(cache_path) if use_cache else {}
+    new_cache = {}
+    pools = []
+
+    def get_pool():
+        if not pools:
+            pools.append(Pool(processes=cpu_count() * 2))
+        return pools[0]
 
     print_color("Starting the creation of the id_set", LOG_COLORS.GREEN)
     print_color("Starting iterating over Integrations", LOG_COLORS.GREEN)
-    for arr in pool.map(process_integration, get_integrations_paths()):
+    for arr in map_with_cache(get_pool, process_integration, get_integrations_paths(), cache, new_cache):
         integration_list.extend(arr)
 
     print_color("Starting iterating over Playbooks", LOG_COLORS.GREEN)
-    for arr in pool.map(process_playbook, get_playbooks_paths()):
+    for arr in map_with_cache(get_pool, process_playbook, get_playbooks_paths(), cache, new_cache):
         playbooks_list.extend(arr)
 
     print_color("Starting iterating over Scripts", LOG_COLORS.GREEN)
-    for arr in pool.map(process_script, get_scripts_paths()):
+    for arr in map_with_cache(get_pool, process_script, get_scripts_paths(), cache, new_cache):
         scripts_list.extend(arr)
 
     print_color("Starting iterating over TestPlaybooks", LOG_COLORS.GREEN)
-    for pair in pool.map(process_test_playbook_path, get_test_playbooks_paths()):
+    for pair in map_with_cache(get_pool, process_test_playbook_path, get_test_playbooks_paths(), cache, new_cache):
         if pair[0]:
             testplaybooks_list.append(pair[0])
         if pair[1]:
@@ -470,8 +567,17 @@ def re_create_id_set():
     new_ids_dict['integrations'] = sort(integration_list)
     new_ids_dict['TestPlaybooks'] = sort(testplaybooks_list)
 
-    with open('./Tests/id_set.json', 'w') as id_set_file:
+    with open(ID_SET_PATH, 'w') as id_set_file:
         json.dump(new_ids_dict, id_set_file, indent=4)
+
+    for pool in pools:
+        pool.close()
+
+    if use_cache:
+        save_id_set_cache(new_cache, cache_path)
+        reused = len([key for key in new_cache if new_cache[key] is cache.get(key)])
+        print('Reused {} cached records, parsed {} changed files'.format(reused, len(new_cache) - reused))
+
     exec_time = time.time() - start_time
     print_color("Finished the creation of the id_set. Total time: {} seconds".format(exec_time), LOG_COLORS.GREEN)
 
@@ -554,21 +660,60 @@ def sort(data):
     return data
 
 
-def update_id_set():
-    branches = run_command("git branch")
-    branch_name_reg = re.search(r"\* (.*)", branches)
-    branch_name = branch_name_reg.group(1)
+def split_diff(diff_string):
+    """Split a git diff into the changes of each file
 
-    print("Getting added files")
-    files_string = run_command("git diff --name-status HEAD")
-    second_files_string = run_command("git diff --name-status origin/master...{}".format(branch_name))
-    added_files, modified_files, added_scripts, modified_scripts = \
-        get_changed_files(files_string + '\n' + second_files_string)
+    Arguments:
+        diff_string {string} -- the output of git diff
+
+    Returns:
+        tuple -- (files_string, file_diffs): the changed files in git diff --name-status format and a dict of
+            file path -> the diff of that file
+    """
+    statuses = OrderedDict()
+    file_diffs = {}
+    file_path = None
+    for line in diff_string.splitlines(True):
+        header = re.match(r'diff --git a/(\S+) b/(\S+)$', line)
+        if header:
+            file_path = header.group(2)
+            statuses[file_path] = 'M'
+            file_diffs[file_path] = ''
+        elif file_path:
+            if line.startswith('new file mode'):
+                statuses[file_path] = 'A'
+            elif line.startswith('deleted file mode'):
+                statuses[file_path] = 'D'
+            elif line.startswith('rename from'):
+                statuses[file_path] = 'R'
+            file_diffs[file_path] += line
+
+    files_string = '\n'.join('{}\t{}'.format(status, path) for path, status in statuses.items())
+    return files_string, file_diffs
+
+
+def update_id_set(since=None):
+    file_diffs = None
+    if since:
+        # a single git call gives both the changed files and the diff of each file
+        print("Getting the files changed since {}".format(since))
+        files_string, file_diffs = split_diff(run_command("git diff {}".format(since)))
+    else:
+        branches = run_command("git branch")
+        branch_name_reg = re.search(r"\* (.*)", branches)
+        branch_name = branch_name_reg.group(1)
+
+        print("Getting added files")
+        files_string = run_command("git diff --name-status HEAD")
+        second_files_string = run_command("git diff --name-status origin/master...{}".format(branch_name))
+        files_string += '\n' + second_files_string
+
+    added_files, modified_files, added_scripts, modified_scripts = get_changed_files(files_string)
 
     if added_files or modified_files or added_scripts or modified_scripts:
         print("Updating id_set.json")
 
-        with open('./Tests/id_set.json', 'r') as id_set_file:
+        with open(ID_SET_PATH, 'r') as id_set_file:
             try:
                 ids_dict = json.load(id_set_file, object_pairs_hook=OrderedDict)
             except ValueError as ex:
@@ -577,7 +722,7 @@ def update_id_set():
                     # usually it will happen if we merged from master and we had a conflict in id_set.json
                     # so we checkout the id_set.json to be exact as in master and then run update_id_set
                     run_command("git checkout origin/master Tests/id_set.json")
-                    with open('./Tests/id_set.json', 'r') as id_set_file_from_master:
+                    with open(ID_SET_PATH, 'r') as id_set_file_from_master:
                         ids_dict = json.load(id_set_file_from_master, object_pairs_hook=OrderedDict)
                 else:
                     raise
@@ -617,23 +762,27 @@ def update_id_set():
                     re.match(INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
                 id = get_script_or_integration_id(file_path)
                 integration_data = get_integration_data(file_path)
-                update_object_in_id_set(id, integration_data, file_path, integration_set)
+                update_object_in_id_set(id, integration_data, file_path, integration_set,
+                                        get_file_diff(file_diffs, file_path))
                 print("updated {0} in id_set".format(id))
             if re.match(SCRIPT_REGEX, file_path, re.IGNORECASE) or re.match(TEST_SCRIPT_REGEX,
                                                                             file_path, re.IGNORECASE):
                 id = get_script_or_integration_id(file_path)
                 script_data = get_script_data(file_path)
-                update_object_in_id_set(id, script_data, file_path, script_set)
+                update_object_in_id_set(id, script_data, file_path, script_set,
+                                        get_file_diff(file_diffs, file_path))
                 print("updated {0} in id_set".format(id))
             if re.match(PLAYBOOK_REGEX, file_path, re.IGNORECASE):
                 id = collect_ids(file_path)
                 playbook_data = get_playbook_data(file_path)
-                update_object_in_id_set(id, playbook_data, file_path, playbook_set)
+                update_object_in_id_set(id, playbook_data, file_path, playbook_set,
+                                        get_file_diff(file_diffs, file_path))
                 print("updated {0} in id_set".format(id))
             if re.match(TEST_PLAYBOOK_REGEX, file_path, re.IGNORECASE):
                 id = collect_ids(file_path)
                 playbook_data = get_playbook_data(file_path)
-                update_object_in_id_set(id, playbook_data, file_path, test_playbook_set)
+                update_object_in_id_set(id, playbook_data, file_path, test_playbook_set,
+                                        get_file_diff(file_diffs, file_path))
                 print("updated {0} in id_set".format(id))
 
     if added_scripts:
@@ -644,13 +793,14 @@ def update_id_set():
             print("Adding {0} to id_set".format(get_script_or_integration_id(yml_path)))
 
     if modified_scripts:
-        for modified_script_package in added_scripts:
+        for modified_script_package in modified_scripts:
             yml_path, code = get_script_package_data(modified_script_package)
             update_object_in_id_set(get_script_or_integration_id(yml_path),
-                                    get_script_data(yml_path, script_code=code), yml_path, script_set)
+                                    get_script_data(yml_path, script_code=code), yml_path, script_set,
+                                    get_file_diff(file_diffs, yml_path))
             print("Adding {0} to id_set".format(get_script_or_integration_id(yml_path)))
 
-    if added_files or modified_files:
+    if added_files or modified_files or added_scripts or modified_scripts:
         new_ids_dict = OrderedDict()
         # we sort each time the whole set in case someone manually changed something
         # it shouldn't take too much time
@@ -659,25 +809,37 @@ def update_id_set():
         new_ids_dict['integrations'] = sort(integration_set)
         new_ids_dict['TestPlaybooks'] = sort(test_playbook_set)
 
-        with open('./Tests/id_set.json', 'w') as id_set_file:
+        with open(ID_SET_PATH, 'w') as id_set_file:
             json.dump(new_ids_dict, id_set_file, indent=4)
 
     print("Finished updating id_set.json")
 
 
+def get_file_diff(file_diffs, file_path):
+    """The diff of the file if all the diffs were already fetched, otherwise None to fetch it from git"""
+    if file_diffs is None:
+        return None
+
+    return file_diffs.get(os.path.normpath(file_path), '')
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Utility CircleCI usage')
     parser.add_argument('-r', '--reCreate', action='store_true', help='Is re-create id_set or update it')
+    parser.add_argument('-s', '--since', help='Update the id_set with the changes since the given git ref, '
+                                              'using a single git diff')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-create the id_set without the content hash cache of the previous run')
     options = parser.parse_args()
 
     if options.reCreate:
         print("Re creating the id_set.json")
-        re_create_id_set()
+        re_create_id_set(use_cache=not options.no_cache)
 
     else:
-        if os.path.isfile('./Tests/id_set.json'):
+        if os.path.isfile(ID_SET_PATH):
             print("Updating the id_set.json")
-            update_id_set()
+            update_id_set(since=options.since)
         else:
             print("./Tests/id_set.json is missing. Recreating...")
-            re_create_id_set()
+            re_create_id_set(use_cache=not options.no_cache)
@@ -3,4 +3,14 @@ set -e
 
 cd content-test-data
 git add *
-git commit -m "Updated mock files from content branch '$1' build number - $2" && git push --force || :
+if git commit -m "Updated mock files from content branch '$1' build number - $2"; then
+    # the instances of a sharded build push the mock files of different tests one after the other,
+    # so each push is rebased on the previous ones instead of overwriting them
+    for attempt in 1 2 3; do
+        git pull --rebase && git push && exit 0
+        git rebase --abort 2> /dev/null || :
+        sleep 5
+    done
+    echo "Failed to push the mock files"
+    exit 1
+fi
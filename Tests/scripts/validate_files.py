@@ -18,8 +18,14 @@ import glob
 import logging
 import argparse
 import subprocess
+from multiprocessing import Pool, cpu_count
 import yaml
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONTENT_DIR = os.path.abspath(SCRIPT_DIR + '/../..')
 sys.path.append(CONTENT_DIR)
@@ -35,7 +41,42 @@ from Tests.scripts.hook_validations.integration import IntegrationValidator  # n
 from Tests.scripts.hook_validations.description import DescriptionValidator  # noqa: E402
 from Tests.scripts.hook_validations.incident_field import IncidentFieldValidator  # noqa: E402
 from Tests.test_utils import checked_type, run_command, print_error, print_warning, print_color, LOG_COLORS, \
-    get_yaml, filter_packagify_changes, collect_ids, str2bool  # noqa: E402
+    get_yaml, filter_packagify_changes, collect_ids, str2bool, files_cache, get_files_cache, enable_files_cache, \
+    prefetch_remote_files  # noqa: E402
+
+# The FilesValidator of a validation worker process, see FilesValidator.run_validations
+_worker_files_validator = None
+
+
+def _init_validation_worker(files_validator, cache):
+    global _worker_files_validator
+    _worker_files_validator = files_validator
+    enable_files_cache(cache)
+
+
+def _run_validation_task(task):
+    """Run a single file validation in a worker process.
+
+    Returns:
+        (bool, str, BaseException). Whether the file is valid, the output the validation printed and the exception
+        it raised, if any. The exception is raised by the parent process after printing the output. This includes
+        the SystemExit of run_command, which would otherwise kill the worker and leave the pool waiting for its
+        result forever.
+    """
+    method_name, args = task
+    output = StringIO()
+    error = None
+    stdout = sys.stdout
+    sys.stdout = output
+    _worker_files_validator._is_valid = True
+    try:
+        getattr(_worker_files_validator, method_name)(*args)
+    except (Exception, SystemExit) as exc:
+        error = exc
+    finally:
+        sys.stdout = stdout
+
+    return _worker_files_validator._is_valid, output.getvalue(), error
 
 
 class FilesValidator(object):
@@ -47,14 +88,16 @@ class FilesValidator(object):
         _is_valid (bool): saves the status of the whole validation(instead of mingling it between all the functions).
         is_circle (bool): whether we are running on circle or local env.
         print_ignored_files (bool): should print ignored files when iterating over changed files.
+        workers (int): the number of processes validating files in parallel.
         conf_json_validator (ConfJsonValidator): object for validating the conf.json file.
         id_set_validator (IDSetValidator): object for validating the id_set.json file(Created in Circle only).
     """
 
-    def __init__(self, is_circle=False, print_ignored_files=False):
+    def __init__(self, is_circle=False, print_ignored_files=False, workers=1):
         self._is_valid = True
         self.is_circle = is_circle
         self.print_ignored_files = print_ignored_files
+        self.workers = workers
 
         self.conf_json_validator = ConfJsonValidator()
         self.id_set_validator = IDSetValidator(is_circle)
@@ -198,6 +241,55 @@ class FilesValidator(object):
 
         return modified_files, added_files, old_format_files
 
+    def run_validations(self, method_name, tasks_args):
+        """Run the validation method for each of the files, in parallel worker processes when there are several.
+
+        The validation of every file is independent. Its output is printed in the order of tasks_args, and an invalid
+        file sets self._is_valid to False, as if the files were validated one after the other.
+
+        Args:
+            method_name (str): The name of the FilesValidator method validating a single file.
+            tasks_args (list): The arguments tuple of each method call.
+        """
+        if self.workers <= 1 or len(tasks_args) <= 1:
+            for args in tasks_args:
+                getattr(self, method_name)(*args)
+            return
+
+        pool = Pool(processes=min(self.workers, len(tasks_args)), initializer=_init_validation_worker,
+                    initargs=(self, get_files_cache()))
+        try:
+            tasks = [(method_name, args) for args in tasks_args]
+            for is_valid, output, error in pool.imap(_run_validation_task, tasks, chunksize=4):
+                sys.stdout.write(output)
+                if error is not None:
+                    raise error
+                if not is_valid:
+                    self._is_valid = False
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    @staticmethod
+    def get_old_files_to_fetch(files, old_branch='master'):
+        """Get the (file path, tag) of the old file versions the validators of the given files will fetch"""
+        files_to_fetch = []
+        for file_path in files:
+            old_file_path = None
+            if isinstance(file_path, tuple):
+                old_file_path, file_path = file_path
+
+            if checked_type(file_path, [INTEGRATION_REGEX, INTEGRATION_YML_REGEX, SCRIPT_REGEX, SCRIPT_YML_REGEX,
+                                        INCIDENT_FIELD_REGEX]):
+                files_to_fetch.append((old_file_path or file_path, old_branch))
+            elif checked_type(file_path, [BETA_INTEGRATION_REGEX, BETA_INTEGRATION_YML_REGEX]):
+                files_to_fetch.append((old_file_path or file_path, 'master'))
+
+        return files_to_fetch
+
     def validate_modified_files(self, modified_files, is_backward_check=True, old_branch='master'):
         """Validate the modified files from your branch.
 
@@ -208,79 +300,84 @@ class FilesValidator(object):
             is_backward_check (bool): When set to True will run backward compatibility checks
             old_branch (str): Old git branch to compare backward compatibility check to
         """
-        for file_path in modified_files:
-            old_file_path = None
-            if isinstance(file_path, tuple):
-                old_file_path, file_path = file_path
+        prefetch_remote_files(self.get_old_files_to_fetch(modified_files, old_branch))
+        self.run_validations('validate_modified_file',
+                             [(file_path, is_backward_check, old_branch) for file_path in modified_files])
+
+    def validate_modified_file(self, file_path, is_backward_check=True, old_branch='master'):
+        """Validate a single modified file, see validate_modified_files"""
+        old_file_path = None
+        if isinstance(file_path, tuple):
+            old_file_path, file_path = file_path
+
+        print('Validating {}'.format(file_path))
+        if not checked_type(file_path):
+            print_warning('- Skipping validation of non-content entity file.')
+            return
+
+        structure_validator = StructureValidator(file_path, is_added_file=not (False or is_backward_check),
+                                                 is_renamed=old_file_path is not None)
+        if not structure_validator.is_file_valid():
+            self._is_valid = False
 
-            print('Validating {}'.format(file_path))
-            if not checked_type(file_path):
-                print_warning('- Skipping validation of non-content entity file.')
-                continue
+        if not self.id_set_validator.is_file_valid_in_set(file_path):
+            self._is_valid = False
 
-            structure_validator = StructureValidator(file_path, is_added_file=not (False or is_backward_check),
-                                                     is_renamed=old_file_path is not None)
-            if not structure_validator.is_file_valid():
-                self._is_valid = False
+        elif re.match(INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
+                re.match(INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
 
-            if not self.id_set_validator.is_file_valid_in_set(file_path):
+            image_validator = ImageValidator(file_path)
+            if not image_validator.is_valid():
                 self._is_valid = False
 
-            elif re.match(INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
-
-                image_validator = ImageValidator(file_path)
-                if not image_validator.is_valid():
-                    self._is_valid = False
-
-                description_validator = DescriptionValidator(file_path)
-                if not description_validator.is_valid():
-                    self._is_valid = False
+            description_validator = DescriptionValidator(file_path)
+            if not description_validator.is_valid():
+                self._is_valid = False
 
-                integration_validator = IntegrationValidator(file_path, old_file_path=old_file_path,
-                                                             old_git_branch=old_branch)
-                if is_backward_check and not integration_validator.is_backward_compatible():
-                    self._is_valid = False
-                if not integration_validator.is_valid_integration():
-                    self._is_valid = False
+            integration_validator = IntegrationValidator(file_path, old_file_path=old_file_path,
+                                                         old_git_branch=old_branch)
+            if is_backward_check and not integration_validator.is_backward_compatible():
+                self._is_valid = False
+            if not integration_validator.is_valid_integration():
+                self._is_valid = False
 
-            elif re.match(BETA_INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(BETA_INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
-                description_validator = DescriptionValidator(file_path)
-                if not description_validator.is_valid_beta_description():
-                    self._is_valid = False
-                integration_validator = IntegrationValidator(file_path, old_file_path=old_file_path)
-                if not integration_validator.is_valid_beta_integration():
-                    self._is_valid = False
+        elif re.match(BETA_INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
+                re.match(BETA_INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
+            description_validator = DescriptionValidator(file_path)
+            if not description_validator.is_valid_beta_description():
+                self._is_valid = False
+            integration_validator = IntegrationValidator(file_path, old_file_path=old_file_path)
+            if not integration_validator.is_valid_beta_integration():
+                self._is_valid = False
 
-            elif re.match(SCRIPT_REGEX, file_path, re.IGNORECASE):
-                script_validator = ScriptValidator(file_path, old_file_path=old_file_path, old_git_branch=old_branch)
-                if is_backward_check and not script_validator.is_backward_compatible():
-                    self._is_valid = False
-                if not script_validator.is_valid_script():
-                    self._is_valid = False
+        elif re.match(SCRIPT_REGEX, file_path, re.IGNORECASE):
+            script_validator = ScriptValidator(file_path, old_file_path=old_file_path, old_git_branch=old_branch)
+            if is_backward_check and not script_validator.is_backward_compatible():
+                self._is_valid = False
+            if not script_validator.is_valid_script():
+                self._is_valid = False
 
-            elif re.match(SCRIPT_YML_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(SCRIPT_PY_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(SCRIPT_JS_REGEX, file_path, re.IGNORECASE):
+        elif re.match(SCRIPT_YML_REGEX, file_path, re.IGNORECASE) or \
+                re.match(SCRIPT_PY_REGEX, file_path, re.IGNORECASE) or \
+                re.match(SCRIPT_JS_REGEX, file_path, re.IGNORECASE):
 
-                yml_path, _ = get_script_package_data(os.path.dirname(file_path))
-                script_validator = ScriptValidator(yml_path, old_file_path=old_file_path, old_git_branch=old_branch)
-                if is_backward_check and not script_validator.is_backward_compatible():
-                    self._is_valid = False
+            yml_path, _ = get_script_package_data(os.path.dirname(file_path))
+            script_validator = ScriptValidator(yml_path, old_file_path=old_file_path, old_git_branch=old_branch)
+            if is_backward_check and not script_validator.is_backward_compatible():
+                self._is_valid = False
 
-            elif re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
-                image_validator = ImageValidator(file_path)
-                if not image_validator.is_valid():
-                    self._is_valid = False
+        elif re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
+            image_validator = ImageValidator(file_path)
+            if not image_validator.is_valid():
+                self._is_valid = False
 
-            elif re.match(INCIDENT_FIELD_REGEX, file_path, re.IGNORECASE):
-                incident_field_validator = IncidentFieldValidator(file_path, old_file_path=old_file_path,
-                                                                  old_git_branch=old_branch)
-                if not incident_field_validator.is_valid():
-                    self._is_valid = False
-                if is_backward_check and not incident_field_validator.is_backward_compatible():
-                    self._is_valid = False
+        elif re.match(INCIDENT_FIELD_REGEX, file_path, re.IGNORECASE):
+            incident_field_validator = IncidentFieldValidator(file_path, old_file_path=old_file_path,
+                                                              old_git_branch=old_branch)
+            if not incident_field_validator.is_valid():
+                self._is_valid = False
+            if is_backward_check and not incident_field_validator.is_backward_compatible():
+                self._is_valid = False
 
     def validate_added_files(self, added_files):
         """Validate the added files from your branch.
@@ -290,57 +387,61 @@ class FilesValidator(object):
         Args:
             added_files (set): A set of the modified files in the current branch.
         """
-        for file_path in added_files:
-            print('Validating {}'.format(file_path))
+        prefetch_remote_files(self.get_old_files_to_fetch(added_files))
+        self.run_validations('validate_added_file', [(file_path,) for file_path in added_files])
 
-            structure_validator = StructureValidator(file_path, is_added_file=True)
-            if not structure_validator.is_file_valid():
-                self._is_valid = False
+    def validate_added_file(self, file_path):
+        """Validate a single added file, see validate_added_files"""
+        print('Validating {}'.format(file_path))
 
-            if not self.id_set_validator.is_file_valid_in_set(file_path):
-                self._is_valid = False
+        structure_validator = StructureValidator(file_path, is_added_file=True)
+        if not structure_validator.is_file_valid():
+            self._is_valid = False
 
-            if self.id_set_validator.is_file_has_used_id(file_path):
-                self._is_valid = False
+        if not self.id_set_validator.is_file_valid_in_set(file_path):
+            self._is_valid = False
 
-            if re.match(TEST_PLAYBOOK_REGEX, file_path, re.IGNORECASE):
-                if not self.conf_json_validator.is_test_in_conf_json(collect_ids(file_path)):
-                    self._is_valid = False
+        if self.id_set_validator.is_file_has_used_id(file_path):
+            self._is_valid = False
 
-            elif re.match(INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(INTEGRATION_YML_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
+        if re.match(TEST_PLAYBOOK_REGEX, file_path, re.IGNORECASE):
+            if not self.conf_json_validator.is_test_in_conf_json(collect_ids(file_path)):
+                self._is_valid = False
 
-                image_validator = ImageValidator(file_path)
-                if not image_validator.is_valid():
-                    self._is_valid = False
+        elif re.match(INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
+                re.match(INTEGRATION_YML_REGEX, file_path, re.IGNORECASE) or \
+                re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
 
-                description_validator = DescriptionValidator(file_path)
-                if not description_validator.is_valid():
-                    self._is_valid = False
+            image_validator = ImageValidator(file_path)
+            if not image_validator.is_valid():
+                self._is_valid = False
 
-                integration_validator = IntegrationValidator(file_path)
-                if not integration_validator.is_valid_integration():
-                    self._is_valid = False
+            description_validator = DescriptionValidator(file_path)
+            if not description_validator.is_valid():
+                self._is_valid = False
 
-            elif re.match(BETA_INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
-                    re.match(BETA_INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
-                description_validator = DescriptionValidator(file_path)
-                if not description_validator.is_valid_beta_description():
-                    self._is_valid = False
+            integration_validator = IntegrationValidator(file_path)
+            if not integration_validator.is_valid_integration():
+                self._is_valid = False
 
-                integration_validator = IntegrationValidator(file_path)
-                if not integration_validator.is_valid_beta_integration(is_new=True):
-                    self._is_valid = False
-            elif re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
-                image_validator = ImageValidator(file_path)
-                if not image_validator.is_valid():
-                    self._is_valid = False
+        elif re.match(BETA_INTEGRATION_REGEX, file_path, re.IGNORECASE) or \
+                re.match(BETA_INTEGRATION_YML_REGEX, file_path, re.IGNORECASE):
+            description_validator = DescriptionValidator(file_path)
+            if not description_validator.is_valid_beta_description():
+                self._is_valid = False
 
-            elif re.match(INCIDENT_FIELD_REGEX, file_path, re.IGNORECASE):
-                incident_field_validator = IncidentFieldValidator(file_path)
-                if not incident_field_validator.is_valid():
-                    self._is_valid = False
+            integration_validator = IntegrationValidator(file_path)
+            if not integration_validator.is_valid_beta_integration(is_new=True):
+                self._is_valid = False
+        elif re.match(IMAGE_REGEX, file_path, re.IGNORECASE):
+            image_validator = ImageValidator(file_path)
+            if not image_validator.is_valid():
+                self._is_valid = False
+
+        elif re.match(INCIDENT_FIELD_REGEX, file_path, re.IGNORECASE):
+            incident_field_validator = IncidentFieldValidator(file_path)
+            if not incident_field_validator.is_valid():
+                self._is_valid = False
 
     def validate_no_old_format(self, old_format_files):
         """ Validate there are no files in the old format(unified yml file for the code and configuration).
@@ -382,31 +483,35 @@ class FilesValidator(object):
 
     def validate_all_files(self):
         """Validate all files in the repo are in the right format."""
+        validated_directories = set([])
         for regex in CHECKED_TYPES_REGEXES:
             splitted_regex = regex.split('.*')
             directory = splitted_regex[0]
+            if directory in validated_directories:  # several regexes are of the same directory
+                continue
+
+            validated_directories.add(directory)
             for root, dirs, files in os.walk(directory):
                 if root not in DIR_LIST:  # Skipping in case we entered a package
                     continue
                 print_color('Validating {} directory:'.format(directory), LOG_COLORS.GREEN)
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    # skipping hidden files
-                    if file_name.startswith('.'):
-                        continue
-
-                    print('Validating ' + file_name)
-                    structure_validator = StructureValidator(file_path)
-                    if not structure_validator.is_valid_scheme():
-                        self._is_valid = False
+                # skipping hidden files
+                tasks_args = [(os.path.join(root, file_name), file_name) for file_name in files
+                              if not file_name.startswith('.')]
 
                 if root in PACKAGE_SUPPORTING_DIRECTORIES:
                     for inner_dir in dirs:
                         file_path = glob.glob(os.path.join(root, inner_dir, '*.yml'))[0]
-                        print('Validating ' + file_path)
-                        structure_validator = StructureValidator(file_path)
-                        if not structure_validator.is_valid_scheme():
-                            self._is_valid = False
+                        tasks_args.append((file_path, file_path))
+
+                self.run_validations('validate_file_scheme', tasks_args)
+
+    def validate_file_scheme(self, file_path, display_name):
+        """Validate a single file scheme, see validate_all_files"""
+        print('Validating ' + display_name)
+        structure_validator = StructureValidator(file_path)
+        if not structure_validator.is_valid_scheme():
+            self._is_valid = False
 
     def is_valid_structure(self, branch_name, is_backward_check=True, prev_ver=None):
         """Check if the structure is valid for the case we are in, master - all files, branch - changed files.
@@ -421,17 +526,19 @@ class FilesValidator(object):
         if not self.conf_json_validator.is_valid_conf_json():
             self._is_valid = False
 
-        if branch_name != 'master' and not branch_name.startswith('19.') and not branch_name.startswith('20.'):
-            # validates only committed files
-            self.validate_committed_files(branch_name, is_backward_check=is_backward_check)
-            if not prev_ver:
-                # validate against master if no version was provided
-                prev_ver = 'origin/master'
-            self.validate_against_previous_version(branch_name, prev_ver, no_error=True)
-        else:
-            self.validate_against_previous_version(branch_name, prev_ver, no_error=True)
-            # validates all of Content repo directories according to their schemas
-            self.validate_all_files()
+        # every file is parsed, and every old file version fetched, once for all the validators
+        with files_cache():
+            if branch_name != 'master' and not branch_name.startswith('19.') and not branch_name.startswith('20.'):
+                # validates only committed files
+                self.validate_committed_files(branch_name, is_backward_check=is_backward_check)
+                if not prev_ver:
+                    # validate against master if no version was provided
+                    prev_ver = 'origin/master'
+                self.validate_against_previous_version(branch_name, prev_ver, no_error=True)
+            else:
+                self.validate_against_previous_version(branch_name, prev_ver, no_error=True)
+                # validates all of Content repo directories according to their schemas
+                self.validate_all_files()
 
         return self._is_valid
 
@@ -473,6 +580,8 @@ def main():
     parser.add_argument('-b', '--backwardComp', type=str2bool, default=True, help='To check backward compatibility.')
     parser.add_argument('-t', '--test-filter', type=str2bool, default=False, help='Check that tests are valid.')
     parser.add_argument('-p', '--prev-ver', help='Previous branch or SHA1 commit to run checks against.')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count(),
+                        help='The number of processes validating files in parallel.')
     options = parser.parse_args()
     is_circle = options.circle
     is_backward_check = options.backwardComp
@@ -480,7 +589,7 @@ def main():
     logging.basicConfig(level=logging.CRITICAL)
 
     print_color('Starting validating files structure', LOG_COLORS.GREEN)
-    files_validator = FilesValidator(is_circle, print_ignored_files=True)
+    files_validator = FilesValidator(is_circle, print_ignored_files=True, workers=options.jobs)
     if not files_validator.is_valid_structure(branch_name, is_backward_check=is_backward_check,
                                               prev_ver=options.prev_ver):
         sys.exit(1)
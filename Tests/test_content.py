@@ -3,6 +3,7 @@ import sys
 import json
 import argparse
 import requests
+import threading
 import subprocess
 import urllib3
 from time import sleep
@@ -51,6 +52,12 @@ def options_handler():
                              'dmst_content_nightly_memory_data', default=False)
     parser.add_argument('-d', '--serverVersion', help='Which server version to run the '
                                                       'tests on(Valid only when using AMI)', default="NonAMI")
+    parser.add_argument('--shard', type=str2bool, help='Split the tests between all the instances of the server '
+                                                       'version in instance_ips.txt, instead of using the first one',
+                        default=False)
+    parser.add_argument('-w', '--workers', type=int, help='Number of mock-disabled tests to run concurrently on a '
+                                                          'server, tests sharing an integration never run together',
+                        default=1)
 
     options = parser.parse_args()
 
@@ -58,12 +65,14 @@ def options_handler():
 
 
 def print_test_summary(succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration,
-                       unmocklable_integrations, proxy, is_ami=True):
+                       unmocklable_integrations, proxies, is_ami=True):
     succeed_count = len(succeed_playbooks)
     failed_count = len(failed_playbooks)
     skipped_count = len(skipped_tests)
-    rerecorded_count = len(proxy.rerecorded_tests) if is_ami else 0
-    empty_mocks_count = len(proxy.empty_files) if is_ami else 0
+    rerecorded_tests = [playbook_id for proxy in proxies for playbook_id in proxy.rerecorded_tests] if is_ami else []
+    empty_files = [playbook_id for proxy in proxies for playbook_id in proxy.empty_files] if is_ami else []
+    rerecorded_count = len(rerecorded_tests)
+    empty_mocks_count = len(empty_files)
     unmocklable_integrations_count = len(unmocklable_integrations)
 
     print('\nTEST RESULTS:')
@@ -77,7 +86,7 @@ def print_test_summary(succeed_playbooks, failed_playbooks, skipped_tests, skipp
 
     if rerecorded_count > 0:
         print_warning('\t Tests with failed playback and successful re-recording - ' + str(rerecorded_count) + ':')
-        for playbook_id in proxy.rerecorded_tests:
+        for playbook_id in rerecorded_tests:
             print_warning('\t - ' + playbook_id)
 
     if empty_mocks_count > 0:
@@ -85,7 +94,7 @@ def print_test_summary(succeed_playbooks, failed_playbooks, skipped_tests, skipp
         print('\t (either there were no http requests or no traffic is passed through the proxy.\n'
               '\t Investigate the playbook and the integrations.\n'
               '\t If the integration has no http traffic, add to unmockable_integrations in conf.json)')
-        for playbook_id in proxy.empty_files:
+        for playbook_id in empty_files:
             print('\t - ' + playbook_id)
 
     if len(skipped_integration) > 0:
@@ -509,9 +518,165 @@ def restart_demisto_service(ami, c):
     raise Exception('Timeout waiting for demisto service to restart')
 
 
-def execute_testing(server, server_ip, server_version, server_numeric_version, is_ami=True):
-    print("Executing tests with the server {} - and the server ip {}".format(server, server_ip))
+def get_test_integrations(test):
+    integrations_conf = test.get('integrations', [])
+    if not isinstance(integrations_conf, list):
+        integrations_conf = [integrations_conf, ]
+    return set(integrations_conf)
+
+
+def shard_tests(tests, shards_count, default_test_timeout):
+    """Split the tests between servers, keeping the tests order in each shard.
+    Each test goes to the shard with the lowest sum of timeouts so far, as the timeout is the only estimate we have
+    of the test duration.
+
+    Args:
+        tests (list): tests from conf.json
+        shards_count (int): number of servers
+        default_test_timeout (int): timeout of tests without one
+
+    Returns:
+        list. shards_count lists of (index in tests, test) tuples
+    """
+    shards = [[] for _ in range(shards_count)]
+    shards_timeouts = [0] * shards_count
+    for index, test in enumerate(tests):
+        shard_index = shards_timeouts.index(min(shards_timeouts))
+        shards[shard_index].append((index, test))
+        shards_timeouts[shard_index] += test.get('timeout', default_test_timeout)
+    return shards
+
+
+class ConflictFreeTestQueue(object):
+    """Queue of tests for workers running on the same server.
+    Gives the first pending test which does not share an integration with the running tests, as two instances
+    of the same integration can not be used at the same time.
+    """
+
+    def __init__(self, tests):
+        self.pending_tests = list(tests)
+        self.running_integrations = set()
+        self.condition = threading.Condition()
+
+    def get(self):
+        """Wait for a test which can run now, returns None once there are no pending tests"""
+        with self.condition:
+            while self.pending_tests:
+                for position, (index, test) in enumerate(self.pending_tests):
+                    integrations = get_test_integrations(test)
+                    if not integrations & self.running_integrations:
+                        del self.pending_tests[position]
+                        self.running_integrations |= integrations
+                        return index, test
+                self.condition.wait()
+            return None
+
+    def done(self, test):
+        with self.condition:
+            self.running_integrations -= get_test_integrations(test)
+            self.condition.notify_all()
+
+
+class BufferedTestsOutput(object):
+    """sys.stdout replacement collecting the output of each test run in a thread, to print it at once when the test
+    ends instead of mixing the output of the concurrent tests."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            with self.lock:
+                self.stream.write(data)
+        else:
+            buffer.append(data)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def start_test(self):
+        self.local.buffer = []
+
+    def end_test(self):
+        output = ''.join(self.local.buffer)
+        self.local.buffer = None
+        with self.lock:
+            self.stream.write(output)
+            self.stream.flush()
+
+
+class ShardedTestsResults(object):
+    """Results of the tests of all the servers, merged in the order the tests would run on a single server"""
+
+    MOCK_TESTS = 0
+    MOCKLESS_TESTS = 1
+
+    def __init__(self):
+        self.tests_results = {}
+        self.proxies = []
+        self.amis = []
+
+    def run_test(self, test_key, run_test_func):
+        """Run a test with its own results lists, run_test_func gets succeed_playbooks, failed_playbooks,
+        skipped_tests, skipped_integration"""
+        test_results = ([], [], set(), set())
+        self.tests_results[test_key] = test_results
+        run_test_func(*test_results)
+
+    def merge(self):
+        succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration = [], [], set(), set()
+        for test_key in sorted(self.tests_results):
+            test_succeed, test_failed, test_skipped, test_skipped_integration = self.tests_results[test_key]
+            succeed_playbooks.extend(test_succeed)
+            failed_playbooks.extend(test_failed)
+            skipped_tests.update(test_skipped)
+            skipped_integration.update(test_skipped_integration)
+        return succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration
+
+
+def run_in_threads(target, args_list):
+    """Run target with each of the args in a thread, raising the first error once all threads ended"""
+    errors = []
+
+    def run_target(*args):
+        try:
+            target(*args)
+        except Exception as ex:
+            print_error('Failed running tests: {}'.format(ex))
+            errors.append(ex)
+
+    threads = [threading.Thread(target=run_target, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def run_tests_concurrently(tests, workers, run_test_func):
+    """Run (index, test) tuples in worker threads, see ConflictFreeTestQueue"""
+    tests_queue = ConflictFreeTestQueue(tests)
+
+    def worker():
+        while True:
+            queued_test = tests_queue.get()
+            if queued_test is None:
+                return
+            index, test = queued_test
+            try:
+                run_test_func(index, test)
+            finally:
+                tests_queue.done(test)
+
+    run_in_threads(worker, [()] * workers)
 
+
+def execute_testing(server_ips, server_version, server_numeric_version, is_ami=True):
     options = options_handler()
     conf_path = options.conf
     secret_conf_path = options.secret
@@ -521,12 +686,11 @@ def execute_testing(server, server_ip, server_version, server_numeric_version, i
     circle_ci = options.circleci
     build_number = options.buildNumber
     build_name = options.buildName
+    workers = max(options.workers, 1)
 
     conf, secret_conf = load_conf_files(conf_path, secret_conf_path)
     demisto_api_key = secret_conf.get('temp_apikey')
 
-    c = demisto_client.configure(base_url=server, api_key=demisto_api_key, verify_ssl=False)
-
     default_test_timeout = conf.get('testTimeout', 30)
 
     tests = conf['tests']
@@ -545,63 +709,102 @@ def execute_testing(server, server_ip, server_version, server_numeric_version, i
         print('no integrations are configured for test')
         return
 
-    proxy = None
-    if is_ami:
-        ami = AMIConnection(server_ip)
-        ami.clone_mock_data()
-        proxy = MITMProxy(c, server_ip)
-
-    failed_playbooks = []
-    succeed_playbooks = []
-    skipped_tests = set([])
-    skipped_integration = set([])
-
-    disable_all_integrations(c)
-
-    if is_ami:
-        # move all mock tests to the top of the list
-        mock_tests, mockless_tests = organize_tests(tests, unmockable_integrations, skipped_integrations_conf,
-                                                    nightly_integrations)
-    else:  # In case of a non AMI run we don't want to use the mocking mechanism
-        mockless_tests = tests
-    if is_nightly and is_memory_check:
-        mem_lim, err = get_docker_limit()
-        send_slack_message(slack, SLACK_MEM_CHANNEL_ID,
-                           'Build Number: {0}\n Server Address: {1}\nMemory Limit: {2}'.format(build_number, server,
-                                                                                               mem_lim),
-                           'Content CircleCI', 'False')
-    # first run the mock tests to avoid mockless side effects in container
-    if is_ami and mock_tests:
-        proxy.configure_proxy_in_demisto(proxy.ami.docker_ip + ':' + proxy.PROXY_PORT)
-        for t in mock_tests:
-            run_test_scenario(t, c, proxy, default_test_timeout, skipped_tests_conf, nightly_integrations,
-                              skipped_integrations_conf, skipped_integration, is_nightly, run_all_tests,
-                              is_filter_configured,
-                              filtered_tests, skipped_tests, secret_params, failed_playbooks,
-                              unmockable_integrations, succeed_playbooks, slack, circle_ci, build_number, server,
-                              build_name, server_numeric_version, demisto_api_key)
-
-        print("\nRunning mock-disabled tests")
-        proxy.configure_proxy_in_demisto('')
-        print("Restarting demisto service")
-        restart_demisto_service(ami, c)
-        print("Demisto service restarted\n")
-    for t in mockless_tests:
-        run_test_scenario(t, c, proxy, default_test_timeout, skipped_tests_conf, nightly_integrations,
-                          skipped_integrations_conf, skipped_integration, is_nightly, run_all_tests,
-                          is_filter_configured,
-                          filtered_tests, skipped_tests, secret_params, failed_playbooks,
-                          unmockable_integrations, succeed_playbooks, slack, circle_ci, build_number, server,
-                          build_name, server_numeric_version, demisto_api_key, is_ami)
+    results = ShardedTestsResults()
+
+    def execute_server_tests(server_ip, server_tests):
+        server = SERVER_URL.format(server_ip)
+        print("Executing tests with the server {} - and the server ip {}".format(server, server_ip))
+        c = demisto_client.configure(base_url=server, api_key=demisto_api_key, verify_ssl=False)
+
+        def run_test(tests_type, index, t, proxy, is_ami_test=True):
+            def run_test_func(succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration):
+                run_test_scenario(t, c, proxy, default_test_timeout, skipped_tests_conf, nightly_integrations,
+                                  skipped_integrations_conf, skipped_integration, is_nightly, run_all_tests,
+                                  is_filter_configured,
+                                  filtered_tests, skipped_tests, secret_params, failed_playbooks,
+                                  unmockable_integrations, succeed_playbooks, slack, circle_ci, build_number, server,
+                                  build_name, server_numeric_version, demisto_api_key, is_ami_test)
 
+            if tests_output:
+                tests_output.start_test()
+            try:
+                results.run_test((tests_type, index), run_test_func)
+            finally:
+                if tests_output:
+                    tests_output.end_test()
+
+        proxy = None
+        if is_ami:
+            ami = AMIConnection(server_ip)
+            ami.clone_mock_data()
+            proxy = MITMProxy(c, server_ip)
+            results.amis.append(ami)
+            results.proxies.append(proxy)
+
+        disable_all_integrations(c)
+
+        if is_ami:
+            # move all mock tests to the top of the list
+            tests_indexes = {id(t): index for index, t in server_tests}
+            mock_tests, mockless_tests = organize_tests([t for _, t in server_tests], unmockable_integrations,
+                                                        skipped_integrations_conf, nightly_integrations)
+            mock_tests = [(tests_indexes[id(t)], t) for t in mock_tests]
+            mockless_tests = [(tests_indexes[id(t)], t) for t in mockless_tests]
+        else:  # In case of a non AMI run we don't want to use the mocking mechanism
+            mockless_tests = server_tests
+        if is_nightly and is_memory_check:
+            mem_lim, err = get_docker_limit()
+            send_slack_message(slack, SLACK_MEM_CHANNEL_ID,
+                               'Build Number: {0}\n Server Address: {1}\nMemory Limit: {2}'.format(build_number,
+                                                                                                   server, mem_lim),
+                               'Content CircleCI', 'False')
+        # first run the mock tests to avoid mockless side effects in container
+        # they run one by one, as the server has a single proxy
+        if is_ami and mock_tests:
+            proxy.configure_proxy_in_demisto(proxy.ami.docker_ip + ':' + proxy.PROXY_PORT)
+            for index, t in mock_tests:
+                run_test(ShardedTestsResults.MOCK_TESTS, index, t, proxy)
+
+            print("\nRunning mock-disabled tests")
+            proxy.configure_proxy_in_demisto('')
+            print("Restarting demisto service")
+            restart_demisto_service(ami, c)
+            print("Demisto service restarted\n")
+        if workers > 1:
+            run_tests_concurrently(mockless_tests, workers, lambda index, t: run_test(
+                ShardedTestsResults.MOCKLESS_TESTS, index, t, proxy, is_ami))
+        else:
+            for index, t in mockless_tests:
+                run_test(ShardedTestsResults.MOCKLESS_TESTS, index, t, proxy, is_ami)
+
+    # tests running in threads print their output once they end
+    tests_output = BufferedTestsOutput(sys.stdout) if len(server_ips) > 1 or workers > 1 else None
+    if tests_output:
+        sys.stdout = tests_output
+    try:
+        if len(server_ips) == 1:
+            execute_server_tests(server_ips[0], list(enumerate(tests)))
+        else:
+            shards = shard_tests(tests, len(server_ips), default_test_timeout)
+            run_in_threads(execute_server_tests, list(zip(server_ips, shards)))
+    finally:
+        if tests_output:
+            sys.stdout = tests_output.stream
+
+    succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration = results.merge()
     print_test_summary(succeed_playbooks, failed_playbooks, skipped_tests, skipped_integration, unmockable_integrations,
-                       proxy, is_ami)
+                       results.proxies, is_ami)
 
     create_result_files(failed_playbooks, skipped_integration, skipped_tests)
 
     if is_ami and build_name == 'master':
         print("Pushing new/updated mock files to mock git repo.")
-        ami.upload_mock_files(build_name, build_number)
+        # one instance at a time, each push is rebased on the mock files pushed by the previous instances
+        for ami in results.amis:
+            try:
+                ami.upload_mock_files(build_name, build_number)
+            except subprocess.CalledProcessError as ex:
+                print_error('Failed pushing the mock files of {}: {}'.format(ami.public_ip, ex))
 
     if len(failed_playbooks):
         print("Some tests have failed. Not destroying instances.")
@@ -614,7 +817,6 @@ def execute_testing(server, server_ip, server_version, server_numeric_version, i
 
 def main():
     options = options_handler()
-    server = options.server
     is_ami = options.isAMI
     server_version = options.serverVersion
     server_numeric_version = '0.0.0'
@@ -637,12 +839,17 @@ def main():
             instance_ips = instance_file.readlines()
             instance_ips = [line.strip('\n').split(":") for line in instance_ips]
 
-        for ami_instance_name, ami_instance_ip in instance_ips:
-            if ami_instance_name == server_version:
-                print_color("Starting tests for {}".format(ami_instance_name), LOG_COLORS.GREEN)
+        server_ips = [ami_instance_ip for ami_instance_name, ami_instance_ip in instance_ips
+                      if ami_instance_name == server_version]
+        if options.shard and server_ips:
+            print_color("Starting tests for {} on {} instances".format(server_version, len(server_ips)),
+                        LOG_COLORS.GREEN)
+            execute_testing(server_ips, server_version, server_numeric_version)
+        else:
+            for ami_instance_ip in server_ips:
+                print_color("Starting tests for {}".format(server_version), LOG_COLORS.GREEN)
                 print("Starts tests with server url - https://{}".format(ami_instance_ip))
-                server = SERVER_URL.format(ami_instance_ip)
-                execute_testing(server, ami_instance_ip, server_version, server_numeric_version)
+                execute_testing([ami_instance_ip], server_version, server_numeric_version)
                 sleep(8)
 
     else:  # Run tests in Server build configuration
@@ -650,9 +857,9 @@ def main():
         print("Using server version: {} (assuming latest for non-ami)".format(server_numeric_version))
         with open('./Tests/instance_ips.txt', 'r') as instance_file:
             instance_ips = instance_file.readlines()
-            instance_ip = [line.strip('\n').split(":")[1] for line in instance_ips][0]
+            server_ips = [line.strip('\n').split(":")[1] for line in instance_ips]
 
-        execute_testing(SERVER_URL.format(instance_ip), instance_ip, server_version, server_numeric_version,
+        execute_testing(server_ips if options.shard else server_ips[:1], server_version, server_numeric_version,
                         is_ami=False)
 
 
@@ -3,6 +3,8 @@ import os
 import sys
 import json
 import argparse
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from subprocess import Popen, PIPE
 from distutils.version import LooseVersion
 import yaml
@@ -14,6 +16,9 @@ from Tests.scripts.constants import CHECKED_TYPES_REGEXES, PACKAGE_SUPPORTING_DI
 # disable insecure warnings
 requests.packages.urllib3.disable_warnings()
 
+# The parsed files and the fetched remote files of the current run, shared by all the validators. see files_cache
+_FILES_CACHE = None
+
 
 class LOG_COLORS:
     NATIVE = '\033[m'
@@ -62,29 +67,122 @@ def run_command(command, is_silenced=True, exit_on_error=True):
     return output
 
 
-def get_remote_file(full_file_path, tag='master'):
+def enable_files_cache(cache=None):
+    """Start sharing the parsed files and the fetched remote files between all the calls of this process.
+
+    Args:
+        cache (dict): An existing cache to share, e.g. the cache of the parent process in a worker process.
+
+    Returns:
+        dict. The cache, which may be passed to worker processes.
+    """
+    global _FILES_CACHE
+    _FILES_CACHE = cache if cache is not None else {'parsed': {}, 'remote': {}}
+    return _FILES_CACHE
+
+
+def disable_files_cache():
+    global _FILES_CACHE
+    _FILES_CACHE = None
+
+
+def get_files_cache():
+    return _FILES_CACHE
+
+
+@contextmanager
+def files_cache():
+    """Parse every file and fetch every remote file only once inside the block.
+
+    The cached documents are shared, so they should not be modified by their users.
+    """
+    if _FILES_CACHE is not None:
+        # already inside a cached run
+        yield _FILES_CACHE
+        return
+
+    try:
+        yield enable_files_cache()
+    finally:
+        disable_files_cache()
+
+
+def _fetch_remote_file(full_file_path, tag, session=requests):
+    """Fetch the file from github.
+
+    Returns:
+        tuple. (details, warning) - the loaded file ({} if it could not be fetched) and the warning to print if so.
+    """
     # 'origin/' prefix is used to compared with remote branches but it is not a part of the github url.
     tag = tag.lstrip('origin/')
 
     # The replace in the end is for Windows support
     github_path = os.path.join(CONTENT_GITHUB_LINK, tag, full_file_path).replace('\\', '/')
     try:
-        res = requests.get(github_path, verify=False)
+        res = session.get(github_path, verify=False)
         res.raise_for_status()
     except Exception as exc:
-        print_warning('Could not find the old entity file under "{}".\n'
-                      'please make sure that you did not break backward compatibility. '
-                      'Reason: {}'.format(github_path, exc))
-        return {}
+        return {}, 'Could not find the old entity file under "{}".\n' \
+                   'please make sure that you did not break backward compatibility. ' \
+                   'Reason: {}'.format(github_path, exc)
 
     if full_file_path.endswith('json'):
         details = json.loads(res.content)
     else:
         details = yaml.safe_load(res.content)
 
+    return details, None
+
+
+def get_remote_file(full_file_path, tag='master'):
+    key = (full_file_path, tag)
+    if _FILES_CACHE is not None and key in _FILES_CACHE['remote']:
+        details, warning = _FILES_CACHE['remote'][key]
+    else:
+        details, warning = _fetch_remote_file(full_file_path, tag)
+        if _FILES_CACHE is not None:
+            _FILES_CACHE['remote'][key] = details, warning
+
+    if warning:
+        print_warning(warning)
+
     return details
 
 
+def prefetch_remote_files(files_to_fetch, max_workers=8):
+    """Fetch the old versions of files concurrently into the files cache, instead of one by one by the validators.
+
+    Args:
+        files_to_fetch (list): (file path, tag) pairs.
+        max_workers (int): The maximal number of concurrent requests.
+    """
+    if _FILES_CACHE is None:
+        return
+
+    missing = sorted(set(key for key in files_to_fetch if key not in _FILES_CACHE['remote']))
+    if not missing:
+        return
+
+    session = requests.Session()
+
+    def fetch(key):
+        try:
+            return _fetch_remote_file(key[0], key[1], session)
+        except Exception:
+            # will be fetched again, and raise, by the validator using it
+            return None
+
+    pool = ThreadPool(min(max_workers, len(missing)))
+    try:
+        results = pool.map(fetch, missing)
+    finally:
+        pool.close()
+
+    for key, result in zip(missing, results):
+        if result is not None:
+            _FILES_CACHE['remote'][key] = result
+
+
 def filter_packagify_changes(modified_files, added_files, removed_files, tag='master'):
     """
     Mark scripts/integrations that were removed and added as modifiied.
@@ -151,16 +249,32 @@ def get_last_release_version():
     return tags[0]
 
 
+def load_file(method, file_path):
+    """Load the file with the given method, reusing the loaded document if the files cache is enabled"""
+    key = (method.__module__, method.__name__, os.path.abspath(os.path.expanduser(file_path)))
+    if _FILES_CACHE is not None and key in _FILES_CACHE['parsed']:
+        return _FILES_CACHE['parsed'][key]
+
+    with open(os.path.expanduser(file_path), "r") as f:
+        loaded_data = method(f)
+
+    if _FILES_CACHE is not None:
+        _FILES_CACHE['parsed'][key] = loaded_data
+
+    return loaded_data
+
+
 def get_file(method, file_path, type_of_file):
     data_dictionary = None
-    with open(os.path.expanduser(file_path), "r") as f:
-        if file_path.endswith(type_of_file):
-            try:
-                data_dictionary = method(f)
-            except Exception as e:
-                print_error(
-                    "{} has a structure issue of file type{}. Error was: {}".format(file_path, type_of_file, str(e)))
-                return []
+    if file_path.endswith(type_of_file):
+        try:
+            data_dictionary = load_file(method, file_path)
+        except EnvironmentError:
+            raise
+        except Exception as e:
+            print_error(
+                "{} has a structure issue of file type{}. Error was: {}".format(file_path, type_of_file, str(e)))
+            return []
     if type(data_dictionary) is dict:
         return data_dictionary
     return {}
@@ -1,8 +1,11 @@
 import os
 import threading
 import sys
+import re
 import json
+import hashlib
 import traceback
+from collections import OrderedDict
 
 if sys.version_info[0] < 3:
     import Queue as queue
@@ -16,6 +19,29 @@ win = sys.platform.startswith('win')
 if win:
     __input_queue = queue.Queue()
 
+# messages are read as bytes so length prefixed frames can be read exactly (python 2 stdin is already bytes)
+__stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+
+# a faster json backend is used for decoding server messages when it is installed,
+# DEMISTO_JSON_BACKEND can force a specific backend (orjson, ujson or json)
+fast_json = json
+for backend_name in [os.environ.get('DEMISTO_JSON_BACKEND') or 'orjson', 'ujson']:
+    if backend_name == 'json':
+        break
+    try:
+        fast_json = __import__(backend_name)
+        break
+    except ImportError:
+        pass
+
+
+def json_loads(data):
+    try:
+        return fast_json.loads(data)
+    except ValueError:
+        # fall back to the standard library for inputs the fast backend rejects (e.g. very big integers)
+        return json.loads(data)
+
 
 def read_input_loop():
     global __input_queue
@@ -26,6 +52,32 @@ def read_input_loop():
             break
 
 
+# A message from the server is either a single line or a length prefixed frame:
+# a header line '#<length>[,<context length>]' followed by exactly that many bytes of utf-8 encoded json.
+# When a context length is given, the payload is followed by the raw 'context' sub-document of the execution
+# context, which is only decoded when the script accesses it.
+# returns the message and the raw context (or None)
+def __readMessage():
+    if win:
+        # framing is not supported on windows, where stdin is read line by line in a separate thread
+        return __readWhileAvailable(), None
+
+    line = __stdin.readline()
+    if not line.startswith(b'#'):
+        return __decode(line), None
+
+    lengths = [int(length) for length in line[1:].split(b',')]
+    payload = __stdin.read(lengths[0])
+    raw_context = __stdin.read(lengths[1]) if len(lengths) > 1 else None
+    return __decode(payload), raw_context
+
+
+def __decode(data):
+    if sys.version_info[0] < 3:
+        return data
+    return data.decode('utf-8')
+
+
 def __readWhileAvailable():
     if win:
         # An ugly solution - just open a blocking thread to handle input
@@ -40,10 +92,7 @@ def __readWhileAvailable():
         buff += __input_queue.get()
         return buff
     else:
-        # Wait for the first char from stdin
-        buff = sys.stdin.readline()
-        # While available, read all the other chars
-        return buff
+        return __readMessage()[0]
 
 
 """Demisto instance for scripts only"""
@@ -69,17 +118,23 @@ class Demisto:
         sys.stdout.write('\\n')
         sys.stdout.flush()
 
+    def __callingContextDoc(self):
+        # the context sub-document may arrive undecoded (length prefixed frames), decode it on first access
+        if u'__rawContext' in self.callingContext:
+            self.callingContext[u'context'] = globals()['__json_loads'](self.callingContext.pop(u'__rawContext'))
+        return self.callingContext[u'context']
+
     def investigation(self):
-        return self.callingContext[u'context'][u'Inv']
+        return self.__callingContextDoc()[u'Inv']
 
     def incidents(self):
-        return self.callingContext[u'context'][u'Incidents']
+        return self.__callingContextDoc()[u'Incidents']
 
     def parentEntry(self):
-        return self.callingContext[u'context'][u'ParentEntry']
+        return self.__callingContextDoc()[u'ParentEntry']
 
     def context(self):
-        return self.callingContext[u'context'][u'ExecutionContext']
+        return self.__callingContextDoc()[u'ExecutionContext']
 
     def args(self):
         return self.callingContext.get(u'args', {})
@@ -115,6 +170,14 @@ class Demisto:
     def executeCommand(self, command, args):
         return self.__do({'type': 'executeCommand', 'command': command.strip(), 'args': args})
 
+    def executeCommandBatch(self, commands):
+        """ Execute several commands in a single round trip to the server.
+        commands is a list of {'command': <name>, 'args': <dict>}, the results are returned in the same order """
+        if not commands:
+            return []
+        return self.__do({'type': 'executeCommandBatch', 'commands': [
+            {'command': c['command'].strip(), 'args': c.get('args', {})} for c in commands]})
+
     def demistoUrls(self):
         return self.__do({'type': 'demistoUrls'})
 
@@ -161,7 +224,7 @@ class Demisto:
         data = globals()['__readWhileAvailable']()
         if data.find('$$##') > -1:
             raise ValueError(data[4:])
-        return json.loads(data)
+        return globals()['__json_loads'](data)
 
 
     def convert(self, results):
@@ -238,20 +301,26 @@ class Demisto:
         sys.stdout.write('\\n')
         sys.stdout.flush()
 
+    def __callingContextDoc(self):
+        # the context sub-document may arrive undecoded (length prefixed frames), decode it on first access
+        if u'__rawContext' in self.callingContext:
+            self.callingContext[u'context'] = globals()['__json_loads'](self.callingContext.pop(u'__rawContext'))
+        return self.callingContext[u'context']
+
     def investigation(self):
-        return self.callingContext[u'context'][u'Inv']
+        return self.__callingContextDoc()[u'Inv']
 
     def incidents(self):
-        return self.callingContext[u'context'][u'Incidents']
+        return self.__callingContextDoc()[u'Incidents']
 
     def parentEntry(self):
-        return self.callingContext[u'context'][u'ParentEntry']
+        return self.__callingContextDoc()[u'ParentEntry']
 
     def context(self):
-        return self.callingContext[u'context'][u'ExecutionContext']
+        return self.__callingContextDoc()[u'ExecutionContext']
 
     def integrationInstance(self):
-        return self.callingContext[u'context'][u'IntegrationInstance']
+        return self.__callingContextDoc()[u'IntegrationInstance']
 
     def args(self):
         return self.callingContext.get(u'args', {})
@@ -331,7 +400,7 @@ class Demisto:
         data = globals()['__readWhileAvailable']()
         if data.find('$$##') > -1:
             raise ValueError(data[4:])
-        return json.loads(data)
+        return globals()['__json_loads'](data)
 
     def __convert(self, results):
         """ Convert whatever result into entry """
@@ -388,6 +457,108 @@ print = demisto_print
 ###CODE_HERE###
 '''
 
+# max number of compiled scripts kept between executions (least recently used are evicted first)
+COMPILED_CODE_CACHE_SIZE = int(os.environ.get('DEMISTO_COMPILED_CODE_CACHE_SIZE', 32))
+
+compiled_code_cache = OrderedDict()
+compiled_code_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_code_hash(code_string, is_integ_script, with_template=True):
+    if not isinstance(code_string, bytes):
+        code_string = code_string.encode('utf-8')
+    prefix = 'integration' if is_integ_script else 'script'
+    if not with_template:
+        prefix += '-body'
+    return prefix + ':' + hashlib.sha256(code_string).hexdigest()
+
+
+# returns the compiled template + script code, compiling it only if it is not in the cache
+# with_template=False compiles the code as is (used for the body of warm scripts)
+def get_compiled_code(code_string, is_integ_script, with_template=True):
+    code_hash = get_code_hash(code_string, is_integ_script, with_template)
+    code = compiled_code_cache.pop(code_hash, None)
+    if code is not None:
+        compiled_code_cache_stats['hits'] += 1
+    else:
+        compiled_code_cache_stats['misses'] += 1
+        if not with_template:
+            complete_code = code_string
+        elif is_integ_script:
+            complete_code = integ_template_code.replace('###CODE_HERE###', code_string)
+        else:
+            complete_code = template_code.replace('###CODE_HERE###', code_string)
+        code = compile(complete_code, '<string>', 'exec')
+
+    # re-insert so the entry becomes the most recently used one
+    compiled_code_cache[code_hash] = code
+    while len(compiled_code_cache) > max(COMPILED_CODE_CACHE_SIZE, 0):
+        compiled_code_cache.popitem(last=False)
+
+    return code
+
+
+# Warm execution mode:
+# a script opts in by placing a ###WARM_INIT_END### line in its code. Everything above the line (imports, model
+# loading, module level setup) is the init section, which runs once per container process for the same code.
+# The globals left by the init section are snapshotted and every following execution of the same code only runs
+# the rest of the script in these globals, with a new demisto object bound to the current context.
+WARM_INIT_END_REGEX = re.compile(r'^###WARM_INIT_END###[ \t]*$', re.MULTILINE)
+
+# max number of warm scripts whose initialized globals are kept (least recently used are evicted first)
+WARM_STATE_CACHE_SIZE = int(os.environ.get('DEMISTO_WARM_STATE_CACHE_SIZE', 4))
+
+warm_states = OrderedDict()
+warm_state_stats = {'hits': 0, 'misses': 0}
+
+rebind_demisto_code = compile('demisto = Demisto(context)\n', '<string>', 'exec')
+
+
+def new_sub_globals(context_json):
+    return {
+        '__readWhileAvailable': __readWhileAvailable,
+        '__json_loads': json_loads,
+        'context': context_json,
+        'win': win
+    }
+
+
+# splits the script code to its init section and body, returns None as the init section if warm mode is not used
+def split_warm_init(code_string, is_integ_script):
+    match = WARM_INIT_END_REGEX.search(code_string)
+    if not match:
+        return None, code_string
+
+    init_code = code_string[:match.start()]
+    template = integ_template_code if is_integ_script else template_code
+    # pad the body so line numbers in tracebacks match the complete code
+    lines_before_body = template.split('###CODE_HERE###')[0].count('\n') + code_string[:match.end()].count('\n')
+    body_code = '\n' * lines_before_body + code_string[match.end():]
+    return init_code, body_code
+
+
+# returns the (globals, snapshot) warm state of the script, running its init section if it has no state yet
+def get_warm_state(code_string, init_code, is_integ_script, context_json):
+    code_hash = get_code_hash(code_string, is_integ_script)
+    state = warm_states.pop(code_hash, None)
+    if state is not None:
+        warm_state_stats['hits'] += 1
+        sub_globals = state[0]
+        sub_globals['context'] = context_json
+        exec(rebind_demisto_code, sub_globals, sub_globals)  # guardrails-disable-line
+    else:
+        warm_state_stats['misses'] += 1
+        sub_globals = new_sub_globals(context_json)
+        exec(get_compiled_code(init_code, is_integ_script), sub_globals, sub_globals)  # guardrails-disable-line
+        state = (sub_globals, dict(sub_globals))
+
+    warm_states[code_hash] = state
+    while len(warm_states) > max(WARM_STATE_CACHE_SIZE, 0):
+        warm_states.popitem(last=False)
+
+    return state
+
+
 # rollback file system to its previous state
 # delete home dir and tmp dir
 
@@ -395,7 +566,19 @@ print = demisto_print
 # notifies demisto server that the current executed script is completed
 # and the process is ready to execute the next script
 def send_script_completed():
-    json.dump({'type': 'completed'}, sys.stdout)
+    json.dump({
+        'type': 'completed',
+        'compiledCodeCache': {
+            'hits': compiled_code_cache_stats['hits'],
+            'misses': compiled_code_cache_stats['misses'],
+            'size': len(compiled_code_cache)
+        },
+        'warmState': {
+            'hits': warm_state_stats['hits'],
+            'misses': warm_state_stats['misses'],
+            'size': len(warm_states)
+        }
+    }, sys.stdout)
     sys.stdout.write('\\n')
     sys.stdout.flush()
 
@@ -417,14 +600,14 @@ def send_pong():
 
 
 # receives ping and sends back pong until we get something else
-# the the function stopped and returns the received string
+# the the function stopped and returns the received string and raw context
 def do_ping_pong():
     while True:
-        ping = __readWhileAvailable()
+        ping, raw_context = __readMessage()
         if ping == 'ping\n':
             send_pong()  # return pong to server to indicate that everything is fine
         else:
-            return ping
+            return ping, raw_context
 
 
 backup_env_vars = {}
@@ -432,38 +615,43 @@ for key in os.environ.keys():
     backup_env_vars[key] = os.environ[key]
 
 
-def rollback_system():
+def rollback_system(warm_state=None):
     os.environ = {}
     for key in backup_env_vars.keys():
         os.environ[key] = backup_env_vars[key]
 
+    # warm scripts keep the globals created by their init section, only the per-call state is dropped
+    if warm_state:
+        sub_globals, snapshot = warm_state
+        sub_globals.clear()
+        sub_globals.update(snapshot)
+
 
 while True:
-    contextString = do_ping_pong()
+    contextString, rawContext = do_ping_pong()
     if contextString == '':
         # finish executing python
         break
 
-    contextJSON = json.loads(contextString)
+    contextJSON = json_loads(contextString)
+    if rawContext is not None:
+        contextJSON['__rawContext'] = rawContext
 
     code_string = contextJSON['script']
     contextJSON.pop('script', None)
 
     is_integ_script = contextJSON['integration']
-    complete_code = ''
-    if is_integ_script:
-        complete_code = integ_template_code.replace('###CODE_HERE###', code_string)
-    else:
-        complete_code = template_code.replace('###CODE_HERE###', code_string)
+    warm_state = None
 
     try:
-        code = compile(complete_code, '<string>', 'exec')
-
-        sub_globals = {
-            '__readWhileAvailable': __readWhileAvailable,
-            'context': contextJSON,
-            'win': win
-        }
+        init_code, body_code = split_warm_init(code_string, is_integ_script)
+        if init_code is None:
+            code = get_compiled_code(code_string, is_integ_script)
+            sub_globals = new_sub_globals(contextJSON)
+        else:
+            warm_state = get_warm_state(code_string, init_code, is_integ_script, contextJSON)
+            code = get_compiled_code(body_code, is_integ_script, with_template=False)
+            sub_globals = warm_state[0]
 
         exec(code, sub_globals, sub_globals)  # guardrails-disable-line
 
@@ -474,7 +662,7 @@ while True:
         # print 'Will not stop on sys.exit(0)'
         pass
 
-    rollback_system()
+    rollback_system(warm_state)
 
     # ping back to Demisto server that script is completed
     send_script_completed()
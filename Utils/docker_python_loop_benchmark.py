@@ -0,0 +1,80 @@
+"""Micro-benchmark of the docker python loop stdin protocol on large execution contexts.
+
+Runs the loop in a sub process and measures how many executions per second it completes when the server sends:
+ - line: a single json line per execution, decoded with the standard library
+ - line-fast: a single json line per execution, decoded with the fastest installed json backend
+ - framed-lazy: a length prefixed frame with the context sub-document sent separately, which is never decoded
+   because the benchmarked script does not access it
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+LOOP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_script_docker_python_loop.py')
+
+SCRIPT = 'demisto.results("ok")'
+
+
+def create_context(size_mb):
+    """Creates an execution context document of about size_mb megabytes"""
+    entry = {
+        'id': '1@1',
+        'type': 1,
+        'contents': 'x' * 512,
+        'labels': [{'type': 'Email/from', 'value': 'user@example.com'}] * 4,
+        'tags': ['phishing', 'benchmark'],
+    }
+    entry_size = len(json.dumps(entry))
+    return {
+        'Inv': {'id': '1', 'entries': [entry] * max(int(size_mb * 1024 * 1024 / entry_size), 1)},
+        'Incidents': [],
+        'ParentEntry': {},
+        'ExecutionContext': {'key': 'value'},
+    }
+
+
+def encode_executions(context, executions, framed):
+    message = {'script': SCRIPT, 'integration': False, 'native': False, 'args': {}}
+    if not framed:
+        message['context'] = context
+        return (json.dumps(message) + '\n').encode('utf-8') * executions
+
+    payload = json.dumps(message).encode('utf-8')
+    raw_context = json.dumps(context).encode('utf-8')
+    header = '#{},{}\n'.format(len(payload), len(raw_context)).encode('utf-8')
+    return (header + payload + raw_context) * executions
+
+
+def run_mode(stdin_data, executions, json_backend):
+    env = dict(os.environ, DEMISTO_JSON_BACKEND=json_backend)
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, LOOP_PATH], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+    out, _ = proc.communicate(stdin_data)
+    duration = time.time() - start
+    completed = out.count(b'"type": "completed"')
+    if completed != executions:
+        raise RuntimeError('expected {} completed executions but got {}'.format(executions, completed))
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the docker python loop protocol on large contexts')
+    parser.add_argument('-s', '--sizes', default='1,5,20', help='Comma separated context sizes in MB')
+    parser.add_argument('-n', '--executions', type=int, default=20, help='Executions per measurement')
+    options = parser.parse_args()
+
+    modes = [('line', False, 'json'), ('line-fast', False, 'orjson'), ('framed-lazy', True, 'orjson')]
+    print('{:>10} {:>12} {:>10} {:>14}'.format('context MB', 'mode', 'seconds', 'executions/s'))
+    for size in [float(s) for s in options.sizes.split(',')]:
+        context = create_context(size)
+        for mode_name, framed, json_backend in modes:
+            stdin_data = encode_executions(context, options.executions, framed)
+            duration = run_mode(stdin_data, options.executions, json_backend)
+            print('{:>10} {:>12} {:>10.3f} {:>14.1f}'.format(size, mode_name, duration, options.executions / duration))
+
+
+if __name__ == '__main__':
+    main()
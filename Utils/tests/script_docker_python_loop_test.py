@@ -0,0 +1,185 @@
+import json
+import os
+import subprocess
+import sys
+
+LOOP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '_script_docker_python_loop.py')
+
+
+def run_loop(contexts, env=None):
+    """Feeds the given execution contexts to the docker python loop and returns the messages it sent back"""
+    stdin = ''.join(c if isinstance(c, str) else json.dumps(c) + '\n' for c in contexts)
+    process_env = dict(os.environ, **(env or {}))
+    proc = subprocess.Popen([sys.executable, LOOP_PATH], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            env=process_env, universal_newlines=True)
+    out, _ = proc.communicate(stdin, timeout=60)
+
+    messages = []
+    decoder = json.JSONDecoder()
+    idx = 0
+    while idx < len(out):
+        # the loop terminates its own messages with a literal '\n', scripts with a real new line
+        if out[idx].isspace():
+            idx += 1
+        elif out.startswith('\\n', idx):
+            idx += 2
+        else:
+            message, idx = decoder.raw_decode(out, idx)
+            messages.append(message)
+    return messages
+
+
+def framed(message, raw_context=None):
+    """Encodes a message as a length prefixed frame (ascii only, so lengths in chars and bytes are the same)"""
+    payload = json.dumps(message)
+    if raw_context is None:
+        return '#{}\n{}'.format(len(payload), payload)
+    context_payload = json.dumps(raw_context)
+    return '#{},{}\n{}{}'.format(len(payload), len(context_payload), payload, context_payload)
+
+
+def script_context(script, integration=False):
+    return {'script': script, 'integration': integration, 'native': False, 'args': {}}
+
+
+def completed_messages(messages):
+    return [m for m in messages if m['type'] == 'completed']
+
+
+def test_compiled_code_cache_hits_on_same_script():
+    messages = run_loop([script_context('demisto.results(1)'), script_context('demisto.results(1)')])
+
+    results = [m for m in messages if m['type'] == 'result']
+    assert len(results) == 2
+    completed = completed_messages(messages)
+    assert completed[0]['compiledCodeCache'] == {'hits': 0, 'misses': 1, 'size': 1}
+    assert completed[1]['compiledCodeCache'] == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_compiled_code_cache_separates_templates():
+    messages = run_loop([script_context('demisto.results(1)'), script_context('demisto.results(1)', integration=True)])
+
+    completed = completed_messages(messages)
+    assert completed[1]['compiledCodeCache'] == {'hits': 0, 'misses': 2, 'size': 2}
+
+
+def test_compiled_code_cache_evicts_least_recently_used():
+    contexts = [script_context('demisto.results(1)'), script_context('demisto.results(2)'),
+                script_context('demisto.results(1)'), script_context('demisto.results(3)'),
+                script_context('demisto.results(2)')]
+    messages = run_loop(contexts, env={'DEMISTO_COMPILED_CODE_CACHE_SIZE': '2'})
+
+    stats = [m['compiledCodeCache'] for m in completed_messages(messages)]
+    assert [s['hits'] for s in stats] == [0, 0, 1, 1, 1]
+    assert stats[-1] == {'hits': 1, 'misses': 4, 'size': 2}
+
+
+def test_compile_error_is_reported_and_not_cached():
+    messages = run_loop([script_context('demisto.results(')])
+
+    assert messages[0]['type'] == 'exception'
+    assert completed_messages(messages)[0]['compiledCodeCache']['size'] == 0
+
+
+WARM_SCRIPT = '''
+init_runs = []
+init_runs.append(1)
+
+
+def get_value():
+    return demisto.args()['value']
+###WARM_INIT_END###
+leaked = 'per_call' in globals()
+per_call = True
+demisto.results({'value': get_value(), 'init_runs': len(init_runs), 'leaked': leaked})
+'''
+
+
+def warm_context(value, script=WARM_SCRIPT):
+    context = script_context(script)
+    context['args'] = {'value': value}
+    return context
+
+
+def test_warm_mode_runs_init_once_and_resets_call_state():
+    messages = run_loop([warm_context('a'), warm_context('b'), warm_context('c')])
+
+    results = [json.loads(m['results'][0]['Contents']) for m in messages if m['type'] == 'result']
+    assert results == [
+        {'value': 'a', 'init_runs': 1, 'leaked': False},
+        {'value': 'b', 'init_runs': 1, 'leaked': False},
+        {'value': 'c', 'init_runs': 1, 'leaked': False},
+    ]
+    stats = [m['warmState'] for m in completed_messages(messages)]
+    assert stats[-1] == {'hits': 2, 'misses': 1, 'size': 1}
+
+
+def test_warm_mode_keeps_body_line_numbers():
+    script = 'x = 1\n###WARM_INIT_END###\n\nraise ValueError("boom")\n'
+    messages = run_loop([warm_context('a', script=script)])
+
+    exception = ''.join(messages[0]['args']['exception'])
+    cold_messages = run_loop([script_context(script.replace('###WARM_INIT_END###', '# no warm init'))])
+    cold_exception = ''.join(cold_messages[0]['args']['exception'])
+    assert 'ValueError: boom' in exception
+    assert exception.splitlines()[-2] == cold_exception.splitlines()[-2]
+
+
+def test_warm_mode_failed_init_is_not_kept():
+    script = 'raise ValueError("init failed")\n###WARM_INIT_END###\ndemisto.results(1)\n'
+    messages = run_loop([warm_context('a', script=script), warm_context('a', script=script)])
+
+    assert [m['type'] for m in messages if m['type'] != 'completed'] == ['exception', 'exception']
+    assert completed_messages(messages)[-1]['warmState'] == {'hits': 0, 'misses': 2, 'size': 0}
+
+
+def test_execute_command_batch_single_round_trip():
+    script = '''
+res = demisto.executeCommandBatch([
+    {'command': 'createNewIndicator', 'args': {'value': '1.1.1.1'}},
+    {'command': ' createNewIndicator ', 'args': {'value': '2.2.2.2'}},
+])
+demisto.results({'res': res})
+'''
+    server_response = [[{'Contents': 'first'}], [{'Contents': 'second'}]]
+    messages = run_loop([script_context(script), server_response])
+
+    assert messages[0] == {'type': 'executeCommandBatch', 'commands': [
+        {'command': 'createNewIndicator', 'args': {'value': '1.1.1.1'}},
+        {'command': 'createNewIndicator', 'args': {'value': '2.2.2.2'}},
+    ]}
+    assert json.loads(messages[1]['results'][0]['Contents']) == {'res': server_response}
+
+
+def test_framed_messages():
+    script = 'demisto.results(demisto.executeCommand("getIncidents", {}))'
+    server_response = [{'Contents': 'multi\nline', 'ContentsFormat': 'text'}]
+    messages = run_loop([framed(script_context(script)), framed(server_response), 'ping\n',
+                         framed(script_context('demisto.results(2)'))])
+
+    assert messages[0]['command'] == 'getIncidents'
+    assert messages[1]['results'] == server_response
+    assert messages[3]['type'] == 'pong'
+    assert messages[4]['results'][0]['Contents'] == '2'
+
+
+def test_framed_context_is_decoded_lazily():
+    script = """
+before = 'context' in demisto.callingContext
+execution_context = demisto.context()
+demisto.results({'before': before, 'after': 'context' in demisto.callingContext, 'ctx': execution_context,
+                 'inv': demisto.investigation()})
+"""
+    raw_context = {'ExecutionContext': {'key': 'value'}, 'Inv': {'id': '7'}}
+    messages = run_loop([framed(script_context(script), raw_context),
+                         framed(script_context('demisto.results(1)'), raw_context)])
+
+    assert json.loads(messages[0]['results'][0]['Contents']) == {
+        'before': False, 'after': True, 'ctx': {'key': 'value'}, 'inv': {'id': '7'}}
+    assert messages[2]['results'][0]['Contents'] == '1'
+
+
+def test_stdlib_json_backend():
+    messages = run_loop([script_context('demisto.results(1)')], env={'DEMISTO_JSON_BACKEND': 'json'})
+
+    assert messages[0]['results'][0]['Contents'] == '1'
@@ -2,16 +2,21 @@ import os
 import sys
 import json
 import glob
+import time
 import shutil
 import zipfile
+import argparse
 import io
 import yaml
+from contextlib import contextmanager
+from multiprocessing import Pool, cpu_count
 
 from Tests.scripts.constants import INTEGRATIONS_DIR, MISC_DIR, PLAYBOOKS_DIR, REPORTS_DIR, DASHBOARDS_DIR, \
     WIDGETS_DIR, SCRIPTS_DIR, INCIDENT_FIELDS_DIR, CLASSIFIERS_DIR, LAYOUTS_DIR, CONNECTIONS_DIR, \
     BETA_INTEGRATIONS_DIR, INDICATOR_FIELDS_DIR, INCIDENT_TYPES_DIR, TEST_PLAYBOOKS_DIR
 from Tests.test_utils import print_error
-from package_creator import DIR_TO_PREFIX, merge_script_package_to_yml, write_yaml_with_docker
+from package_creator import DIR_TO_PREFIX, merge_script_package_to_yml, write_yaml_with_docker, \
+    merge_script_package, get_yaml_with_docker, prune_merge_cache
 
 CONTENT_DIRS = [
     BETA_INTEGRATIONS_DIR,
@@ -42,6 +47,8 @@ BUNDLE_TEST = 'bundle_test'
 # zip files names (the extension will be added later - shutil demands file name without extension)
 ZIP_POST = 'content_new'
 ZIP_TEST = 'content_test'
+# merged packages, reused while the package files did not change
+MERGE_CACHE_DIR = './Tests/package_merge_cache'
 
 # server can't handle long file names
 MAX_FILE_NAME = 85
@@ -50,13 +57,16 @@ LONG_FILE_NAMES = []
 
 def add_tools_to_bundle(bundle):
     for directory in glob.glob(os.path.join('Tools', '*')):
-        zipf = zipfile.ZipFile(os.path.join(bundle, f'tools-{os.path.basename(directory)}.zip'), 'w',
-                               zipfile.ZIP_DEFLATED)
-        zipf.comment = b'{ "system": true }'
-        for root, _, files in os.walk(directory):
-            for file in files:
-                zipf.write(os.path.join(root, file), file)
-        zipf.close()
+        write_tools_zip(os.path.join(bundle, f'tools-{os.path.basename(directory)}.zip'), directory)
+
+
+def write_tools_zip(zip_file, directory):
+    zipf = zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED)
+    zipf.comment = b'{ "system": true }'
+    for root, _, files in os.walk(directory):
+        for file in files:
+            zipf.write(os.path.join(root, file), file)
+    zipf.close()
 
 
 # modify incident fields file to contain only `incidentFields` field (array)
@@ -73,15 +83,22 @@ def convert_incident_fields_to_array():
                 file_.truncate()
 
 
-def copy_yaml_post(path, out_path, yml_info):
+def is_script_yaml(path):
     dirname = os.path.dirname(path)
-    if dirname in DIR_TO_PREFIX.keys() and not os.path.basename(path).startswith('playbook-'):
-        script_obj = yml_info
-        if dirname != 'Scripts':
-            script_obj = yml_info['script']
+    return dirname in DIR_TO_PREFIX.keys() and not os.path.basename(path).startswith('playbook-')
+
+
+def get_script_obj(path, yml_info):
+    if os.path.dirname(path) != 'Scripts':
+        return yml_info['script']
+    return yml_info
+
+
+def copy_yaml_post(path, out_path, yml_info):
+    if is_script_yaml(path):
         with io.open(path, mode='r', encoding='utf-8') as file_:
             yml_text = file_.read()
-        out_map = write_yaml_with_docker(out_path, yml_text, yml_info, script_obj)
+        out_map = write_yaml_with_docker(out_path, yml_text, yml_info, get_script_obj(path, yml_info))
         if len(out_map.keys()) > 1:
             print(" - yaml generated multiple files: {}".format(out_map.keys()))
         return
@@ -146,8 +163,162 @@ def copy_test_files(bundle_test):
             shutil.copyfile(path, os.path.join(bundle_test, os.path.basename(path)))
 
 
-def main(circle_artifacts):
+@contextmanager
+def stage_timer(stage_name):
+    start = time.time()
+    yield
+    print(f'{stage_name} took {time.time() - start:.2f} seconds')
+
+
+def get_package_entries(package_dir, package, merge_cache_dir):
+    """Merge a package in a worker, returning the bundle it goes to and its (file name, text) entries"""
+    output_map = merge_script_package(package, package_dir, cache_dir=merge_cache_dir)[0]
+    is_skipped = any(package_to_skip in package for package_to_skip in PACKAGES_TO_SKIP)
+    entries = [(os.path.basename(output_path), text) for output_path, text in output_map.items()]
+    return BUNDLE_TEST if is_skipped else BUNDLE_POST, entries, []
+
+
+def get_yaml_post_entries(path):
+    """Prepare a content yml in a worker, returning its bundle, (file name, text) entries and too long file names"""
+    with io.open(path, mode='r', encoding='utf-8') as file_:
+        yml_text = file_.read()
+    yml_info = yaml.safe_load(yml_text)
+    long_file_names = [path] if len(os.path.basename(path)) >= MAX_FILE_NAME else []
+    if not is_script_yaml(path):
+        return BUNDLE_POST, [(os.path.basename(path), yml_text)], long_file_names
+
+    out_map = get_yaml_with_docker(os.path.basename(path), yml_text, yml_info, get_script_obj(path, yml_info))
+    if len(out_map.keys()) > 1:
+        print(" - yaml generated multiple files: {}".format(out_map.keys()))
+    return BUNDLE_POST, list(out_map.items()), long_file_names
+
+
+def get_bundle_entries(task):
+    task_type, args = task
+    if task_type == 'package':
+        return get_package_entries(*args)
+    return get_yaml_post_entries(*args)
+
+
+class BundleZip:
+    """Zip file written one entry at a time, failing on entries with the same file name"""
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED)
+        self.file_names = set()
+
+    def add_file_name(self, file_name):
+        if file_name in self.file_names:
+            raise NameError(f'Failed while trying to add {file_name} to {self.zip_path}. File already exists.')
+        self.file_names.add(file_name)
+
+    def write(self, path, file_name):
+        self.add_file_name(file_name)
+        self.zipf.write(path, file_name)
+
+    def writestr(self, file_name, data):
+        self.add_file_name(file_name)
+        self.zipf.writestr(file_name, data)
+
+    def close(self):
+        self.zipf.close()
+
+
+def write_json_entries(dir_name, bundle_zip):
+    for path in glob.glob(os.path.join(dir_name, '*.json')):
+        dpath = os.path.basename(path)
+        # this part is a workaround because server doesn't support indicatorfield-*.json naming
+        if dir_name == 'IndicatorFields':
+            dpath = dpath.replace('incidentfield-', 'incidentfield-indicatorfield-')
+
+        if len(dpath) >= MAX_FILE_NAME:
+            LONG_FILE_NAMES.append(os.path.basename(dpath))
+
+        if dir_name == INCIDENT_FIELDS_DIR:
+            # same as convert_incident_fields_to_array, without modifying the file in the repo
+            with open(path, 'r') as file_:
+                data = json.load(file_)
+            incident_fields = data.get('incidentFields')
+            if incident_fields is not None:
+                bundle_zip.writestr(dpath, json.dumps(incident_fields, indent=2))
+                continue
+
+        bundle_zip.write(path, dpath)
+
+
+def stream_bundles(circle_artifacts, workers, merge_cache_dir=MERGE_CACHE_DIR):
+    """Create the content zips without bundle directories.
+
+    The packages and content ymls are prepared in a pool of workers, each result is written directly to the zip of
+    its bundle, in the same order as the files are copied to the bundle directories by main.
+    """
+    print(f'Starting to create content artifact with {workers} workers...')
+    start_time = time.time()
+    tasks = [('package', (package_dir, package, merge_cache_dir)) for package_dir in DIR_TO_PREFIX
+             for package in glob.glob(os.path.join(package_dir, '*/'))]
+    tasks += [('yml', (path,)) for content_dir in CONTENT_DIRS
+              for path in glob.glob(os.path.join(content_dir, '*.yml'))]
+
+    bundle_zips = {
+        BUNDLE_POST: BundleZip(ZIP_POST + '.zip'),
+        BUNDLE_TEST: BundleZip(ZIP_TEST + '.zip'),
+    }
+    pool = Pool(workers)
+    try:
+        # the workers start preparing the ymls while the rest of the files are written
+        results = pool.imap(get_bundle_entries, tasks, chunksize=8)
+
+        with stage_timer('Adding tools'):
+            for directory in glob.glob(os.path.join('Tools', '*')):
+                tools_zip = io.BytesIO()
+                write_tools_zip(tools_zip, directory)
+                bundle_zips[BUNDLE_POST].writestr(f'tools-{os.path.basename(directory)}.zip', tools_zip.getvalue())
+
+        with stage_timer('Adding json files'):
+            for content_dir in CONTENT_DIRS:
+                write_json_entries(content_dir, bundle_zips[BUNDLE_POST])
+
+        with stage_timer(f'Merging packages and adding {len(tasks)} yml files'):
+            for bundle, entries, long_file_names in results:
+                LONG_FILE_NAMES.extend(long_file_names)
+                for file_name, text in entries:
+                    bundle_zips[bundle].writestr(file_name, text)
+    finally:
+        pool.close()
+        pool.join()
+
+    with stage_timer('Adding test files'):
+        for path in glob.glob(os.path.join(TEST_PLAYBOOKS_DIR, '*')):
+            test_paths = glob.glob(os.path.join(path, '*')) if os.path.isdir(path) else [path]
+            for test_path in test_paths:
+                bundle_zips[BUNDLE_TEST].write(test_path, os.path.basename(test_path))
+
+    for bundle_zip in bundle_zips.values():
+        bundle_zip.write('content-descriptor.json', 'content-descriptor.json')
+    bundle_zips[BUNDLE_POST].write('./Documentation/doc-CommonServer.json', 'doc-CommonServer.json')
+
+    with stage_timer('Closing zips and copying artifacts'):
+        for bundle_zip in bundle_zips.values():
+            bundle_zip.close()
+            shutil.copyfile(bundle_zip.zip_path, os.path.join(circle_artifacts, bundle_zip.zip_path))
+        shutil.copyfile("./Tests/id_set.json", os.path.join(circle_artifacts, "id_set.json"))
+        shutil.copyfile('release-notes.md', os.path.join(circle_artifacts, 'release-notes.md'))
+
+    if merge_cache_dir:
+        remove_unused_merges(merge_cache_dir, start_time)
+    print(f'finished create content artifact at {circle_artifacts}')
+
+
+def remove_unused_merges(merge_cache_dir, start_time):
+    # one second margin for file systems with a coarse modification time
+    pruned = prune_merge_cache(merge_cache_dir, start_time - 1)
+    print(f'Removed {pruned} unused merges from {merge_cache_dir}')
+
+
+def main(circle_artifacts, merge_cache_dir=MERGE_CACHE_DIR):
     print('Starting to create content artifact...')
+    start_time = time.time()
 
     print('creating dir for bundles...')
     for bundle_dir in [BUNDLE_POST, BUNDLE_TEST]:
@@ -163,10 +334,10 @@ def main(circle_artifacts):
             if any(package_to_skip in package for package_to_skip in PACKAGES_TO_SKIP):
                 # there are some packages that we don't want to include in the content zip
                 # for example HelloWorld integration
-                merge_script_package_to_yml(package, package_dir, BUNDLE_TEST)
+                merge_script_package_to_yml(package, package_dir, BUNDLE_TEST, merge_cache_dir)
                 print('skipping {}'.format(package))
             else:
-                merge_script_package_to_yml(package, package_dir, BUNDLE_POST)
+                merge_script_package_to_yml(package, package_dir, BUNDLE_POST, merge_cache_dir)
 
     for content_dir in CONTENT_DIRS:
         print(f'Copying dir {content_dir} to bundles...')
@@ -190,11 +361,29 @@ def main(circle_artifacts):
 
     shutil.copyfile('release-notes.md', os.path.join(circle_artifacts, 'release-notes.md'))
 
+    if merge_cache_dir:
+        remove_unused_merges(merge_cache_dir, start_time)
     print(f'finished create content artifact at {circle_artifacts}')
 
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Create the content zips and copy them to the artifacts directory')
+    parser.add_argument('circle_artifacts', help='Artifacts directory path')
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='Write the files directly to the zips, preparing them in a pool of workers')
+    parser.add_argument('-w', '--workers', type=int, default=cpu_count(), help='Number of workers for --stream')
+    parser.add_argument('--no-cache', action='store_true', help='Merge all the packages, without the merge cache')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    main(sys.argv[1])
+    options = parse_arguments()
+    merge_cache_dir = None if options.no_cache else MERGE_CACHE_DIR
+    if options.stream:
+        with stage_timer('Creating content artifact'):
+            stream_bundles(options.circle_artifacts, options.workers, merge_cache_dir)
+    else:
+        main(options.circle_artifacts, merge_cache_dir)
     if LONG_FILE_NAMES:
         print_error(f'The following files exceeded to file name length limit of {MAX_FILE_NAME}:\n'
                     f'{json.dumps(LONG_FILE_NAMES, indent=4)}')
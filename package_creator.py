@@ -3,8 +3,10 @@ from __future__ import print_function
 import os
 import io
 import sys
+import json
 import glob
 import base64
+import hashlib
 import argparse
 import re
 import yaml
@@ -27,12 +29,34 @@ TYPE_TO_EXTENSION = {
 
 IMAGE_PREFIX = 'data:image/png;base64,'
 
+# hash of this module, merges cached before it changed are not used
+_MODULE_HASH = None
+
 
 def write_yaml_with_docker(output_path, yml_text, yml_data, script_obj):
     """Write out the yaml file taking into account the dockerimage45 tag.
     If it is present will create 2 integration files
     One for 4.5 and below and one for 5.0.
 
+    Arguments:
+        output_path {str} -- output path
+        yml_text {str} -- yml text
+        yml_data {dict} -- yml object
+        script_obj {dict} -- script object
+
+    Returns:
+        dict -- dictionary mapping output path to text data
+    """
+    output_map = get_yaml_with_docker(output_path, yml_text, yml_data, script_obj)
+    write_output_map(output_map)
+    return output_map
+
+
+def get_yaml_with_docker(output_path, yml_text, yml_data, script_obj):
+    """Get the yaml files texts taking into account the dockerimage45 tag, without writing them.
+    If it is present will create 2 integration files
+    One for 4.5 and below and one for 5.0.
+
     Arguments:
         output_path {str} -- output path
         yml_text {str} -- yml text
@@ -71,34 +95,138 @@ def write_yaml_with_docker(output_path, yml_text, yml_data, script_obj):
             output_path: yml_text,
             output_path45: yml_text45
         }
+    return output_map
+
+
+def write_output_map(output_map):
     for file_path, file_text in output_map.items():
         if IS_CI and os.path.isfile(file_path):
             raise ValueError('Output file already exists: {}.'
                              ' Make sure to remove this file from source control'
-                             ' or rename this package (for example if it is a v2).'.format(output_path))
+                             ' or rename this package (for example if it is a v2).'.format(file_path))
         with io.open(file_path, mode='w', encoding='utf-8') as file_:
             file_.write(file_text)
-    return output_map
 
 
-def merge_script_package_to_yml(package_path, dir_name, dest_path=""):
+def merge_script_package_to_yml(package_path, dir_name, dest_path="", cache_dir=None):
     """Merge the various components to create an output yml file
 
     Args:
         package_path (str): Directory containing the various files
         dir_name (str): Parent directory containing package (Scripts/Integrations)
         dest_path (str, optional): Defaults to "". Destination output
+        cache_dir (str, optional): Defaults to None. Directory of the merge cache, see merge_script_package
 
     Returns:
         output path, script path, image path
     """
-    print("Merging package: {}".format(package_path))
+    output_map, yml_path, script_path, image_path, desc_path = merge_script_package(package_path, dir_name, dest_path,
+                                                                                    cache_dir)
+    write_output_map(output_map)
+    return list(output_map.keys()), yml_path, script_path, image_path, desc_path
+
+
+def merge_script_package(package_path, dir_name, dest_path="", cache_dir=None):
+    """Merge the various components of the package to output yml texts, without writing them
+
+    Args:
+        package_path (str): Directory containing the various files
+        dir_name (str): Parent directory containing package (Scripts/Integrations)
+        dest_path (str, optional): Defaults to "". Destination output
+        cache_dir (str, optional): Defaults to None. Directory of the merge cache, when given the merge is reused
+            as long as the package files did not change
+
+    Returns:
+        dictionary mapping output path to text data, yml path, script path, image path, description path
+    """
     output_filename = '{}-{}.yml'.format(DIR_TO_PREFIX[dir_name], os.path.basename(os.path.dirname(package_path)))
     if dest_path:
         output_path = os.path.join(dest_path, output_filename)
     else:
         output_path = os.path.join(dir_name, output_filename)
 
+    if not cache_dir:
+        print("Merging package: {}".format(package_path))
+        return merge_package_files(package_path, dir_name, output_path)
+
+    cache_key = get_merge_cache_key(package_path, dir_name, output_filename)
+    cached_merge = load_cached_merge(cache_dir, cache_key)
+    if cached_merge:
+        print("Using cached merge of package: {}".format(package_path))
+        output_dir = os.path.dirname(output_path)
+        output_map = {os.path.join(output_dir, file_name): text for file_name, text in cached_merge['outputs']}
+        return (output_map, cached_merge['yml_path'], cached_merge['script_path'], cached_merge['image_path'],
+                cached_merge['desc_path'])
+
+    print("Merging package: {}".format(package_path))
+    output_map, yml_path, script_path, image_path, desc_path = merge_package_files(package_path, dir_name, output_path)
+    save_cached_merge(cache_dir, cache_key, {
+        'outputs': [(os.path.basename(path), text) for path, text in output_map.items()],
+        'yml_path': yml_path,
+        'script_path': script_path,
+        'image_path': image_path,
+        'desc_path': desc_path,
+    })
+    return output_map, yml_path, script_path, image_path, desc_path
+
+
+def get_merge_cache_key(package_path, dir_name, output_filename):
+    """Hash of everything the merge depends on - the package files, its output file name and this module"""
+    global _MODULE_HASH
+    if _MODULE_HASH is None:
+        with open(os.path.splitext(os.path.abspath(__file__))[0] + '.py', 'rb') as module_file:
+            _MODULE_HASH = hashlib.sha1(module_file.read()).hexdigest()
+
+    sha1 = hashlib.sha1()
+    sha1.update(u'{}\0{}\0{}\0{}\0'.format(_MODULE_HASH, package_path, dir_name, output_filename).encode('utf-8'))
+    for path in sorted(path for path in glob.glob(package_path + '*') if os.path.isfile(path)):
+        sha1.update(os.path.basename(path).encode('utf-8') + b'\0')
+        with open(path, 'rb') as package_file:
+            sha1.update(package_file.read())
+        sha1.update(b'\0')
+
+    return sha1.hexdigest()
+
+
+def load_cached_merge(cache_dir, cache_key):
+    cache_path = os.path.join(cache_dir, cache_key + '.json')
+    try:
+        with io.open(cache_path, mode='r', encoding='utf-8') as cache_file:
+            cached_merge = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+    # mark the merge as used, see prune_merge_cache
+    os.utime(cache_path, None)
+    return cached_merge
+
+
+def save_cached_merge(cache_dir, cache_key, merge):
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:  # created by another process
+            pass
+
+    # write to a temp file first, so merges running in parallel never read a partly written file
+    cache_path = os.path.join(cache_dir, cache_key + '.json')
+    temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    with open(temp_path, 'wb') as cache_file:
+        cache_file.write(json.dumps(merge).encode('utf-8'))
+    os.rename(temp_path, cache_path)
+
+
+def prune_merge_cache(cache_dir, unused_since):
+    """Remove the cached merges which were not used since the given time (seconds since the epoch)"""
+    pruned = 0
+    for cache_path in glob.glob(os.path.join(cache_dir, '*.json')):
+        if os.path.getmtime(cache_path) < unused_since:
+            os.remove(cache_path)
+            pruned += 1
+    return pruned
+
+
+def merge_package_files(package_path, dir_name, output_path):
     yml_paths = glob.glob(package_path + '*.yml')
     yml_path = yml_paths[0]
     for path in yml_paths:
@@ -129,8 +257,8 @@ def merge_script_package_to_yml(package_path, dir_name, dest_path=""):
         yml_text, image_path = insert_image_to_yml(dir_name, package_path, yml_data, yml_text)
         yml_text, desc_path = insert_description_to_yml(dir_name, package_path, yml_data, yml_text)
 
-    output_map = write_yaml_with_docker(output_path, yml_text, yml_data, script_obj)
-    return list(output_map.keys()), yml_path, script_path, image_path, desc_path
+    output_map = get_yaml_with_docker(output_path, yml_text, yml_data, script_obj)
+    return output_map, yml_path, script_path, image_path, desc_path
 
 
 def insert_image_to_yml(dir_name, package_path, yml_data, yml_text):